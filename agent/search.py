@@ -6,7 +6,7 @@ import logging
 from typing import List, Dict, Any, Tuple
 from dotenv import load_dotenv
 from openai import OpenAI
-from core.embeddings import query_embedding
+from core.embeddings import query_embedding, embed_text, EMBEDDING_MODEL
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -30,17 +30,12 @@ class SemanticSearcher:
             Tuple de (vector, información_educativa)
         """
         try:
-            response = self.openai_client.embeddings.create(
-                input=question,
-                model="text-embedding-3-small"
-            )
-            
-            embedding = response.data[0].embedding
+            embedding = embed_text(self.openai_client, question, model=EMBEDDING_MODEL)
             
             # Información para propósitos educativos
             vectorization_info = {
                 "step": "vectorization",
-                "model_used": "text-embedding-3-small",
+                "model_used": EMBEDDING_MODEL,
                 "dimensions": len(embedding),
                 "first_values": embedding[:10],
                 "question_length": len(question),
@@ -71,7 +66,7 @@ class SemanticSearcher:
             Tuple de (resultados, información_educativa)
         """
         try:
-            # Realizar búsqueda en Pinecone
+            # Realizar búsqueda en el almacén vectorial (Pinecone o índice local)
             search_results = query_embedding(
                 query_vector=query_vector,
                 top_k=top_k,
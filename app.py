@@ -23,6 +23,7 @@ from callbacks.embedding_callbacks import register_embedding_callbacks
 
 # ⭐ IMPORTAR SISTEMA DE AUTENTICACIÓN ⭐
 from core.auth import setup_auth_routes, is_authenticated, get_current_user, get_login_layout
+from core.uploads import setup_upload_routes
 
 # ⭐ IMPORTAR LAYOUT DE LA PÁGINA DE CHAT Y SUS CALLBACKS ⭐
 from agent.chat_page import layout as chat_page_layout # ASUME QUE ESTÁ EN ./agent/chat_page.py
@@ -49,6 +50,9 @@ server.config['PERMANENT_SESSION_LIFETIME'] = 1800
 # ⭐ CONFIGURAR RUTAS DE AUTENTICACIÓN ⭐
 setup_auth_routes(app)
 
+# ⭐ RUTAS DE SUBIDA POR TROZOS (a disco, reanudables) ⭐
+setup_upload_routes(app)
+
 # ⭐ LAYOUT DE VALIDACIÓN PARA CALLBACKS DINÁMICOS ⭐
 validation_layout = html.Div([
     # Componentes principales
@@ -61,16 +65,22 @@ validation_layout = html.Div([
     
     # Componentes de la página principal (grafo)
     html.Div(id='upload-data'),
+    dcc.Store(id='uploaded-file'),
     html.Div(id='input-url'),
     html.Button(id='process-url-btn', n_clicks=0),
     html.Div(id='ocr-method'),
     html.Div(id='llm-method'),
     html.Div(id='loading-progress'),
     html.Div(id='progress-info'),
+    dcc.Store(id='ingestion-job-id'),
+    dcc.Interval(id='job-poll-interval', disabled=True),
     html.Button(id='generate-graph-btn', n_clicks=0),
     html.Button(id='btn-reset-pinecone', n_clicks=0),
     html.Div(id='dynamic-legend'),
     html.Div(id='knowledge-graph'),
+    dcc.Store(id='graph-version'),
+    dcc.Store(id='graph-lod-state'),
+    dcc.Store(id='graph-elements-compact'),
     html.Div(id='embedding-panel'),
     
     # Componentes de la página de chat
@@ -0,0 +1,133 @@
+// ./assets/chunked_upload.js
+// Subida por trozos y reanudable hacia /upload (ver core/uploads.py).
+// Al terminar, entrega el upload_id al store "uploaded-file" y Dash encola la ingesta.
+
+(function () {
+    const STORAGE_PREFIX = "chunked-upload:";
+    const MAX_RETRIES = 5;
+
+    function setProgress(text) {
+        if (window.dash_clientside && window.dash_clientside.set_props) {
+            window.dash_clientside.set_props("progress-info", {children: text});
+        }
+    }
+
+    function fingerprint(file) {
+        return STORAGE_PREFIX + [file.name, file.size, file.lastModified].join(":");
+    }
+
+    async function startOrResume(file) {
+        // Reanudar una subida previa del mismo archivo si el servidor aún la conserva
+        const key = fingerprint(file);
+        const previousId = window.localStorage.getItem(key);
+        if (previousId) {
+            const resp = await fetch("/upload/" + previousId, {credentials: "same-origin"});
+            if (resp.ok) {
+                const status = await resp.json();
+                return {uploadId: previousId, offset: status.received, chunkSize: status.chunk_size};
+            }
+            window.localStorage.removeItem(key);
+        }
+
+        const resp = await fetch("/upload", {
+            method: "POST",
+            credentials: "same-origin",
+            headers: {"Content-Type": "application/json"},
+            body: JSON.stringify({filename: file.name, size: file.size})
+        });
+        const data = await resp.json();
+        if (!resp.ok) {
+            throw new Error(data.error || resp.statusText);
+        }
+        window.localStorage.setItem(key, data.upload_id);
+        return {uploadId: data.upload_id, offset: 0, chunkSize: data.chunk_size};
+    }
+
+    async function uploadFile(file) {
+        let {uploadId, offset, chunkSize} = await startOrResume(file);
+        let retries = 0;
+
+        while (offset < file.size) {
+            const chunk = file.slice(offset, Math.min(offset + chunkSize, file.size));
+            try {
+                const resp = await fetch("/upload/" + uploadId + "?offset=" + offset, {
+                    method: "PUT",
+                    credentials: "same-origin",
+                    headers: {"Content-Type": "application/octet-stream"},
+                    body: chunk
+                });
+                const data = await resp.json();
+                if (resp.status === 409) {
+                    // El servidor indica desde dónde continuar; un 409 que se repite (p. ej. un
+                    // trozo que excede el tamaño declarado) cuenta como reintento
+                    if (++retries > MAX_RETRIES) {
+                        throw Object.assign(new Error(data.error || resp.statusText), {fatal: true});
+                    }
+                    offset = data.received;
+                    continue;
+                }
+                if (!resp.ok) {
+                    throw new Error(data.error || resp.statusText);
+                }
+                offset = data.received;
+                retries = 0;
+            } catch (err) {
+                if (err.fatal || ++retries > MAX_RETRIES) {
+                    throw err;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * retries));
+                continue;
+            }
+            setProgress("⬆️ Subiendo " + file.name + "... " + Math.floor(100 * offset / file.size) + "%");
+        }
+
+        window.localStorage.removeItem(fingerprint(file));
+        return uploadId;
+    }
+
+    async function handleFile(file) {
+        if (!file) {
+            return;
+        }
+        try {
+            setProgress("⬆️ Subiendo " + file.name + "...");
+            const uploadId = await uploadFile(file);
+            window.dash_clientside.set_props("uploaded-file", {
+                data: {upload_id: uploadId, filename: file.name, ts: Date.now()}
+            });
+        } catch (err) {
+            setProgress("❌ Error subiendo el archivo: " + err.message);
+        }
+    }
+
+    // Delegación de eventos: el layout de Dash se renderiza dinámicamente
+    document.addEventListener("click", function (event) {
+        const zone = event.target.closest("#upload-data");
+        if (zone) {
+            const input = document.getElementById("upload-file-input");
+            if (input && event.target !== input) {
+                input.click();
+            }
+        }
+    });
+
+    document.addEventListener("change", function (event) {
+        if (event.target && event.target.id === "upload-file-input") {
+            handleFile(event.target.files[0]);
+            event.target.value = "";
+        }
+    });
+
+    document.addEventListener("dragover", function (event) {
+        if (event.target.closest && event.target.closest("#upload-data")) {
+            event.preventDefault();
+        }
+    });
+
+    document.addEventListener("drop", function (event) {
+        if (event.target.closest && event.target.closest("#upload-data")) {
+            event.preventDefault();
+            handleFile(event.dataTransfer.files[0]);
+        }
+    });
+})();
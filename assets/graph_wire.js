@@ -0,0 +1,55 @@
+// ./assets/graph_wire.js
+// Expande el formato compacto de core/graph_wire.py en elementos de Cytoscape.
+// Callback clientside: store "graph-elements-compact" -> knowledge-graph.elements.
+
+(function () {
+    function expandElements(payload) {
+        if (!payload || payload.format !== "compact-v1") {
+            return window.dash_clientside.no_update;
+        }
+        const types = payload.types;
+        const classes = payload.classes;
+        const edgeLabels = payload.edge_labels;
+        const nodes = payload.nodes;
+        const edges = payload.edges;
+        const nodeCount = nodes.id.length;
+        const edgeCount = edges.source.length;
+        const elements = new Array(nodeCount + edgeCount);
+
+        for (let i = 0; i < nodeCount; i++) {
+            const data = {id: nodes.id[i], label: nodes.label[i], type: types[nodes.type[i]]};
+            const extra = payload.node_extra[i];
+            if (extra) {
+                Object.assign(data, extra);
+            }
+            const element = {data: data, classes: classes[nodes.class[i]]};
+            if (nodes.x[i] !== null) {
+                element.position = {x: nodes.x[i], y: nodes.y[i]};
+            }
+            elements[i] = element;
+        }
+
+        for (let j = 0; j < edgeCount; j++) {
+            const source = nodes.id[edges.source[j]];
+            const target = nodes.id[edges.target[j]];
+            const edgeId = payload.edge_ids[j];
+            const data = {
+                id: edgeId === undefined ? source + "-" + target : edgeId,
+                source: source,
+                target: target,
+                label: edgeLabels[edges.label[j]],
+                type: types[edges.type[j]]
+            };
+            const extra = payload.edge_extra[j];
+            if (extra) {
+                Object.assign(data, extra);
+            }
+            elements[nodeCount + j] = {data: data, classes: classes[edges.class[j]]};
+        }
+        return elements;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        graph: {expand_elements: expandElements}
+    });
+})();
@@ -0,0 +1,90 @@
+# ./benchmarks/_stubs.py
+# Dobles locales de OpenAI y Pinecone para medir round trips sin red
+
+import os
+import sys
+import time
+import types
+import hashlib
+
+
+class StubEmbeddingsAPI:
+    """
+    Imita `client.embeddings.create` con una latencia fija por llamada.
+    """
+
+    def __init__(self, latency=0.02, dimension=1536):
+        self.latency = latency
+        self.dimension = dimension
+        self.calls = 0
+
+    def create(self, input, model):
+        self.calls += 1
+        time.sleep(self.latency)
+        texts = [input] if isinstance(input, str) else list(input)
+        data = []
+        for i, text in enumerate(texts):
+            seed = int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+            vector = [((seed >> (d % 24)) & 0xFF) / 255.0 - 0.5 for d in range(self.dimension)]
+            data.append(types.SimpleNamespace(index=i, embedding=vector))
+        return types.SimpleNamespace(data=data)
+
+
+class StubOpenAI:
+    def __init__(self, latency=0.02, dimension=1536):
+        self.embeddings = StubEmbeddingsAPI(latency=latency, dimension=dimension)
+
+
+class StubIndex:
+    """
+    Índice Pinecone en memoria con latencia fija por llamada.
+    """
+
+    def __init__(self, latency=0.02):
+        self.latency = latency
+        self.calls = 0
+        self.vectors = {}
+
+    def upsert(self, vectors, namespace=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        for vector in vectors:
+            self.vectors[vector["id"]] = vector
+        return {"upserted_count": len(vectors)}
+
+    def query(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        return {"matches": []}
+
+    def delete(self, ids=None, delete_all=False, namespace=None, filter=None):
+        self.calls += 1
+        time.sleep(self.latency)
+        if delete_all:
+            self.vectors.clear()
+        for vector_id in ids or []:
+            self.vectors.pop(vector_id, None)
+
+    def describe_index_stats(self):
+        return {"total_vector_count": len(self.vectors)}
+
+
+def install_pinecone_stub(index):
+    """
+    Registra un módulo `pinecone` falso para importar `core.embeddings` sin red.
+    """
+    os.environ.setdefault("PINECONE_API_KEY", "stub")
+    os.environ.setdefault("PINECONE_INDEX", "stub")
+    os.environ.setdefault("VECTOR_STORE", "pinecone")
+
+    class Pinecone:
+        def __init__(self, api_key=None):
+            pass
+
+        def Index(self, name):
+            return index
+
+    module = types.ModuleType("pinecone")
+    module.Pinecone = Pinecone
+    sys.modules["pinecone"] = module
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
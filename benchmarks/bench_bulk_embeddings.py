@@ -0,0 +1,47 @@
+# ./benchmarks/bench_bulk_embeddings.py
+# Compara la ingesta chunk a chunk con upsert_embeddings_bulk contra dobles locales
+#
+# Uso: python -m benchmarks.bench_bulk_embeddings [--latency 0.02]
+
+import argparse
+import time
+
+from benchmarks._stubs import StubIndex, StubOpenAI, install_pinecone_stub
+
+
+def run(sizes, latency):
+    index = StubIndex(latency=latency)
+    install_pinecone_stub(index)
+    from core import embeddings, utils
+
+    print(f"{'chunks':>8} | {'modo':>10} | {'round trips':>11} | {'tiempo (s)':>10}")
+    print("-" * 50)
+    for n in sizes:
+        chunks = [f"chunk {i} " + "texto de prueba " * 40 for i in range(n)]
+
+        # Camino anterior: una llamada de embedding y un upsert por chunk
+        client = StubOpenAI(latency=latency)
+        index.calls = 0
+        start = time.perf_counter()
+        for i, chunk in enumerate(chunks):
+            vector = client.embeddings.create(input=chunk, model=embeddings.EMBEDDING_MODEL).data[0].embedding
+            embeddings.upsert_embedding(utils.generate_chunk_id(chunk, "doc"), vector, "doc", {"chunk_index": i})
+        elapsed = time.perf_counter() - start
+        print(f"{n:>8} | {'per-chunk':>10} | {client.embeddings.calls + index.calls:>11} | {elapsed:>10.2f}")
+
+        # Camino por lotes
+        client = StubOpenAI(latency=latency)
+        index.calls = 0
+        start = time.perf_counter()
+        report = embeddings.upsert_embeddings_bulk(chunks, "doc", client)
+        elapsed = time.perf_counter() - start
+        assert report["saved"] == n and not report["failed"]
+        print(f"{n:>8} | {'bulk':>10} | {report['embed_calls'] + report['upsert_calls']:>11} | {elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.02, help="Latencia simulada por round trip (s)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 400])
+    args = parser.parse_args()
+    run(args.sizes, args.latency)
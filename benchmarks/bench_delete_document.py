@@ -0,0 +1,154 @@
+# ./benchmarks/bench_delete_document.py
+# Borrado de un documento: consulta dummy con top_k=1000 (camino anterior) frente al
+# borrado por IDs del manifiesto, por prefijo de ID y por namespace propio, sobre el
+# almacén local
+#
+# Comprueba además que no quedan huérfanos y que el otro documento queda intacto.
+# "respaldo" son vectores con IDs sin prefijo y sin registro en el manifiesto (de antes
+# de los IDs "<document_id>#<hash>"). Con --lag los borrados tardan ese número de
+# consultas en verse, como en un índice con consistencia eventual.
+#
+# Uso: python -m benchmarks.bench_delete_document [--sizes 500 3000] [--latency 0.02] [--lag 1]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class LatencyStore:
+    """
+    Envuelve un VectorStore: cuenta las llamadas y añade una latencia fija a cada una.
+    Con `lag` > 0 cada borrado se aplica después de `lag` consultas.
+    """
+
+    def __init__(self, store, latency, lag=0):
+        self.store = store
+        self.latency = latency
+        self.lag = lag
+        self.calls = 0
+        self.pending = []
+
+    def delete(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        if not self.lag:
+            return self.store.delete(**kwargs)
+        self.pending.append([self.lag, kwargs])
+        return {}
+
+    def query(self, *args, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        result = self.store.query(*args, **kwargs)
+        for item in self.pending:
+            item[0] -= 1
+        self.flush(only_due=True)
+        return result
+
+    def flush(self, only_due=False):
+        due = [item for item in self.pending if item[0] <= 0 or not only_due]
+        self.pending = [item for item in self.pending if item not in due]
+        for _, kwargs in due:
+            self.store.delete(**kwargs)
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+
+        def call(*args, **kwargs):
+            self.calls += 1
+            time.sleep(self.latency)
+            return method(*args, **kwargs)
+        return call
+
+    def list_ids(self, *args, **kwargs):
+        # Una llamada por página
+        for page in self.store.list_ids(*args, **kwargs):
+            self.calls += 1
+            time.sleep(self.latency)
+            yield page
+
+
+def legacy_delete(store, document_id, dimension):
+    """
+    Implementación anterior de delete_embeddings_by_document_id.
+    """
+    result = store.query(vector=[0] * dimension, filter={"document_id": {"$eq": document_id}},
+                         top_k=1000, include_values=False, include_metadata=True)
+    ids = [m["id"] for m in result.get("matches", [])]
+    if ids:
+        store.delete(ids=ids)
+
+
+def remaining(store, document_id, namespace):
+    ids = [vector_id for page in store.list_ids(namespace=namespace) for vector_id in page]
+    fetched = store.fetch(ids, namespace=namespace)["vectors"] if ids else {}
+    return sum(1 for vector in fetched.values() if vector["metadata"].get("document_id") == document_id)
+
+
+def run(sizes, latency, lag):
+    import numpy as np
+
+    workdir = tempfile.mkdtemp(prefix="bench_delete_")
+    os.environ["VECTOR_STORE"] = "local"
+    os.environ["MANIFEST_DB_PATH"] = os.path.join(workdir, "manifest.db")
+    from core import embeddings
+    from core.vector_store import LocalVectorStore
+
+    rng = np.random.default_rng(0)
+    print(f"{'chunks':>7} | {'modo':>18} | {'huérfanos':>9} | {'otro doc':>8} | {'round trips':>11} | {'tiempo (s)':>10}")
+    print("-" * 80)
+    for size in sizes:
+        for mode in ("query top_k=1000", "manifiesto", "prefijo", "respaldo", "namespace propio"):
+            local = LocalVectorStore(directory=os.path.join(workdir, f"{size}-{mode.split()[0]}"),
+                                     dimension=embeddings.DIMENSION)
+            store = LatencyStore(local, latency, lag)
+            embeddings._vector_store = store
+            embeddings.VECTOR_NAMESPACE_PER_DOCUMENT = mode == "namespace propio"
+
+            for document_id in ("target", "other"):
+                chunks = [f"{document_id} chunk {i}" for i in range(size)]
+                vectors = rng.normal(size=(size, embeddings.DIMENSION)).astype(np.float32).tolist()
+                if mode == "respaldo":
+                    # Formato anterior: ID = hash del chunk, sin prefijo ni manifiesto
+                    local.upsert([{"id": f"{i:06d}{document_id}", "values": vectors[i],
+                                   "metadata": {"document_id": document_id}} for i in range(size)])
+                    continue
+                report = embeddings.upsert_embeddings_bulk(chunks, document_id, client=None, vectors=vectors,
+                                                           upsert_batch_size=1000)
+                assert report["saved"] == size
+
+            if mode == "prefijo":
+                # Sin registro local (p. ej. vectores subidos desde otra instalación)
+                embeddings.manifest.clear_manifest()
+            store.calls = 0
+            start = time.perf_counter()
+            if mode == "query top_k=1000":
+                legacy_delete(store, "target", embeddings.DIMENSION)
+            else:
+                embeddings.delete_embeddings_by_document_id("target")
+            elapsed = time.perf_counter() - start
+            calls = store.calls
+            store.flush()
+
+            namespace_target = embeddings.document_namespace("target")
+            namespace_other = embeddings.document_namespace("other")
+            orphans = remaining(local, "target", namespace_target)
+            other = remaining(local, "other", namespace_other)
+            print(f"{size:>7} | {mode:>18} | {orphans:>9} | {other:>8} | {calls:>11} | {elapsed:>10.3f}")
+            if mode != "query top_k=1000":
+                assert orphans == 0 and other == size
+            # El siguiente modo empieza con el manifiesto limpio
+            embeddings.manifest.clear_manifest()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 3000])
+    parser.add_argument("--latency", type=float, default=0.02, help="Latencia simulada por round trip (s)")
+    parser.add_argument("--lag", type=int, default=1, help="Consultas que tarda un borrado en verse")
+    args = parser.parse_args()
+    run(args.sizes, args.latency, args.lag)
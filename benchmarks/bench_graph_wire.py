@@ -0,0 +1,71 @@
+# ./benchmarks/bench_graph_wire.py
+# Tamaño y coste de serialización de los elementos del grafo: lista de Cytoscape
+# frente al formato compacto por columnas (core/graph_wire.py)
+#
+# Uso: python -m benchmarks.bench_graph_wire [--sizes 1000 10000 50000]
+
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TYPES = ["Person", "Organization", "Location", "Concept", "Industry", "Role"]
+RELATIONS = ["works_at", "located_in", "related_to", "part_of", "founded"]
+
+
+def synthetic_elements(count, seed=0):
+    """
+    `count` elementos (un tercio nodos, dos tercios aristas) con posiciones.
+    """
+    from callbacks.graph_callbacks import build_cytoscape_elements
+
+    rng = random.Random(seed)
+    nodes = max(count // 3, 2)
+    entities = [{"id": f"ent_{i}", "type": rng.choice(TYPES), "text": f"Entidad {i}"} for i in range(nodes)]
+    relations = [{"source_id": f"ent_{rng.randrange(nodes)}", "target_id": f"ent_{rng.randrange(nodes)}",
+                  "type": rng.choice(RELATIONS)} for _ in range(count - nodes)]
+    positions = {e["id"]: (round(rng.uniform(-5000, 5000), 1), round(rng.uniform(-5000, 5000), 1)) for e in entities}
+    return build_cytoscape_elements(entities, relations, positions)
+
+
+def timed(fn, repeat=3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best * 1000
+
+
+def run(sizes):
+    from plotly.utils import PlotlyJSONEncoder
+    from core import graph_wire
+
+    def dumps(value):
+        # Mismo codificador que usa Dash para las respuestas de los callbacks
+        return json.dumps(value, cls=PlotlyJSONEncoder)
+
+    print(f"{'elementos':>9} | {'formato':>9} | {'bytes':>10} | {'gzip':>9} | {'serializar ms':>13}")
+    print("-" * 62)
+    for size in sizes:
+        elements = synthetic_elements(size)
+        plain, plain_ms = timed(lambda: dumps(elements))
+        compact, compact_ms = timed(lambda: dumps(graph_wire.encode_elements(elements)))
+        assert graph_wire.decode_elements(json.loads(compact)) == elements
+
+        for name, body, ms in (("lista", plain, plain_ms), ("compacto", compact, compact_ms)):
+            raw = body.encode("utf-8")
+            print(f"{len(elements):>9} | {name:>9} | {len(raw):>10,} | {len(gzip.compress(raw)):>9,} | {ms:>13.1f}")
+        print(f"{'':>9} | {'ratio':>9} | {len(plain) / len(compact):>9.2f}x |")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+    run(args.sizes)
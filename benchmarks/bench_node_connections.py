@@ -0,0 +1,75 @@
+# ./benchmarks/bench_node_connections.py
+# Coste de consultar las conexiones de un nodo: recorrido lineal de las relaciones
+# (implementación anterior de get_node_connections) frente a los índices de adyacencia
+#
+# Uso: python -m benchmarks.bench_node_connections [--edges 100000 --nodes 20000]
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def synthetic_graph(nodes, edges, seed=0):
+    rng = random.Random(seed)
+    entities = [{"id": f"n{i}", "type": "Concept", "text": f"Nodo {i}"} for i in range(nodes)]
+    relations = [{"source_id": f"n{rng.randrange(nodes)}", "target_id": f"n{rng.randrange(nodes)}",
+                  "type": "relacionado_con", "text": ""} for _ in range(edges)]
+    return entities, relations
+
+
+def linear_scan(entities, relations, node_id):
+    entity_map = {e.get('id'): e.get('text', e.get('id')) for e in entities}
+    outgoing, incoming = [], []
+    for rel in relations:
+        if rel.get('source_id') == node_id:
+            outgoing.append((rel.get('type'), entity_map.get(rel.get('target_id'), rel.get('target_id'))))
+        elif rel.get('target_id') == node_id:
+            incoming.append((entity_map.get(rel.get('source_id'), rel.get('source_id')), rel.get('type')))
+    return outgoing, incoming
+
+
+def run(nodes, edges, lookups):
+    os.environ["GRAPH_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="graph-bench-"), "graph.db")
+    from core import graph_store
+
+    entities, relations = synthetic_graph(nodes, edges)
+    rng = random.Random(1)
+    taps = [f"n{rng.randrange(nodes)}" for _ in range(lookups)]
+
+    start = time.perf_counter()
+    version = graph_store.save_graph(entities, relations, source="benchmark")
+    print(f"Guardar {edges} aristas (incluye índice): {time.perf_counter() - start:.2f}s")
+
+    graph_store._cache.clear()
+    start = time.perf_counter()
+    graph_store.get_snapshot(version)
+    print(f"Cargar versión en otro proceso (primera consulta): {time.perf_counter() - start:.2f}s\n")
+
+    start = time.perf_counter()
+    for node_id in taps[:20]:
+        linear_scan(entities, relations, node_id)
+    linear_ms = (time.perf_counter() - start) / 20 * 1000
+
+    start = time.perf_counter()
+    for node_id in taps:
+        graph_store.get_node_connections(node_id, version)
+    indexed_ms = (time.perf_counter() - start) / lookups * 1000
+
+    print(f"{'método':>22} | {'ms/consulta':>11}")
+    print("-" * 38)
+    print(f"{'recorrido lineal O(E)':>22} | {linear_ms:>11.3f}")
+    print(f"{'adyacencia O(grado)':>22} | {indexed_ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=20000)
+    parser.add_argument("--edges", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.nodes, args.edges, args.lookups)
@@ -0,0 +1,71 @@
+# ./benchmarks/bench_ocr_memory.py
+# Pico de memoria del OCR Tesseract: rasterizado completo en memoria vs ventanas en disco
+#
+# Requiere tesseract-ocr y poppler-utils instalados.
+# Uso: python -m benchmarks.bench_ocr_memory [--pages 10 50 150]
+
+import os
+import sys
+import time
+import argparse
+import resource
+import tempfile
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_pdf(path, pages):
+    """
+    Genera un PDF de `pages` páginas A4 con texto, una página a la vez.
+    """
+    from PIL import Image, ImageDraw
+
+    def page(i):
+        img = Image.new("RGB", (1240, 1754), "white")
+        draw = ImageDraw.Draw(img)
+        for line in range(40):
+            draw.text((80, 80 + line * 40), f"Pagina {i + 1} linea {line}: Juan trabaja en Microsoft en Madrid.", fill="black")
+        return img
+
+    first = page(0)
+    first.save(path, save_all=True, append_images=(page(i) for i in range(1, pages)))
+
+
+def measure(mode, pdf_path):
+    """
+    Ejecuta un modo en un proceso limpio y devuelve (pico RSS en MB, segundos).
+    """
+    code = f"""
+import sys, time, resource
+sys.path.insert(0, {ROOT!r})
+start = time.perf_counter()
+if {mode!r} == "full":
+    import pytesseract
+    from pdf2image import convert_from_path
+    images = convert_from_path({pdf_path!r})
+    text = "".join(pytesseract.image_to_string(img) + "\\n" for img in images)
+else:
+    from core.ocr import run_tesseract_pdf_pages
+    text = "".join(p["text"] for p in run_tesseract_pdf_pages({pdf_path!r}, workers=1))
+elapsed = time.perf_counter() - start
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, elapsed)
+"""
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.split()
+    return float(out[-2]), float(out[-1])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50, 150])
+    args = parser.parse_args()
+
+    print(f"{'páginas':>8} | {'modo':>10} | {'pico RSS (MB)':>13} | {'tiempo (s)':>10}")
+    print("-" * 52)
+    with tempfile.TemporaryDirectory() as tmp:
+        for pages in args.pages:
+            pdf_path = os.path.join(tmp, f"scan_{pages}.pdf")
+            make_pdf(pdf_path, pages)
+            for mode in ("full", "streaming"):
+                peak_mb, seconds = measure(mode, pdf_path)
+                print(f"{pages:>8} | {mode:>10} | {peak_mb:>13.1f} | {seconds:>10.1f}")
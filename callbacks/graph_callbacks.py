@@ -1,40 +1,61 @@
 # ./callbacks/graph_callbacks.py
 # Callbacks simplificados - SIN CACHE
 
-from dash import Input, Output, State, no_update, callback_context
-from core import graph_builder
+from dash import Input, Output, State, Patch, ClientsideFunction, no_update, callback_context
+from dash.exceptions import PreventUpdate
+from core import graph_builder, graph_store, graph_wire
 import networkx as nx
 import dash
 import json
 import os
 
+# Nivel de detalle: por encima de GRAPH_LOD_THRESHOLD nodos se envían solo los
+# GRAPH_LOD_TOP_N nodos con más PageRank y el resto agrupado por comunidades
+GRAPH_LOD_THRESHOLD = int(os.getenv("GRAPH_LOD_THRESHOLD", "1000"))
+GRAPH_LOD_TOP_N = int(os.getenv("GRAPH_LOD_TOP_N", "300"))
+# Comunidades con nodo propio (las demás se agrupan en "Otros")
+GRAPH_LOD_MAX_CLUSTERS = int(os.getenv("GRAPH_LOD_MAX_CLUSTERS", "50"))
+# Miembros que se muestran al pulsar un clúster
+GRAPH_LOD_EXPAND_LIMIT = int(os.getenv("GRAPH_LOD_EXPAND_LIMIT", "100"))
+CLUSTER_PREFIX = "cluster:"
+# "compact": las listas completas de elementos viajan en formato por columnas
+# (core/graph_wire.py) y el navegador las expande; "elements": lista de Cytoscape
+GRAPH_WIRE_FORMAT = os.getenv("GRAPH_WIRE_FORMAT", "elements").lower()
+# Si un cambio afecta a más de esta fracción de los elementos se envía la lista completa
+GRAPH_PATCH_MAX_RATIO = float(os.getenv("GRAPH_PATCH_MAX_RATIO", "0.5"))
+
 def register_graph_callbacks(app):
     
     @app.callback(
         [Output("knowledge-graph", "elements"),
          Output("embedding-panel", "children"),
-         Output("dynamic-legend", "children")],
+         Output("dynamic-legend", "children"),
+         Output("graph-lod-state", "data", allow_duplicate=True),
+         Output("graph-elements-compact", "data", allow_duplicate=True)],
         [Input("progress-info", "children")],
+        [State("graph-version", "data"),
+         State("graph-lod-state", "data")],
         prevent_initial_call=True
     )
-    def update_graph_simple(progress_message):
+    def update_graph_simple(progress_message, graph_version, lod_state):
         """
-        Actualiza el grafo de manera simple - sin cache.
+        Actualiza el grafo desde el almacén de grafos (versión de la sesión o la actual).
+        Si el navegador ya muestra una versión, solo se envían los cambios (Patch).
         """
         if not progress_message or "entidades" not in str(progress_message):
-            return no_update, no_update, no_update
+            return no_update, no_update, no_update, no_update, no_update
         
         try:
-            # Obtener datos del módulo OCR directamente
-            from callbacks.ocr_callbacks import GRAPH_DATA as OCR_GRAPH_DATA
-            entities = OCR_GRAPH_DATA.get('entities', [])
-            relations = OCR_GRAPH_DATA.get('relations', [])
+            snapshot = graph_store.get_snapshot(graph_version)
+            entities = snapshot.entities if snapshot else []
+            relations = snapshot.relations if snapshot else []
 
             if not entities and not relations:
-                return [], create_no_data_panel(), create_empty_legend()
+                return [], create_no_data_panel(), create_empty_legend(), None, no_update
 
-            # Construir elementos para Cytoscape
-            elements = build_cytoscape_elements(entities, relations)
+            # Elementos para Cytoscape (completos o por niveles de detalle), con el layout de la versión
+            render_state = next_render_state(snapshot, lod_state)
+            elements = update_graph_elements(lod_state, snapshot, render_state["revealed"])
             
             # Crear panel de información
             info_panel = create_graph_info_panel(entities, relations)
@@ -47,26 +68,32 @@ def register_graph_callbacks(app):
             
             dynamic_legend = create_dynamic_legend(entity_counts)
             
-            return elements, info_panel, dynamic_legend
+            elements, compact = wire_outputs(elements)
+            return elements, info_panel, dynamic_legend, render_state, compact
             
         except Exception as e:
             import traceback
             traceback.print_exc()
-            return [], create_error_panel(str(e)), create_empty_legend()
+            # El navegador queda vacío: sin estado previo el siguiente grafo se envía completo (no Patch)
+            return [], create_error_panel(str(e)), create_empty_legend(), None, no_update
     
     @app.callback(
         [Output("knowledge-graph", "elements", allow_duplicate=True),
          Output("embedding-panel", "children", allow_duplicate=True),
-         Output("dynamic-legend", "children", allow_duplicate=True)],
+         Output("dynamic-legend", "children", allow_duplicate=True),
+         Output("graph-version", "data", allow_duplicate=True),
+         Output("graph-lod-state", "data", allow_duplicate=True),
+         Output("graph-elements-compact", "data", allow_duplicate=True)],
         [Input("generate-graph-btn", "n_clicks")],
+        [State("graph-lod-state", "data")],
         prevent_initial_call=True
     )
-    def generate_graph_from_pinecone(n_clicks):
+    def generate_graph_from_pinecone(n_clicks, lod_state):
         """
         Genera el grafo desde documentos almacenados en Pinecone.
         """
         if not n_clicks:
-            return no_update, no_update, no_update
+            return no_update, no_update, no_update, no_update, no_update, no_update
         
         try:
             
@@ -75,11 +102,15 @@ def register_graph_callbacks(app):
             stats = embeddings.get_index_stats()
             total_vectors = stats.get('total_vector_count', 0)
             
+            # Las salidas que vacían el grafo también vacían graph-lod-state: el siguiente
+            # grafo no puede expresarse como Patch sobre una versión que ya no se muestra
             if total_vectors == 0:
-                return [], create_error_panel("No hay documentos procesados en Pinecone"), create_empty_legend()
+                return [], create_error_panel("No hay documentos procesados en Pinecone"), create_empty_legend(), no_update, None, no_update
             
-            # 2. Obtener chunks representativos usando queries diversas
+            # 2. Obtener chunks representativos: un medoide por clúster de todo el corpus
+            # (core/graph_sampling.py); consultas sonda si el backend no permite listar IDs
             from openai import OpenAI
+            from core import graph_sampling
             import os
             from dotenv import load_dotenv
             
@@ -87,89 +118,37 @@ def register_graph_callbacks(app):
             OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
             client = OpenAI(api_key=OPENAI_API_KEY)
             
-            sample_queries = [
-                "person organization company",
-                "location place city",
-                "work relationship role",
-                "important information concepts"
-            ]
-            
-            all_chunks = []
-            seen_ids = set()
-            
-            for query in sample_queries:
-                try:
-                    # Generar embedding para la query
-                    response = client.embeddings.create(
-                        input=query,
-                        model="text-embedding-3-small"
-                    )
-                    query_vector = response.data[0].embedding
-                    
-                    # Buscar chunks similares
-                    results = embeddings.query_embedding(
-                        query_vector=query_vector,
-                        top_k=3,
-                        include_metadata=True
-                    )
-                    
-                    # Procesar resultados
-                    for match in results.get('matches', []):
-                        chunk_id = match['id']
-                        if chunk_id not in seen_ids:
-                            chunk_text = match['metadata'].get('chunk_text', '')
-                            if chunk_text and len(chunk_text.strip()) > 50:
-                                all_chunks.append(chunk_text)
-                                seen_ids.add(chunk_id)
-                                
-                except Exception as e:
-                    print(f"⚠️ Error con query '{query}': {e}")
-                    continue
+            all_chunks = graph_sampling.sample_representative_chunks()
+            if not all_chunks:
+                all_chunks = graph_sampling.sample_chunks_by_probes(client)
             
             if not all_chunks:
-                return [], create_error_panel("No se pudieron recuperar chunks de Pinecone"), create_empty_legend()
+                return [], create_error_panel("No se pudieron recuperar chunks de Pinecone"), create_empty_legend(), no_update, None, no_update
             
-            # 3. Extraer entidades y relaciones de los chunks
+            # 3. Extraer entidades y relaciones de todos los chunks (paquetes en paralelo)
             from core import llm
-            all_entities, all_relations = [], []
-            
-            for i, chunk in enumerate(all_chunks[:8]):  # Limitar para no saturar
-                try:
-                    llm_result = llm.extract_entities_relations(chunk, llm_method="openai")
-                    
-                    if isinstance(llm_result, dict):
-                        chunk_entities = llm_result.get("entities", [])
-                        chunk_relations = llm_result.get("relations", [])
-                        
-                        # Asegurar IDs únicos
-                        for entity in chunk_entities:
-                            if "id" in entity:
-                                entity["id"] = f"pin_{i}_{entity['id']}"
-                        
-                        for relation in chunk_relations:
-                            if "source_id" in relation:
-                                relation["source_id"] = f"pin_{i}_{relation['source_id']}"
-                            if "target_id" in relation:
-                                relation["target_id"] = f"pin_{i}_{relation['target_id']}"
-                        
-                        all_entities.extend(chunk_entities)
-                        all_relations.extend(chunk_relations)
-                        
-                except Exception as e:
-                    print(f"❌ Error procesando chunk {i}: {e}")
-                    continue
+            all_entities, all_relations = llm.extract_graph_from_chunks(
+                all_chunks,
+                llm_method="openai",
+                id_prefix="pin_{i}_"
+            )
             
             if not all_entities and not all_relations:
-                return [], create_error_panel("No se pudieron extraer entidades de los documentos"), create_empty_legend()
-            
-            # 4. Actualizar datos en OCR_CALLBACKS para mantener consistencia
-            from callbacks.ocr_callbacks import GRAPH_DATA as OCR_GRAPH_DATA
-            OCR_GRAPH_DATA['entities'] = all_entities
-            OCR_GRAPH_DATA['relations'] = all_relations
-            OCR_GRAPH_DATA['last_update'] = "Generado desde Pinecone"
+                return [], create_error_panel("No se pudieron extraer entidades de los documentos"), create_empty_legend(), no_update, None, no_update
+            
+            # 4. Guardar el grafo como nueva versión (visible para todos los workers),
+            # con los embeddings de los nodos calculados en lote
+            node_vectors = embeddings.embed_graph_nodes(all_entities, client)
+            graph_version = graph_store.save_graph(
+                all_entities, all_relations, source="Generado desde Pinecone",
+                node_vectors=node_vectors, embedding_model=embeddings.EMBEDDING_MODEL
+            )
             
-            # 5. Construir elementos del grafo
-            elements = build_cytoscape_elements(all_entities, all_relations)
+            # 5. Construir elementos del grafo con el layout calculado en el servidor
+            # (solo los cambios respecto a lo que ya muestra el navegador)
+            snapshot = graph_store.get_snapshot(graph_version)
+            render_state = next_render_state(snapshot, lod_state)
+            elements = update_graph_elements(lod_state, snapshot, render_state["revealed"])
             
             # 6. Crear panel de información
             info_panel = create_pinecone_info_panel(all_entities, all_relations, total_vectors, len(all_chunks))
@@ -182,20 +161,22 @@ def register_graph_callbacks(app):
             
             dynamic_legend = create_dynamic_legend(entity_counts)
                         
-            return elements, info_panel, dynamic_legend
+            elements, compact = wire_outputs(elements)
+            return elements, info_panel, dynamic_legend, graph_version, render_state, compact
             
         except Exception as e:
             print(f"❌ Error generando grafo desde Pinecone: {e}")
             import traceback
             traceback.print_exc()
-            return [], create_error_panel(f"Error: {str(e)}"), create_empty_legend()
+            return [], create_error_panel(f"Error: {str(e)}"), create_empty_legend(), no_update, None, no_update
     
     @app.callback(
         Output("embedding-panel", "children", allow_duplicate=True),
         [Input("knowledge-graph", "tapNodeData")],
+        [State("graph-version", "data")],
         prevent_initial_call=True
     )
-    def show_node_details(node_data):
+    def show_node_details(node_data, graph_version):
         """
         Muestra información del nodo seleccionado.
         """
@@ -203,11 +184,44 @@ def register_graph_callbacks(app):
             return no_update
         
         try:
-            return create_node_detail_panel(node_data)
+            if node_data.get('type') == 'Cluster':
+                return create_cluster_panel(node_data)
+            return create_node_detail_panel(node_data, graph_version)
         except Exception as e:
             print(f"❌ Error mostrando detalles: {e}")
             return create_error_panel(str(e))
 
+    @app.callback(
+        [Output("knowledge-graph", "elements", allow_duplicate=True),
+         Output("graph-elements-compact", "data", allow_duplicate=True),
+         Output("graph-lod-state", "data", allow_duplicate=True)],
+        [Input("knowledge-graph", "tapNodeData")],
+        [State("graph-lod-state", "data")],
+        prevent_initial_call=True
+    )
+    def expand_cluster(node_data, lod_state):
+        """
+        Al pulsar un clúster se muestran sus siguientes GRAPH_LOD_EXPAND_LIMIT miembros.
+        """
+        if not node_data or node_data.get('type') != 'Cluster' or not lod_state:
+            raise PreventUpdate
+        snapshot = graph_store.get_snapshot(lod_state.get("version"))
+        if snapshot is None:
+            raise PreventUpdate
+
+        revealed = list(lod_state.get("revealed", []))
+        revealed.extend(cluster_members(snapshot, node_data["id"], revealed)[:GRAPH_LOD_EXPAND_LIMIT])
+        elements, compact = wire_outputs(update_graph_elements(lod_state, snapshot, revealed))
+        return elements, compact, {"version": snapshot.version, "revealed": revealed}
+
+    # Expansión del formato compacto en el navegador (assets/graph_wire.js)
+    app.clientside_callback(
+        ClientsideFunction(namespace="graph", function_name="expand_elements"),
+        Output("knowledge-graph", "elements", allow_duplicate=True),
+        Input("graph-elements-compact", "data"),
+        prevent_initial_call=True
+    )
+
 def create_pinecone_info_panel(entities, relations, total_vectors, chunks_processed):
     """
     Crea panel de información específico para grafo generado desde Pinecone.
@@ -275,9 +289,11 @@ def create_pinecone_info_panel(entities, relations, total_vectors, chunks_proces
         ])
     ], className="mt-3")
 
-def build_cytoscape_elements(entities, relations):
+def build_cytoscape_elements(entities, relations, positions=None):
     """
     Construye elementos de Cytoscape desde entidades y relaciones.
+    Con `positions` (id -> (x, y), de graph_store.get_layout) cada nodo lleva su
+    posición para el layout "preset".
     """
     elements = []
     
@@ -296,6 +312,9 @@ def build_cytoscape_elements(entities, relations):
                 },
                 'classes': f"node-{entity_type.lower()}"
             }
+            if positions and entity_id in positions:
+                x, y = positions[entity_id]
+                node_element['position'] = {'x': x, 'y': y}
             
             elements.append(node_element)
             
@@ -339,6 +358,205 @@ def build_cytoscape_elements(entities, relations):
     
     return elements
 
+def render_graph_elements(snapshot, revealed=None):
+    """
+    Elementos de Cytoscape de una versión del grafo, con su layout precalculado.
+    Los grafos de más de GRAPH_LOD_THRESHOLD nodos se envían por niveles de detalle.
+    """
+    if snapshot is None:
+        return []
+    if len(snapshot.entities) <= GRAPH_LOD_THRESHOLD:
+        return build_cytoscape_elements(snapshot.entities, snapshot.relations,
+                                        graph_store.get_layout(snapshot.version))
+    return build_lod_elements(snapshot, revealed or [])
+
+def wire_outputs(elements):
+    """
+    Salidas (knowledge-graph.elements, graph-elements-compact.data) para unos
+    elementos: con GRAPH_WIRE_FORMAT=compact las listas completas se envían
+    codificadas al store; los Patch y no_update van siempre directos a Cytoscape.
+    """
+    if GRAPH_WIRE_FORMAT == "compact" and isinstance(elements, list):
+        payload = graph_wire.encode_elements(elements)
+        if payload is not None:
+            return no_update, payload
+    return elements, no_update
+
+def next_render_state(snapshot, lod_state):
+    """
+    Estado de renderizado para mostrar `snapshot`: conserva los nodos revelados
+    que siguen existiendo en la nueva versión.
+    """
+    revealed = (lod_state or {}).get("revealed", [])
+    return {"version": snapshot.version, "revealed": [node_id for node_id in revealed if node_id in snapshot.labels]}
+
+def update_graph_elements(lod_state, snapshot, revealed=None):
+    """
+    Elementos nuevos de `snapshot` expresados como cambio sobre lo que muestra el
+    navegador (descrito por `lod_state`: versión y nodos revelados). Devuelve un
+    Patch, la lista completa si no hay estado previo o el cambio es grande, o
+    no_update si no hay cambios.
+    """
+    new_elements = render_graph_elements(snapshot, revealed)
+    previous = graph_store.get_snapshot(lod_state["version"]) \
+        if lod_state and lod_state.get("version") is not None else None
+    if previous is None:
+        return new_elements
+    return patch_graph_elements(render_graph_elements(previous, lod_state.get("revealed", [])), new_elements)
+
+def patch_graph_elements(old_elements, new_elements, max_ratio=GRAPH_PATCH_MAX_RATIO):
+    """
+    Patch de Dash que transforma `old_elements` en `new_elements`: quita por valor
+    los elementos que ya no están y añade los nuevos al final. Quitar por valor (y
+    no por índice) no depende del orden en que el navegador guarda los elementos,
+    que cambia tras cada Patch. Los elementos sin cambios no se reenvían y
+    Cytoscape conserva su posición.
+    """
+    from collections import Counter
+
+    def key(element):
+        return json.dumps(element, sort_keys=True)
+
+    old_counts = Counter(key(element) for element in old_elements)
+    new_by_key = {}
+    for element in new_elements:
+        new_by_key.setdefault(key(element), []).append(element)
+
+    # "Remove" quita todas las copias iguales: si alguna sigue, se vuelve a añadir
+    removed = [element_key for element_key, count in old_counts.items()
+               if count > len(new_by_key.get(element_key, []))]
+    added = []
+    for element_key, copies in new_by_key.items():
+        keep = 0 if element_key in removed else old_counts.get(element_key, 0)
+        added.extend(copies[keep:])
+
+    if not removed and not added:
+        return no_update
+    if len(removed) + len(added) > max_ratio * len(new_elements):
+        return new_elements
+    patch = Patch()
+    for element_key in removed:
+        patch.remove(json.loads(element_key))
+    if added:
+        patch.extend(added)
+    return patch
+
+def _lod_partition(snapshot, revealed):
+    """
+    Nodos visibles (top-N por PageRank + revelados) y función nodo -> clúster.
+    """
+    communities = graph_store.get_communities(snapshot.version)
+    visible = set(communities["order"][:GRAPH_LOD_TOP_N]) | set(revealed)
+
+    def bucket(node_id):
+        community = communities["community"].get(node_id, -1)
+        return community if community < GRAPH_LOD_MAX_CLUSTERS else -1
+
+    return communities, visible, bucket
+
+def cluster_members(snapshot, cluster_id, revealed):
+    """
+    Miembros ocultos de un clúster, de mayor a menor PageRank.
+    """
+    communities, visible, bucket = _lod_partition(snapshot, revealed)
+    number = int(str(cluster_id)[len(CLUSTER_PREFIX):])
+    return [node_id for node_id in communities["order"] if node_id not in visible and bucket(node_id) == number]
+
+def build_lod_elements(snapshot, revealed):
+    """
+    Elementos por niveles de detalle: los nodos visibles tal cual, el resto colapsado
+    en un nodo por comunidad (en el centroide de sus miembros) y las aristas hacia
+    nodos ocultos agregadas por clúster con su número de relaciones.
+    """
+    from collections import defaultdict
+
+    communities, visible, bucket = _lod_partition(snapshot, revealed)
+    positions = graph_store.get_layout(snapshot.version)
+
+    visible_entities = [e for e in snapshot.entities if str(e.get('id')) in visible]
+    visible_relations = [r for r in snapshot.relations
+                         if str(r.get('source_id')) in visible and str(r.get('target_id')) in visible]
+    elements = build_cytoscape_elements(visible_entities, visible_relations, positions)
+
+    # Nodos de clúster (miembros en orden de PageRank)
+    groups = defaultdict(list)
+    for node_id in communities["order"]:
+        if node_id not in visible:
+            groups[bucket(node_id)].append(node_id)
+    for number, members in sorted(groups.items()):
+        label = f"Comunidad {number + 1} · {len(members)}" if number >= 0 else f"Otros · {len(members)}"
+        node_element = {
+            'data': {
+                'id': f"{CLUSTER_PREFIX}{number}",
+                'label': label,
+                'type': 'Cluster',
+                'size': len(members),
+                'preview': [snapshot.labels.get(node_id, node_id) for node_id in members[:5]]
+            },
+            'classes': "node-cluster"
+        }
+        placed = [positions[node_id] for node_id in members if node_id in positions]
+        if placed:
+            node_element['position'] = {
+                'x': round(sum(x for x, _ in placed) / len(placed), 1),
+                'y': round(sum(y for _, y in placed) / len(placed), 1)
+            }
+        elements.append(node_element)
+
+    # Aristas agregadas entre clústeres y nodos visibles
+    def endpoint(node_id):
+        return node_id if node_id in visible else f"{CLUSTER_PREFIX}{bucket(node_id)}"
+
+    aggregated = defaultdict(int)
+    for relation in snapshot.relations:
+        source_id, target_id = str(relation.get('source_id')), str(relation.get('target_id'))
+        if source_id in visible and target_id in visible:
+            continue
+        if source_id not in snapshot.labels or target_id not in snapshot.labels:
+            continue
+        source, target = endpoint(source_id), endpoint(target_id)
+        if source != target:
+            aggregated[(source, target)] += 1
+    for (source, target), count in aggregated.items():
+        elements.append({
+            'data': {
+                'id': f"{source}-{target}",
+                'source': source,
+                'target': target,
+                'label': str(count),
+                'type': 'aggregate',
+                'weight': count
+            },
+            'classes': "edge-aggregate"
+        })
+
+    return elements
+
+def create_cluster_panel(node_data):
+    """
+    Panel de un clúster colapsado (el callback expand_cluster muestra sus miembros).
+    """
+    from dash import html
+    import dash_bootstrap_components as dbc
+
+    size = node_data.get('size', 0)
+    return dbc.Card([
+        dbc.CardHeader([
+            html.H5([
+                dbc.Badge("Clúster", color="secondary", className="me-2"),
+                node_data.get('label', '')
+            ], className="mb-0")
+        ]),
+        dbc.CardBody([
+            html.P([html.Strong("Nodos ocultos: "), f"{size:,}"]),
+            html.P([html.Strong("Principales: "), ", ".join(node_data.get('preview', []))]),
+            html.Small(
+                f"Al pulsarlo se muestran hasta {GRAPH_LOD_EXPAND_LIMIT} miembros más, por PageRank.",
+                className="text-muted"
+            )
+        ])
+    ], className="mt-3")
+
 def create_graph_info_panel(entities, relations):
     """
     Crea panel con estadísticas del grafo.
@@ -395,7 +613,7 @@ def create_graph_info_panel(entities, relations):
         ])
     ], className="mt-3")
 
-def create_node_detail_panel(node_data):
+def create_node_detail_panel(node_data, graph_version=None):
     """
     Panel detallado para nodo seleccionado CON EMBEDDINGS.
     """
@@ -420,8 +638,8 @@ def create_node_detail_panel(node_data):
     node_label = node_data.get('label', 'Sin nombre')
     node_id = node_data.get('id', 'N/A')
     
-    # Buscar embedding relacionado
-    embedding_section = get_node_embedding_info(node_label, node_id)
+    # Embedding guardado con la versión del grafo
+    embedding_section = get_node_embedding_info(node_label, node_id, graph_version)
     
     return dbc.Card([
         dbc.CardHeader([
@@ -448,7 +666,7 @@ def create_node_detail_panel(node_data):
             # Conexiones
             html.Hr(),
             html.H6("🔗 Conexiones:"),
-            html.Div(id="node-connections", children=get_node_connections(node_id)),
+            html.Div(id="node-connections", children=get_node_connections(node_id, graph_version)),
             
             # Embeddings
             html.Hr(),
@@ -458,34 +676,19 @@ def create_node_detail_panel(node_data):
         ])
     ], className="mt-3")
 
-def get_node_embedding_info(node_label, node_id, num_values=15):
+def get_node_embedding_info(node_label, node_id, graph_version=None, num_values=15):
     """
-    Busca y muestra información del embedding relacionado con el nodo.
+    Muestra el embedding del nodo, leído del almacén de grafos (sin llamadas de red).
     """
     from dash import html
     import dash_bootstrap_components as dbc
     
     try:
-        # Importar función de embeddings
-        from core import embeddings
-        from openai import OpenAI
-        import os
-        from dotenv import load_dotenv
-        
-        load_dotenv()
-        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-        
-        if not OPENAI_API_KEY:
-            return html.P("❌ No se puede acceder a embeddings: API key no configurada", 
-                         style={'color': '#ef4444', 'fontSize': '12px'})
-        
-        # Generar embedding para el texto del nodo
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.embeddings.create(
-            input=node_label,
-            model="text-embedding-3-small"
-        )
-        embedding_vector = response.data[0].embedding
+        # Embedding calculado en lote al construir el grafo
+        embedding_vector = graph_store.get_node_embedding(node_id, graph_version)
+        if not embedding_vector:
+            return html.P("⚠️ Esta versión del grafo no tiene embeddings de nodos guardados.",
+                         style={'color': '#f59e0b', 'fontSize': '12px'})
         
         # Tomar los primeros N valores
         first_values = embedding_vector[:num_values]
@@ -573,9 +776,9 @@ def get_node_embedding_info(node_label, node_id, num_values=15):
             html.Small(f"Error: {str(e)[:50]}...", style={'color': '#94a3b8'})
         ], style={'color': '#f59e0b', 'fontSize': '12px'})
 
-def get_node_connections(node_id):
+def get_node_connections(node_id, graph_version=None):
     """
-    Obtiene las conexiones de un nodo específico.
+    Obtiene las conexiones de un nodo específico (consultas indexadas en el almacén de grafos).
     """
     from dash import html
     
@@ -583,25 +786,11 @@ def get_node_connections(node_id):
         return "No se pudo determinar las conexiones."
     
     try:
-        # Obtener datos actuales del OCR
-        from callbacks.ocr_callbacks import GRAPH_DATA as OCR_GRAPH_DATA
-        relations = OCR_GRAPH_DATA.get('relations', [])
-        entities = OCR_GRAPH_DATA.get('entities', [])
-        
-        # Crear mapa de IDs a nombres
-        entity_map = {e.get('id'): e.get('text', e.get('id')) for e in entities}
-        
-        # Buscar relaciones
-        outgoing = []
-        incoming = []
-        
-        for rel in relations:
-            if rel.get('source_id') == node_id:
-                target_name = entity_map.get(rel.get('target_id'), rel.get('target_id'))
-                outgoing.append(f"{rel.get('type', 'relacionado')} → {target_name}")
-            elif rel.get('target_id') == node_id:
-                source_name = entity_map.get(rel.get('source_id'), rel.get('source_id'))
-                incoming.append(f"{source_name} → {rel.get('type', 'relacionado')}")
+        connections = graph_store.get_node_connections(node_id, graph_version, limit=5)
+        outgoing = [f"{rel_type or 'relacionado'} → {target_name}"
+                    for rel_type, target_name in connections["outgoing"]]
+        incoming = [f"{source_name} → {rel_type or 'relacionado'}"
+                    for source_name, rel_type in connections["incoming"]]
         
         result = []
         
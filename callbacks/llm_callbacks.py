@@ -22,11 +22,7 @@ def register_llm_callbacks(app):
         if not chunks:
             return no_update
         try:
-            all_entities, all_relations = [], []
-            for chunk in chunks:
-                out = llm.extract_entities_relations(chunk, llm_method=llm_method)
-                all_entities.extend(out.get("entities", []))
-                all_relations.extend(out.get("relations", []))
+            all_entities, all_relations = llm.extract_graph_from_chunks(chunks, llm_method=llm_method)
             g.entities, g.relations = all_entities, all_relations
             return f"Extracción LLM completa. {len(all_entities)} entidades, {len(all_relations)} relaciones."
         except Exception as e:
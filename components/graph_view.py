@@ -4,7 +4,7 @@
 import dash_cytoscape as cyto
 from dash import html, dcc
 
-def graph_view(elements=[], layout_name="cose", style=None, stylesheet=None):
+def graph_view(elements=[], layout_name="preset", style=None, stylesheet=None):
     """
     Componente simplificado del grafo que garantiza la visualización correcta.
     Incluye Store para persistencia visual entre pestañas.
@@ -201,6 +201,20 @@ def graph_view(elements=[], layout_name="cose", style=None, stylesheet=None):
             }
         },
         
+        # Clústeres colapsados (nivel de detalle): tamaño según número de miembros
+        {
+            "selector": "node[type = \"Cluster\"]",
+            "style": {
+                "width": "mapData(size, 1, 500, 70, 180)",
+                "height": "mapData(size, 1, 500, 70, 180)",
+                "background-color": "#475569",
+                "background-opacity": 0.85,
+                "border-color": "#94a3b8",
+                "border-style": "dashed",
+                "shape": "ellipse"
+            }
+        },
+        
         # ===== ARISTAS =====
         {
             "selector": "edge",
@@ -239,6 +253,17 @@ def graph_view(elements=[], layout_name="cose", style=None, stylesheet=None):
             }
         },
         
+        # Aristas agregadas hacia clústeres
+        {
+            "selector": "edge[type = \"aggregate\"]",
+            "style": {
+                "width": "mapData(weight, 1, 100, 2, 12)",
+                "line-style": "dashed",
+                "line-color": "#475569",
+                "target-arrow-color": "#475569"
+            }
+        },
+        
         # ===== EFECTOS HOVER =====
         {
             "selector": "node:hover",
@@ -256,24 +281,13 @@ def graph_view(elements=[], layout_name="cose", style=None, stylesheet=None):
         }
     ]
 
-    # Layout optimizado
+    # Layout "preset": las posiciones se calculan en el servidor (core/graph_layout.py)
+    # y llegan con los elementos, así el navegador no ejecuta un layout de fuerzas
     optimized_layout = {
         'name': layout_name,
-        'idealEdgeLength': 100,
-        'nodeOverlap': 20,
-        'refresh': 20,
         'fit': True,
         'padding': 30,
-        'randomize': False,
-        'componentSpacing': 100,
-        'nodeRepulsion': 400000,
-        'edgeElasticity': 100,
-        'nestingFactor': 5,
-        'gravity': 80,
-        'numIter': 1000,
-        'initialTemp': 200,
-        'coolingFactor': 0.95,
-        'minTemp': 1.0
+        'animate': False
     }
 
     return html.Div([
@@ -289,6 +303,15 @@ def graph_view(elements=[], layout_name="cose", style=None, stylesheet=None):
             }
         ),
         
+        # Versión del grafo mostrada en esta sesión (core/graph_store.py)
+        dcc.Store(id="graph-version", storage_type="session"),
+
+        # Nivel de detalle: versión y nodos revelados al expandir clústeres
+        dcc.Store(id="graph-lod-state"),
+
+        # Elementos en formato compacto (core/graph_wire.py), expandidos en el navegador
+        dcc.Store(id="graph-elements-compact"),
+
         # Grafo principal
         cyto.Cytoscape(
             id="knowledge-graph",
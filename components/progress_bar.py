@@ -15,5 +15,8 @@ def progress_bar():
             id="loading-progress",
             type="default",
             children=html.Div(id="progress-info")
-        )
+        ),
+        # Trabajo de ingesta en curso y sondeo de su progreso
+        dcc.Store(id="ingestion-job-id", storage_type="session"),
+        dcc.Interval(id="job-poll-interval", interval=1500, disabled=True)
     ], style={'margin-bottom': '24px'})
\ No newline at end of file
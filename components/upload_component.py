@@ -6,13 +6,17 @@ from dash import dcc, html
 def upload_component():
     return html.Div([
         html.Div(className="upload-area", children=[
-            dcc.Upload(
+            # Zona de subida por trozos (assets/chunked_upload.js -> rutas /upload)
+            html.Div(
                 id='upload-data',
                 className='upload-area',
-                children=html.Div(
-                    'Arrastra o selecciona un archivo', 
-                    style={'color': 'var(--accent-blue)', 'textDecoration': 'underline'}
-                ),
+                children=[
+                    html.Div(
+                        'Arrastra o selecciona un archivo', 
+                        style={'color': 'var(--accent-blue)', 'textDecoration': 'underline'}
+                    ),
+                    html.Input(id='upload-file-input', type='file', style={'display': 'none'})
+                ],
                 style={
                     'width': '100%',
                     'height': '100%',
@@ -26,9 +30,10 @@ def upload_component():
                     'textAlign': 'center',
                     'fontSize': '1rem',
                     'transition': 'var(--transition)'
-                },
-                multiple=False
+                }
             ),
+            # Archivo ya subido a disco, pendiente de encolar
+            dcc.Store(id='uploaded-file'),
         ]),
         html.Div([
             dcc.Input(
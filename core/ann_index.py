@@ -0,0 +1,275 @@
+# ./core/ann_index.py
+# Índice aproximado IVF-PQ (inverted file + product quantization) para el almacén vectorial local
+#
+# - IVF: k-means esférico sobre los vectores normalizados; cada vector pertenece a una lista
+# - PQ: el residuo (vector - centroide) se codifica en `m` bytes, uno por subespacio
+# - Consulta: se sondean las `nprobe` listas más cercanas, se puntúan los códigos con una
+#   tabla de productos escalares precalculada y los mejores candidatos se reordenan con
+#   los vectores exactos (ver LocalVectorStore.query en core/vector_store.py)
+
+import os
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Por debajo de este número de candidatos se usa búsqueda exacta
+ANN_MIN_VECTORS = int(os.getenv("ANN_MIN_VECTORS", "50000"))
+# Número de listas IVF (0 = automático, ~4·√n)
+ANN_NLIST = int(os.getenv("ANN_NLIST", "0"))
+# Listas sondeadas por consulta (más = más recall, más latencia)
+ANN_NPROBE = int(os.getenv("ANN_NPROBE", "16"))
+# Bytes por vector del código PQ (debe dividir la dimensión)
+ANN_PQ_M = int(os.getenv("ANN_PQ_M", "48"))
+# Candidatos reordenados con el vector exacto, en múltiplos de top_k
+ANN_RERANK = int(os.getenv("ANN_RERANK", "30"))
+# Vectores usados para entrenar los cuantizadores
+ANN_TRAIN_SAMPLE = int(os.getenv("ANN_TRAIN_SAMPLE", "20000"))
+# Se reentrena cuando la colección crece este factor desde el último entrenamiento
+ANN_RETRAIN_GROWTH = float(os.getenv("ANN_RETRAIN_GROWTH", "4"))
+
+_PQ_CENTROIDS = 256
+# Filas cambiadas desde la última agrupación por listas que se toleran antes de reagrupar
+_REOPEN_MIN_ROWS = 2000
+_REOPEN_FRACTION = 0.02
+
+def kmeans(data, k, iterations=15, spherical=False, seed=0, init="random"):
+    """
+    k-means por lotes con NumPy. Con `spherical=True` asigna por producto escalar
+    y renormaliza los centroides (datos normalizados, métrica coseno). Con
+    `init="kmeans++"` los centroides iniciales se eligen separados entre sí.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    data = np.asarray(data, dtype=np.float32)
+    k = min(k, len(data))
+    if init == "kmeans++":
+        centroids = _kmeans_plus_plus(data, k, rng)
+    else:
+        centroids = data[rng.choice(len(data), k, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = assign_clusters(data, centroids, spherical)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, data)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        if empty.any():
+            # Clusters vacíos: reiniciar con puntos aleatorios
+            centroids[empty] = data[rng.choice(len(data), int(empty.sum()), replace=False)]
+        if spherical:
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+def _kmeans_plus_plus(data, k, rng):
+    """
+    Semillas de k-means++: cada centroide nuevo se elige con probabilidad
+    proporcional a la distancia² al centroide más cercano ya elegido.
+    """
+    import numpy as np
+
+    norms = (data ** 2).sum(axis=1)
+    centroids = np.empty((k, data.shape[1]), dtype=np.float32)
+    closest = np.full(len(data), np.inf)
+    for i in range(k):
+        total = closest.sum() if i else 0
+        index = rng.choice(len(data), p=closest / total) if 0 < total < np.inf else rng.integers(len(data))
+        centroids[i] = data[index]
+        distance = np.maximum(norms - 2 * data @ centroids[i] + (centroids[i] ** 2).sum(), 0)
+        np.minimum(closest, distance, out=closest)
+    return centroids
+
+def assign_clusters(data, centroids, spherical=False, block=8192):
+    """
+    Índice del centroide más cercano de cada fila, procesando por bloques.
+    """
+    import numpy as np
+
+    result = np.empty(len(data), dtype=np.int32)
+    centroid_norms = None if spherical else (centroids ** 2).sum(axis=1)
+    for start in range(0, len(data), block):
+        scores = data[start:start + block] @ centroids.T
+        if not spherical:
+            scores = 2 * scores - centroid_norms  # -‖x-c‖² salvo el término ‖x‖²
+        result[start:start + block] = scores.argmax(axis=1)
+    return result
+
+class IVFPQIndex:
+    """
+    Cuantizadores IVF-PQ de una generación y sus códigos por fila en disco.
+
+    Archivos (en `directory`, prefijo `ann.g<generación>`):
+      - .centroids.npy / .codebooks.npy: cuantizadores entrenados
+      - .lists.i32: lista IVF de cada fila (-1 = sin codificar), leído con np.memmap
+      - .codes.u8: código PQ de cada fila (m bytes), leído con np.memmap
+    Las filas son las mismas que las de la matriz de vectores del almacén local.
+    """
+
+    def __init__(self, directory, generation, centroids, codebooks):
+        self.directory = Path(directory)
+        self.generation = generation
+        self.centroids = centroids
+        self.codebooks = codebooks
+        self.nlist = len(centroids)
+        self.m, _, self.sub_dim = codebooks.shape
+
+    @staticmethod
+    def _prefix(directory, generation):
+        return Path(directory) / f"ann.g{generation}"
+
+    @property
+    def lists_path(self):
+        return Path(f"{self._prefix(self.directory, self.generation)}.lists.i32")
+
+    @property
+    def codes_path(self):
+        return Path(f"{self._prefix(self.directory, self.generation)}.codes.u8")
+
+    @classmethod
+    def train(cls, directory, generation, sample, nlist=ANN_NLIST, m=ANN_PQ_M, total=None):
+        """
+        Entrena los cuantizadores con una muestra de vectores normalizados.
+        """
+        import numpy as np
+
+        sample = np.asarray(sample, dtype=np.float32)
+        dimension = sample.shape[1]
+        if not nlist:
+            nlist = int(4 * np.sqrt(total or len(sample)))
+        nlist = max(1, min(nlist, len(sample) // 39))  # ~39 puntos por centroide como mínimo
+        while dimension % m:
+            m -= 1
+
+        centroids = kmeans(sample, nlist, spherical=True)
+        residuals = sample - centroids[assign_clusters(sample, centroids, spherical=True)]
+        sub_dim = dimension // m
+        codebooks = np.stack([
+            kmeans(residuals[:, i * sub_dim:(i + 1) * sub_dim], _PQ_CENTROIDS, iterations=10, seed=i)
+            for i in range(m)
+        ])
+        if codebooks.shape[1] < _PQ_CENTROIDS:
+            codebooks = np.pad(codebooks, ((0, 0), (0, _PQ_CENTROIDS - codebooks.shape[1]), (0, 0)))
+
+        prefix = cls._prefix(directory, generation)
+        np.save(f"{prefix}.centroids.npy", centroids)
+        np.save(f"{prefix}.codebooks.npy", codebooks.astype(np.float32))
+        return cls(directory, generation, centroids, codebooks.astype(np.float32))
+
+    @classmethod
+    def load(cls, directory, generation):
+        import numpy as np
+
+        prefix = cls._prefix(directory, generation)
+        return cls(directory, generation,
+                   np.load(f"{prefix}.centroids.npy"), np.load(f"{prefix}.codebooks.npy"))
+
+    @classmethod
+    def remove_other_generations(cls, directory, keep):
+        """
+        Borra los archivos de generaciones anteriores (los procesos que aún los
+        tengan mapeados siguen leyéndolos hasta recargar).
+        """
+        for path in Path(directory).glob("ann.g*"):
+            if not path.name.startswith(f"ann.g{keep}."):
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def encode(self, unit_vectors):
+        """
+        Devuelve (listas IVF, códigos PQ) de vectores normalizados.
+        """
+        import numpy as np
+
+        lists = assign_clusters(unit_vectors, self.centroids, spherical=True)
+        residuals = unit_vectors - self.centroids[lists]
+        codes = np.empty((len(unit_vectors), self.m), dtype=np.uint8)
+        for i in range(self.m):
+            codes[:, i] = assign_clusters(residuals[:, i * self.sub_dim:(i + 1) * self.sub_dim], self.codebooks[i])
+        return lists, codes
+
+    def write_rows(self, rows, unit_vectors):
+        """
+        Codifica vectores y escribe su lista y código en las filas indicadas.
+        """
+        import numpy as np
+
+        lists, codes = self.encode(np.asarray(unit_vectors, dtype=np.float32))
+        # Al crecer el archivo, las filas aún no codificadas quedan con lista -1 (0xff...)
+        for path, values, width, fill in ((self.lists_path, lists, 4, b"\xff"), (self.codes_path, codes, self.m, b"\x00")):
+            with open(path, "r+b" if path.exists() else "w+b") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                end = (max(rows) + 1) * width
+                if size < end:
+                    f.write(fill * (end - size))
+                for row, value in zip(rows, values):
+                    f.seek(row * width)
+                    f.write(np.ascontiguousarray(value).tobytes())
+                f.flush()
+
+    def open_rows(self, total_rows):
+        """
+        Prepara la búsqueda sobre las filas 0..total_rows-1: agrupa las filas por lista
+        IVF y mapea los códigos PQ. Las filas sin codificar (lista -1) se puntúan siempre.
+        """
+        import numpy as np
+
+        # Sin comprobar antes si existen: otro proceso puede borrarlos entre la comprobación
+        # y el memmap (remove_other_generations). El FileNotFoundError/ValueError lo trata
+        # quien llama
+        stored = np.memmap(self.lists_path, dtype=np.int32, mode="r")
+        codes = np.memmap(self.codes_path, dtype=np.uint8, mode="r").reshape(-1, self.m)
+        lists = np.full(total_rows, -1, dtype=np.int32)
+        inside = min(len(stored), total_rows)
+        lists[:inside] = stored[:inside]
+        self._row_lists = lists
+        self._order = np.argsort(lists, kind="stable")
+        sorted_lists = lists[self._order]
+        self._starts = np.searchsorted(sorted_lists, np.arange(self.nlist), side="left")
+        self._ends = np.searchsorted(sorted_lists, np.arange(self.nlist), side="right")
+        self._unindexed = self._order[:np.searchsorted(sorted_lists, 0)]
+        self._codes = codes
+        self._changed = np.zeros(total_rows, dtype=bool)
+        self._extra = np.zeros(0, dtype=np.int64)
+
+    def note_rows(self, rows, total_rows):
+        """
+        Registra filas escritas o borradas desde open_rows: salen de sus listas (su
+        lista/código pueden haber cambiado) y se puntúan con las no codificadas. Cuando
+        se acumulan demasiadas se reagrupa todo con open_rows (mismos errores).
+        """
+        import numpy as np
+
+        self._changed[rows[rows < len(self._changed)]] = True
+        self._extra = np.union1d(self._extra, rows)
+        if len(self._extra) > max(_REOPEN_MIN_ROWS, _REOPEN_FRACTION * len(self._changed)):
+            self.open_rows(total_rows)
+
+    def search(self, unit_query, mask, top_n, nprobe=ANN_NPROBE):
+        """
+        Filas de los `top_n` mejores candidatos aproximados entre las permitidas por
+        `mask`, más las filas sin codificar o cambiadas desde open_rows.
+        """
+        import numpy as np
+
+        coarse = self.centroids @ unit_query
+        probe = np.argpartition(-coarse, min(nprobe, self.nlist) - 1)[:nprobe]
+        positions = np.concatenate([self._order[self._starts[p]:self._ends[p]] for p in probe])
+        positions = positions[mask[positions] & ~self._changed[positions]]
+
+        if len(positions) > top_n:
+            # Puntuación asimétrica: q·c + Σ tabla[subespacio, código]
+            table = np.einsum("mkd,md->mk", self.codebooks, unit_query.reshape(self.m, self.sub_dim))
+            codes = self._codes[positions]
+            approx = coarse[self._row_lists[positions]] + table[np.arange(self.m), codes].sum(axis=1)
+            positions = positions[np.argpartition(-approx, top_n - 1)[:top_n]]
+
+        unindexed = np.concatenate([self._unindexed[~self._changed[self._unindexed]], self._extra])
+        unindexed = unindexed[mask[unindexed]]
+        return np.concatenate([positions, unindexed]) if len(unindexed) else positions
@@ -0,0 +1,262 @@
+# ./core/embedding_cache.py
+# Caché persistente de embeddings compartida entre procesos (workers de gunicorn e ingesta)
+#
+# Índice en SQLite (clave -> slot) + matriz float32/float16 memory-mapped por modelo.
+# Clave: sha256(model + texto). Capacidad acotada con desalojo LRU aproximado.
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+EMBEDDING_CACHE_DIR = Path(os.getenv("EMBEDDING_CACHE_DIR", DATA_DIR / 'embedding_cache'))
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "100000"))
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")  # float32 | float16
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Solo se actualiza last_used si ha pasado este tiempo (evita una escritura por acierto)
+_TOUCH_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS models (
+    model TEXT PRIMARY KEY,
+    dim INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    slot INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    ready INTEGER NOT NULL DEFAULT 0,
+    last_used REAL NOT NULL,
+    UNIQUE (model, slot)
+);
+CREATE INDEX IF NOT EXISTS idx_entries_lru ON entries (model, last_used);
+"""
+
+def text_key(model, text):
+    """
+    Clave de caché de un texto para un modelo de embeddings.
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """
+    Caché de embeddings en disco, segura para varios procesos.
+
+    Escritura: en una transacción se reserva un slot (desalojando el menos usado
+    si está lleno) y se confirma; después se escribe el vector en la matriz
+    memory-mapped y se marca la entrada como lista. Lectura: se lee (slot, versión),
+    se copia el vector y se vuelve a comprobar la entrada; si cambió entre medias,
+    el acierto se descarta (como un seqlock).
+    """
+
+    def __init__(self, directory=EMBEDDING_CACHE_DIR, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 dtype=EMBEDDING_CACHE_DTYPE):
+        self.directory = Path(directory)
+        self.max_entries = max_entries
+        self.dtype = dtype
+        self.hits = 0
+        self.misses = 0
+        self._matrices = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.directory / 'index.db', timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        return conn
+
+    def _matrix(self, model, dim):
+        """
+        Matriz memory-mapped (max_entries x dim) del modelo, abierta una vez por proceso.
+        """
+        import numpy as np
+
+        with self._lock:
+            matrix = self._matrices.get(model)
+            if matrix is None:
+                safe_model = re.sub(r'[^A-Za-z0-9_.-]', '_', model)
+                path = self.directory / f"{safe_model}.{dim}.{self.dtype}.bin"
+                size = self.max_entries * dim * np.dtype(self.dtype).itemsize
+                with open(path, "ab") as f:
+                    if f.tell() < size:
+                        f.truncate(size)  # Archivo disperso: no ocupa disco hasta escribirse
+                matrix = np.memmap(path, dtype=self.dtype, mode="r+", shape=(self.max_entries, dim))
+                self._matrices[model] = matrix
+            return matrix
+
+    def _model_dim(self, conn, model):
+        row = conn.execute("SELECT dim FROM models WHERE model = ?", (model,)).fetchone()
+        return row[0] if row else None
+
+    def get_many(self, model, texts):
+        """
+        Devuelve una lista alineada con `texts` con el vector cacheado o None.
+        """
+        results = [None] * len(texts)
+        if not texts:
+            return results
+
+        conn = self._connect()
+        try:
+            dim = self._model_dim(conn, model)
+            if dim is None:
+                self.misses += len(texts)
+                return results
+            matrix = self._matrix(model, dim)
+
+            keys = [text_key(model, text) for text in texts]
+            now = time.time()
+            for i, key in enumerate(keys):
+                row = conn.execute("SELECT slot, version FROM entries WHERE key = ? AND ready = 1", (key,)).fetchone()
+                if row is None:
+                    continue
+                vector = matrix[row[0]].astype("float32").tolist()
+                # Validar que el slot no se reutilizó mientras se copiaba
+                check = conn.execute("SELECT slot, version FROM entries WHERE key = ? AND ready = 1", (key,)).fetchone()
+                if check == row:
+                    results[i] = vector
+                    conn.execute("UPDATE entries SET last_used = ? WHERE key = ? AND last_used < ?",
+                                 (now, key, now - _TOUCH_INTERVAL))
+        finally:
+            conn.close()
+
+        found = sum(1 for r in results if r is not None)
+        self.hits += found
+        self.misses += len(texts) - found
+        return results
+
+    def put_many(self, model, texts, vectors):
+        """
+        Guarda los vectores de `texts`, desalojando las entradas menos usadas si hace falta.
+        """
+        if not texts:
+            return
+        import numpy as np
+
+        dim = len(vectors[0])
+        conn = self._connect()
+        try:
+            conn.execute("INSERT OR IGNORE INTO models (model, dim) VALUES (?, ?)", (model, dim))
+            if self._model_dim(conn, model) != dim:
+                logger.warning(f"Dimensión inesperada para {model}, no se cachea")
+                return
+            matrix = self._matrix(model, dim)
+
+            # 1. Reservar slots (confirmando el desalojo antes de sobrescribir)
+            reserved = []
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                used = conn.execute("SELECT COUNT(*) FROM entries WHERE model = ?", (model,)).fetchone()[0]
+                version = conn.execute("SELECT COALESCE(MAX(version), 0) FROM entries").fetchone()[0]
+                for text, vector in zip(texts, vectors):
+                    key = text_key(model, text)
+                    existing = conn.execute("SELECT slot, ready, last_used FROM entries WHERE key = ?", (key,)).fetchone()
+                    if existing and (existing[1] or existing[2] > now - _TOUCH_INTERVAL):
+                        continue  # Ya cacheado (o otro proceso lo está escribiendo)
+                    if existing:
+                        # Reserva huérfana de un proceso que murió antes de escribir: reutilizar su slot
+                        conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+                        slot = existing[0]
+                    elif used < self.max_entries:
+                        # Sin huecos: los slots solo se liberan al desalojar (y se reutilizan en el acto)
+                        slot = conn.execute(
+                            "SELECT COALESCE(MAX(slot) + 1, 0) FROM entries WHERE model = ?", (model,)
+                        ).fetchone()[0]
+                        used += 1
+                    else:
+                        victim = conn.execute(
+                            "SELECT key, slot FROM entries WHERE model = ? ORDER BY last_used LIMIT 1", (model,)
+                        ).fetchone()
+                        conn.execute("DELETE FROM entries WHERE key = ?", (victim[0],))
+                        slot = victim[1]
+                    version += 1
+                    conn.execute(
+                        "INSERT INTO entries (key, model, slot, version, ready, last_used) VALUES (?, ?, ?, ?, 0, ?)",
+                        (key, model, slot, version, now)
+                    )
+                    reserved.append((key, slot, vector))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            # 2. Escribir los vectores y marcarlos como listos
+            for _, slot, vector in reserved:
+                matrix[slot] = np.asarray(vector, dtype=self.dtype)
+            matrix.flush()
+            conn.executemany("UPDATE entries SET ready = 1 WHERE key = ?", [(key,) for key, _, _ in reserved])
+        finally:
+            conn.close()
+
+    def stats(self):
+        """
+        Aciertos/fallos de este proceso y ocupación de la caché.
+        """
+        conn = self._connect()
+        try:
+            entries = conn.execute("SELECT COUNT(*) FROM entries WHERE ready = 1").fetchone()[0]
+        finally:
+            conn.close()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "dtype": self.dtype
+        }
+
+    def clear(self):
+        """
+        Vacía el índice (los archivos de vectores se reutilizan).
+        """
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM entries")
+        finally:
+            conn.close()
+
+# Instancia global de la caché
+embedding_cache = EmbeddingCache()
+
+def cached_embed(client, texts, model, embed_fn):
+    """
+    Devuelve los embeddings de `texts`, llamando a `embed_fn(client, textos, model)`
+    solo para los que no están en caché.
+    """
+    texts = list(texts)
+    if not EMBEDDING_CACHE_ENABLED:
+        return embed_fn(client, texts, model)
+
+    try:
+        vectors = embedding_cache.get_many(model, texts)
+    except Exception as e:
+        logger.warning(f"Caché de embeddings no disponible: {e}")
+        return embed_fn(client, texts, model)
+
+    # Textos repetidos dentro de la misma petición se vectorizan una sola vez
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    if missing:
+        fresh = dict(zip(missing, embed_fn(client, missing, model)))
+        try:
+            embedding_cache.put_many(model, missing, [fresh[text] for text in missing])
+        except Exception as e:
+            logger.warning(f"No se pudo guardar en la caché de embeddings: {e}")
+        vectors = [vector if vector is not None else fresh[text] for text, vector in zip(texts, vectors)]
+
+    return vectors
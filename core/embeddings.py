@@ -1,9 +1,18 @@
 # ./core/embeddings.py
-# Lógica para conexión, almacenamiento, consulta y eliminación de embeddings en Pinecone serverless
+# Lógica para conexión, almacenamiento, consulta y eliminación de embeddings
+# (Pinecone serverless o almacén local, ver core/vector_store.py)
 
 import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from pinecone import Pinecone
+
+from core import manifest
+from core.embedding_cache import cached_embed
+from core.utils import generate_chunk_id
+from core.vector_store import create_vector_store, DEFAULT_NAMESPACE
 
 load_dotenv()
 
@@ -11,71 +20,371 @@ PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 PINECONE_INDEX_NAME = os.getenv("PINECONE_INDEX")
 PINECONE_ENV = os.getenv("PINECONE_ENV")
 DIMENSION = 1536  # Cambia si tu modelo de embedding tiene otra dimensión
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Límites de los lotes de ingesta (OpenAI admite hasta 2048 entradas por request,
+# Pinecone recomienda upserts de ~100 vectores / 2MB)
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "100"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("EMBED_BATCH_MAX_CHARS", "200000"))
+UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
+# IDs por llamada de borrado (Pinecone admite hasta 1000)
+DELETE_BATCH_SIZE = int(os.getenv("DELETE_BATCH_SIZE", "1000"))
+# Cada documento en su propio namespace: borrarlo es un único delete_all, pero las
+# búsquedas sin filtro de documento consultan todos los namespaces (en paralelo)
+VECTOR_NAMESPACE_PER_DOCUMENT = os.getenv("VECTOR_NAMESPACE_PER_DOCUMENT", "false").lower() in ("1", "true", "yes")
+DOCUMENT_NAMESPACE_PREFIX = "doc-"
+QUERY_FANOUT_WORKERS = int(os.getenv("QUERY_FANOUT_WORKERS", "8"))
+# Segundos que se reutiliza la lista de namespaces antes de volver a pedirla al índice
+NAMESPACE_CACHE_TTL = float(os.getenv("NAMESPACE_CACHE_TTL", "60"))
+# Consultas de respaldo que pueden devolver solo vectores ya borrados (consistencia
+# eventual) antes de abandonar, con espera exponencial desde DELETE_RETRY_DELAY segundos
+DELETE_CONSISTENCY_RETRIES = int(os.getenv("DELETE_CONSISTENCY_RETRIES", "6"))
+DELETE_RETRY_DELAY = float(os.getenv("DELETE_RETRY_DELAY", "0.25"))
 
-if not PINECONE_API_KEY or not PINECONE_INDEX_NAME:
-    raise ValueError("Faltan variables de entorno para Pinecone: PINECONE_API_KEY y PINECONE_INDEX son requeridas")
+logger = logging.getLogger(__name__)
 
-# Inicializa cliente Pinecone
-pc = Pinecone(api_key=PINECONE_API_KEY)
-index = pc.Index(PINECONE_INDEX_NAME)
+# Backend vectorial (VECTOR_STORE=pinecone|local), creado al primer uso
+_vector_store = None
+_vector_store_lock = threading.Lock()
+# Namespaces del índice por proceso: {"store", "expires", "namespaces"}
+_namespace_cache = {"store": None, "expires": 0.0, "namespaces": set()}
+_namespace_lock = threading.Lock()
+
+def get_vector_store():
+    """
+    Devuelve el backend vectorial del proceso, creándolo la primera vez.
+    """
+    global _vector_store
+    if _vector_store is None:
+        with _vector_store_lock:
+            if _vector_store is None:
+                _vector_store = create_vector_store(dimension=DIMENSION)
+    return _vector_store
+
+def document_namespace(document_id):
+    """
+    Namespace donde se guardan los vectores de un documento (el por defecto salvo
+    con VECTOR_NAMESPACE_PER_DOCUMENT).
+    """
+    if VECTOR_NAMESPACE_PER_DOCUMENT:
+        return f"{DOCUMENT_NAMESPACE_PREFIX}{document_id}"
+    return DEFAULT_NAMESPACE
 
 def upsert_embedding(vector_id, vector_values, document_id, metadata=None):
     """
-    Inserta o actualiza un embedding en Pinecone, asociando un document_id.
+    Inserta o actualiza un embedding en el almacén vectorial, asociando un document_id.
     """
     meta = metadata or {}
     meta["document_id"] = str(document_id)
     vectors = [{"id": str(vector_id), "values": vector_values, "metadata": meta}]
+    namespace = document_namespace(document_id)
     
     try:
-        result = index.upsert(vectors=vectors)
+        manifest.record_vector_ids(document_id, [vector_id], namespace)
+        result = get_vector_store().upsert(vectors=vectors, namespace=namespace)
+        _note_namespace(namespace)
         return result
     except Exception as e:
         print(f"❌ Error guardando embedding: {e}")
         raise
 
-def query_embedding(query_vector, top_k=5, include_metadata=True):
+def _iter_batches(items, max_items, max_chars=None, size_fn=len):
+    """
+    Agrupa elementos en lotes acotados por número de elementos y, opcionalmente, por caracteres.
+    """
+    batch, batch_chars = [], 0
+    for item in items:
+        item_chars = size_fn(item) if max_chars else 0
+        if batch and (len(batch) >= max_items or (max_chars and batch_chars + item_chars > max_chars)):
+            yield batch
+            batch, batch_chars = [], 0
+        batch.append(item)
+        batch_chars += item_chars
+    if batch:
+        yield batch
+
+def _embed_texts_api(client, texts, model):
+    response = client.embeddings.create(input=list(texts), model=model)
+    data = sorted(response.data, key=lambda d: d.index)
+    return [d.embedding for d in data]
+
+def embed_texts(client, texts, model=EMBEDDING_MODEL):
+    """
+    Genera los embeddings de una lista de textos en una sola llamada a la API.
+    Los textos ya vistos se sirven desde la caché en disco (core/embedding_cache.py).
+    Devuelve los vectores en el mismo orden que los textos.
+    """
+    return cached_embed(client, texts, model, _embed_texts_api)
+
+def embed_text(client, text, model=EMBEDDING_MODEL):
+    """
+    Embedding de un único texto (consultas, etiquetas de nodos), con caché.
+    """
+    return embed_texts(client, [text], model=model)[0]
+
+def embed_texts_batched(client, texts, model=EMBEDDING_MODEL,
+                        batch_size=EMBED_BATCH_SIZE, batch_max_chars=EMBED_BATCH_MAX_CHARS):
+    """
+    Embeddings de muchos textos en lotes acotados por número y caracteres (con caché).
+    """
+    vectors = []
+    for batch in _iter_batches(list(texts), batch_size, batch_max_chars):
+        vectors.extend(embed_texts(client, batch, model=model))
+    return vectors
+
+def embed_graph_nodes(entities, client=None, model=EMBEDDING_MODEL):
     """
-    Busca los embeddings más cercanos al vector de consulta.
+    Embeddings de las etiquetas de los nodos de un grafo, alineados con `entities`,
+    para guardarlos junto a la versión del grafo. Devuelve None si no se pueden calcular.
+    """
+    if not entities:
+        return None
+    try:
+        if client is None:
+            from openai import OpenAI
+            client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        labels = [str(entity.get("text") or entity.get("id")) for entity in entities]
+        return embed_texts_batched(client, labels, model=model)
+    except Exception as e:
+        logger.warning(f"No se pudieron calcular los embeddings de los nodos: {e}")
+        return None
+
+def upsert_embeddings_bulk(chunks, document_id, client, metadata=None, vectors=None,
+                           model=EMBEDDING_MODEL,
+                           embed_batch_size=EMBED_BATCH_SIZE,
+                           embed_batch_max_chars=EMBED_BATCH_MAX_CHARS,
+                           upsert_batch_size=UPSERT_BATCH_SIZE):
+    """
+    Genera y guarda los embeddings de todos los chunks de un documento por lotes.
+
+    Los chunks se vectorizan en lotes acotados por número y tamaño, y los vectores
+    se insertan en el almacén vectorial en lotes de `upsert_batch_size`. Si un lote falla se
+    reintenta chunk a chunk, de modo que un fallo puntual no aborta el documento.
+    Si se pasan `vectors` (alineados con `chunks`, p. ej. los del chunker semántico),
+    esos chunks no se vuelven a vectorizar.
+
+    Returns:
+        Diccionario con `saved`, `failed` (lista de {chunk_index, stage, error}),
+        `embed_calls` y `upsert_calls`.
     """
-    return index.query(
-        vector=query_vector,
-        top_k=top_k,
-        include_metadata=include_metadata
-    )
+    report = {"saved": 0, "failed": [], "embed_calls": 0, "upsert_calls": 0}
+    base_meta = metadata or {}
+
+    pending = [(i, chunk) for i, chunk in enumerate(chunks) if chunk and chunk.strip()]
+    precomputed = []
+    if vectors is not None:
+        precomputed = [((i, chunk), vectors[i]) for i, chunk in pending if vectors[i] is not None]
+        pending = [(i, chunk) for i, chunk in pending if vectors[i] is None]
+
+    def to_record(i, chunk, values):
+        meta = dict(base_meta)
+        meta.update({"chunk_index": i, "chunk_text": chunk[:500], "document_id": str(document_id)})
+        return {"id": generate_chunk_id(chunk, document_id), "values": values, "metadata": meta}
+
+    records = [to_record(i, chunk, values) for (i, chunk), values in precomputed]
+
+    # 1. Embeddings por lotes (solo los chunks sin vector)
+    for batch in _iter_batches(pending, embed_batch_size, embed_batch_max_chars, lambda item: len(item[1])):
+        try:
+            report["embed_calls"] += 1
+            values = embed_texts(client, [chunk for _, chunk in batch], model=model)
+            embedded = list(zip(batch, values))
+        except Exception as e:
+            logger.warning(f"Lote de embeddings falló ({e}), reintentando chunk a chunk")
+            embedded = []
+            for i, chunk in batch:
+                try:
+                    report["embed_calls"] += 1
+                    embedded.append(((i, chunk), embed_texts(client, [chunk], model=model)[0]))
+                except Exception as chunk_error:
+                    report["failed"].append({"chunk_index": i, "stage": "embed", "error": str(chunk_error)})
+
+        records.extend(to_record(i, chunk, values) for (i, chunk), values in embedded)
+
+    # 2. Upserts por lotes. Los IDs se registran antes de escribir: un ID sin vector
+    # no molesta al borrar, un vector sin ID registrado quedaría huérfano
+    store = get_vector_store()
+    namespace = document_namespace(document_id)
+    records.sort(key=lambda record: record["metadata"]["chunk_index"])
+    manifest.record_vector_ids(document_id, [record["id"] for record in records], namespace)
+    if records:
+        _note_namespace(namespace)
+    for batch in _iter_batches(records, upsert_batch_size):
+        try:
+            report["upsert_calls"] += 1
+            store.upsert(vectors=batch, namespace=namespace)
+            report["saved"] += len(batch)
+        except Exception as e:
+            logger.warning(f"Upsert por lotes falló ({e}), reintentando vector a vector")
+            for vector in batch:
+                try:
+                    report["upsert_calls"] += 1
+                    store.upsert(vectors=[vector], namespace=namespace)
+                    report["saved"] += 1
+                except Exception as vector_error:
+                    report["failed"].append({
+                        "chunk_index": vector["metadata"]["chunk_index"],
+                        "stage": "upsert",
+                        "error": str(vector_error)
+                    })
+
+    return report
+
+def query_embedding(query_vector, top_k=5, include_metadata=True, filter=None):
+    """
+    Busca los embeddings más cercanos al vector de consulta,
+    opcionalmente restringidos por un filtro de metadatos estilo Pinecone.
+    Con un namespace por documento, la búsqueda se reparte entre los namespaces
+    y se fusionan los mejores resultados.
+    """
+    store = get_vector_store()
+    if not VECTOR_NAMESPACE_PER_DOCUMENT:
+        return store.query(
+            vector=query_vector,
+            top_k=top_k,
+            include_metadata=include_metadata,
+            filter=filter
+        )
+
+    # Un filtro por document_id concreto solo necesita el namespace de ese documento
+    condition = (filter or {}).get("document_id")
+    document_id = condition.get("$eq") if isinstance(condition, dict) else condition
+    if isinstance(document_id, str):
+        namespaces = [document_namespace(document_id)]
+    else:
+        namespaces = _namespaces(store) or [DEFAULT_NAMESPACE]
+
+    def search(namespace):
+        return store.query(vector=query_vector, top_k=top_k, include_metadata=include_metadata,
+                           filter=filter, namespace=namespace).get("matches", [])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(QUERY_FANOUT_WORKERS, len(namespaces)))) as pool:
+        matches = [match for result in pool.map(search, namespaces) for match in result]
+    matches.sort(key=lambda match: match["score"], reverse=True)
+    return {"matches": matches[:top_k], "namespace": DEFAULT_NAMESPACE}
+
+def _namespaces(store, fresh=False):
+    """
+    Namespaces del índice desde la caché del proceso; se vuelven a pedir si la caché
+    caduca (NAMESPACE_CACHE_TTL), si cambia el backend o con `fresh`.
+    """
+    with _namespace_lock:
+        if fresh or _namespace_cache["store"] is not store or time.monotonic() >= _namespace_cache["expires"]:
+            stats = store.describe_index_stats()
+            _namespace_cache.update(store=store, expires=time.monotonic() + NAMESPACE_CACHE_TTL,
+                                    namespaces=set((stats.get("namespaces") or {}).keys()))
+        return sorted(_namespace_cache["namespaces"])
+
+def _note_namespace(namespace, present=True):
+    """
+    Refleja en la caché de namespaces un upsert o un borrado hecho por este proceso.
+    """
+    with _namespace_lock:
+        if present:
+            _namespace_cache["namespaces"].add(namespace)
+        else:
+            _namespace_cache["namespaces"].discard(namespace)
 
 def delete_all_embeddings():
     """
-    Borra todos los vectores del índice Pinecone (¡operación destructiva!).
+    Borra todos los vectores del índice, en todos sus namespaces (¡operación destructiva!).
     """
-    index.delete(delete_all=True)
+    store = get_vector_store()
+    for namespace in set(_namespaces(store, fresh=True)) | {DEFAULT_NAMESPACE}:
+        store.delete(delete_all=True, namespace=namespace)
+        _note_namespace(namespace, present=False)
+    # Los documentos del manifiesto ya no tienen vectores que reutilizar
+    manifest.clear_manifest()
+
+def _delete_ids(store, ids, namespace, batch_size):
+    calls = 0
+    for batch in _iter_batches(list(ids), batch_size):
+        store.delete(ids=batch, namespace=namespace)
+        calls += 1
+    return calls
 
-def delete_embeddings_by_document_id(document_id):
+def delete_embeddings_by_document_id(document_id, batch_size=DELETE_BATCH_SIZE):
     """
-    Borra todos los embeddings asociados a un document_id dado.
-    (Pensado para demos o volúmenes bajos; si tienes muchos vectores, implementa paginación)
+    Borra todos los embeddings asociados a un document_id dado, sin límite de chunks.
+
+    1. Namespace propio del documento: un único delete_all.
+    2. IDs registrados en el manifiesto o, si no hay registro, los listados por el
+       prefijo "<document_id>#"; se borran en lotes de `batch_size`.
+    3. Solo si no se encontró nada (vectores de antes de los IDs con prefijo): consultas
+       filtradas por document_id repetidas hasta que no devuelvan ningún vector.
+
+    Returns:
+        Diccionario {"deleted", "namespace_wiped", "delete_calls"} (`deleted` cuenta los
+        IDs enviados a borrar fuera del namespace propio).
     """
-    # Busca los IDs de los vectores con ese document_id
-    result = index.query(
-        vector=[0]*DIMENSION,  # Vector dummy (no usado en filtrado)
-        filter={"document_id": {"$eq": str(document_id)}},
-        top_k=1000,  # Ajusta según lo que esperes por documento
-        include_values=False,
-        include_metadata=True
-    )
-    ids_to_delete = [m["id"] for m in result.get("matches", [])]
-    if ids_to_delete:
-        index.delete(ids=ids_to_delete)
+    document_id = str(document_id)
+    store = get_vector_store()
+    report = {"deleted": 0, "namespace_wiped": False, "delete_calls": 0}
+
+    recorded = manifest.document_vector_ids(document_id)
+
+    # 1. Namespace propio (si el manifiesto no lo conoce, se comprueba en el índice)
+    own_namespace = f"{DOCUMENT_NAMESPACE_PREFIX}{document_id}"
+    if own_namespace in recorded or (not recorded and own_namespace in _namespaces(store, fresh=True)):
+        store.delete(delete_all=True, namespace=own_namespace)
+        _note_namespace(own_namespace, present=False)
+        report["namespace_wiped"] = True
+        report["delete_calls"] += 1
+
+    # 2. IDs del manifiesto; sin registro, listado por prefijo (los índices pod-based no permiten listar)
+    by_namespace = {namespace: set(ids) for namespace, ids in recorded.items() if namespace != own_namespace}
+    if not recorded:
+        try:
+            for page in store.list_ids(namespace=DEFAULT_NAMESPACE, prefix=f"{document_id}#"):
+                by_namespace.setdefault(DEFAULT_NAMESPACE, set()).update(page)
+        except Exception as e:
+            logger.debug(f"Listado por prefijo no disponible: {e}")
+    for namespace, ids in by_namespace.items():
+        report["delete_calls"] += _delete_ids(store, sorted(ids), namespace, batch_size)
+        report["deleted"] += len(ids)
+
+    # 3. Respaldo para vectores antiguos sin prefijo ni registro: se consulta hasta que
+    # el filtro no devuelva nada. Tras un borrado el índice puede seguir devolviendo los
+    # mismos IDs un momento (consistencia eventual); entonces se espera y se reintenta.
+    if not report["namespace_wiped"] and not report["deleted"]:
+        seen, stale_rounds = set(), 0
+        while True:
+            result = store.query(
+                vector=[0.0] * DIMENSION,  # Vector dummy (solo cuenta el filtro)
+                filter={"document_id": {"$eq": document_id}},
+                top_k=batch_size,
+                include_values=False,
+                include_metadata=False
+            )
+            matches = [match["id"] for match in result.get("matches", [])]
+            if not matches:
+                break
+            ids = [vector_id for vector_id in matches if vector_id not in seen]
+            if ids:
+                stale_rounds = 0
+                seen.update(ids)
+                report["delete_calls"] += _delete_ids(store, ids, DEFAULT_NAMESPACE, batch_size)
+                report["deleted"] += len(ids)
+                continue
+            stale_rounds += 1
+            if stale_rounds > DELETE_CONSISTENCY_RETRIES:
+                logger.warning(f"El índice sigue devolviendo vectores borrados de {document_id}; "
+                               f"puede quedar alguno por borrar")
+                break
+            time.sleep(DELETE_RETRY_DELAY * 2 ** (stale_rounds - 1))
+
+    manifest.forget_document(document_id)
+    return report
 
 def get_index_stats():
     """
     Obtiene estadísticas del índice (útil para debugging).
     """
-    return index.describe_index_stats()
+    return get_vector_store().describe_index_stats()
 
 def test_connection():
     """
-    Prueba la conexión con Pinecone.
+    Prueba la conexión con el almacén vectorial.
     """
     try:
         stats = get_index_stats()
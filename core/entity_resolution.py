@@ -0,0 +1,224 @@
+# ./core/entity_resolution.py
+# Resolución de entidades entre chunks: fusiona menciones de la misma entidad real
+# ("Microsoft", "Microsoft Corp.", "MICROSOFT") en un único nodo
+#
+# Para no comparar todas las parejas (O(n²)), cada entidad se indexa por claves de
+# bloqueo (nombre normalizado, tokens, siglas y, opcionalmente, firmas LSH de su
+# embedding) y solo se comparan las entidades que comparten bloque.
+
+import os
+import logging
+from collections import defaultdict
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+ENTITY_RESOLUTION_ENABLED = os.getenv("ENTITY_RESOLUTION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Comparar también por similitud de embeddings de los nombres (una llamada por lote, cacheada)
+ENTITY_RESOLUTION_EMBEDDINGS = os.getenv("ENTITY_RESOLUTION_EMBEDDINGS", "true").lower() in ("1", "true", "yes")
+# Umbrales de similitud para fusionar (trigramas de caracteres y coseno de embeddings)
+NAME_SIMILARITY_THRESHOLD = float(os.getenv("ENTITY_NAME_SIMILARITY", "0.85"))
+EMBEDDING_SIMILARITY_THRESHOLD = float(os.getenv("ENTITY_EMBEDDING_SIMILARITY", "0.92"))
+# Bloques más grandes se ignoran (tokens demasiado comunes no discriminan)
+MAX_BLOCK_SIZE = int(os.getenv("ENTITY_MAX_BLOCK_SIZE", "64"))
+
+# Palabras que no cuentan al comparar nombres (artículos, preposiciones, restos de "l'" y "'s")
+_ARTICLES = {
+    "el", "la", "los", "las", "de", "del", "y", "e", "en", "the", "of", "and", "for", "a", "s", "l"
+}
+# Formas societarias: no distinguen entidades ("Microsoft Corp." es "Microsoft")
+_LEGAL_SUFFIXES = {"sa", "sl", "inc", "corp", "corporation", "ltd", "llc", "co", "cia", "gmbh", "plc"}
+_STOPWORDS = _ARTICLES | _LEGAL_SUFFIXES
+_LSH_BITS = 12
+_LSH_BANDS = 4
+
+def name_core(normalized):
+    """
+    Tokens significativos de un nombre ya normalizado.
+    """
+    return [token for token in normalized.split() if token not in _STOPWORDS]
+
+def merge_key(normalized):
+    """
+    Nombre para la fusión directa: solo se quitan las formas societarias, de modo
+    que "El País" y "País" no se fusionan sin compararse.
+    """
+    return " ".join(token for token in normalized.split() if token not in _LEGAL_SUFFIXES) or normalized
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+def name_similarity(a, b):
+    """
+    Similitud de Jaccard entre los trigramas de caracteres de dos nombres.
+    """
+    ta, tb = _trigrams(a), _trigrams(b)
+    return len(ta & tb) / len(ta | tb) if ta and tb else 0.0
+
+class _UnionFind:
+    def __init__(self, n):
+        self.parent = list(range(n))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            self.parent[max(ra, rb)] = min(ra, rb)
+
+def _name_vectors(names, client):
+    """
+    Embeddings normalizados de los nombres (matriz NumPy), con la caché de embeddings.
+    """
+    import numpy as np
+    from core import embeddings
+
+    vectors = np.asarray(embeddings.embed_texts(client, names), dtype=np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+    return vectors
+
+def _lsh_keys(vectors, seed=0):
+    """
+    Firmas LSH de hiperplanos aleatorios, por bandas: vectores con coseno alto
+    comparten al menos una banda con alta probabilidad.
+    """
+    import numpy as np
+
+    planes = np.random.default_rng(seed).normal(size=(vectors.shape[1], _LSH_BITS * _LSH_BANDS)).astype(np.float32)
+    bits = (vectors @ planes) > 0
+    weights = 1 << np.arange(_LSH_BITS)
+    bands = bits.reshape(len(vectors), _LSH_BANDS, _LSH_BITS) @ weights
+    return [[f"lsh{b}:{code}" for b, code in enumerate(row)] for row in bands.tolist()]
+
+def build_blocks(names, vectors=None):
+    """
+    Índice de bloqueo: clave -> posiciones de las entidades que la comparten.
+    """
+    blocks = defaultdict(list)
+    lsh = _lsh_keys(vectors) if vectors is not None else None
+    for i, name in enumerate(names):
+        core = name_core(name)
+        keys = {f"n:{' '.join(core) or name}"}
+        keys.update(f"t:{token}" for token in core if len(token) >= 4)
+        if len(core) >= 2:
+            keys.add(f"a:{''.join(token[0] for token in core)}")  # Siglas: "organizacion naciones unidas" -> "onu"
+        elif core and len(core[0]) <= 6:
+            keys.add(f"a:{core[0]}")
+        if lsh is not None:
+            keys.update(lsh[i])
+        for key in keys:
+            blocks[key].append(i)
+    return blocks
+
+def resolve_entities(entities, relations, client=None, use_embeddings=ENTITY_RESOLUTION_EMBEDDINGS,
+                     name_threshold=NAME_SIMILARITY_THRESHOLD, embedding_threshold=EMBEDDING_SIMILARITY_THRESHOLD,
+                     max_block_size=MAX_BLOCK_SIZE):
+    """
+    Fusiona entidades duplicadas y reengancha las relaciones a los IDs canónicos.
+
+    Las entidades del mismo tipo y mismo nombre (salvo la forma societaria) se
+    fusionan siempre. El resto
+    se compara solo dentro de su bloque y se fusiona si tiene el mismo tipo y
+    (a) una es la sigla de la otra, (b) sus nombres superan `name_threshold` de
+    similitud o (c) sus embeddings superan `embedding_threshold`. El nodo canónico es la
+    mención más frecuente (o la más larga) y guarda el resto de nombres en `aliases`.
+
+    Returns:
+        Tupla (entidades, relaciones, mapa id original -> id canónico).
+    """
+    from core.llm import normalize_entity_text
+
+    if not entities:
+        return entities, relations, {}
+
+    names = [normalize_entity_text(entity.get("text") or entity.get("id")) for entity in entities]
+    types = [str(entity.get("type", "")).lower() for entity in entities]
+
+    vectors = None
+    if use_embeddings:
+        try:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            vectors = _name_vectors(names, client)
+        except Exception as e:
+            logger.warning(f"Resolución sin embeddings ({e}), solo por nombre")
+
+    union = _UnionFind(len(entities))
+    core_tokens = [name_core(name) for name in names]
+    cores = [" ".join(tokens) or name for tokens, name in zip(core_tokens, names)]
+    acronyms = ["".join(token[0] for token in tokens) if len(tokens) >= 2 else None for tokens in core_tokens]
+    compared = set()
+
+    # Mismo tipo y nombre: se fusiona directamente y solo un representante entra en los bloques
+    representatives = {}
+    for i, name in enumerate(names):
+        key = (types[i], merge_key(name))
+        if key in representatives:
+            union.union(representatives[key], i)
+        else:
+            representatives[key] = i
+    rep_positions = list(representatives.values())
+    rep_vectors = vectors[rep_positions] if vectors is not None else None
+
+    for block in build_blocks([names[i] for i in rep_positions], rep_vectors).values():
+        if len(block) < 2 or len(block) > max_block_size:
+            continue
+        members = [rep_positions[j] for j in block]
+        # Similitud de embeddings de todo el bloque en una sola multiplicación
+        block_similarity = vectors[members] @ vectors[members].T if vectors is not None else None
+        for a_pos, a in enumerate(members):
+            for b_pos in range(a_pos + 1, len(members)):
+                b = members[b_pos]
+                if (a, b) in compared or union.find(a) == union.find(b):
+                    continue
+                compared.add((a, b))
+                if types[a] != types[b]:
+                    continue
+                elif acronyms[a] == cores[b] or acronyms[b] == cores[a]:
+                    union.union(a, b)
+                elif name_similarity(cores[a], cores[b]) >= name_threshold:
+                    union.union(a, b)
+                elif block_similarity is not None and block_similarity[a_pos, b_pos] >= embedding_threshold:
+                    union.union(a, b)
+
+    # Entidad canónica por grupo: nombre más repetido y, a igualdad, el más largo
+    groups = defaultdict(list)
+    for i in range(len(entities)):
+        groups[union.find(i)].append(i)
+
+    id_map, resolved = {}, []
+    for members in groups.values():
+        counts = defaultdict(int)
+        for i in members:
+            counts[cores[i]] += 1
+        canonical = max(members, key=lambda i: (counts[cores[i]], len(str(entities[i].get("text", "")))))
+        entity = entities[canonical]
+        aliases = sorted({str(entities[i].get("text")) for i in members} - {str(entity.get("text"))})
+        if aliases:
+            entity["aliases"] = aliases
+        for i in members:
+            id_map[entities[i]["id"]] = entity["id"]
+        resolved.append((min(members), entity))
+    resolved_entities = [entity for _, entity in sorted(resolved, key=lambda item: item[0])]
+
+    resolved_relations, seen = [], set()
+    for relation in relations:
+        source = id_map.get(relation.get("source_id"), relation.get("source_id"))
+        target = id_map.get(relation.get("target_id"), relation.get("target_id"))
+        key = (source, target, relation.get("type"))
+        if source == target or key in seen:
+            continue
+        seen.add(key)
+        relation["source_id"], relation["target_id"] = source, target
+        resolved_relations.append(relation)
+
+    logger.info(f"Resolución de entidades: {len(entities)} -> {len(resolved_entities)} "
+                f"({len(compared)} comparaciones)")
+    return resolved_entities, resolved_relations, id_map
@@ -0,0 +1,125 @@
+# ./core/extraction_cache.py
+# Caché persistente de extracciones de entidades/relaciones (SQLite)
+#
+# Clave: sha256(proveedor + modelo + hash del prompt + texto). Si cambia la plantilla del
+# prompt cambia su hash, y las entradas antiguas dejan de usarse y se purgan.
+# Capacidad acotada por antigüedad (TTL) y número de entradas (LRU).
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+EXTRACTION_CACHE_DB_PATH = Path(os.getenv("EXTRACTION_CACHE_DB_PATH", DATA_DIR / 'extraction_cache.db'))
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+EXTRACTION_CACHE_TTL_DAYS = float(os.getenv("EXTRACTION_CACHE_TTL_DAYS", "30"))
+EXTRACTION_CACHE_MAX_ENTRIES = int(os.getenv("EXTRACTION_CACHE_MAX_ENTRIES", "50000"))
+
+# Solo se actualiza last_used si ha pasado este tiempo (evita una escritura por acierto)
+_TOUCH_INTERVAL = 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS extractions (
+    key TEXT PRIMARY KEY,
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_extractions_created ON extractions (created_at);
+CREATE INDEX IF NOT EXISTS idx_extractions_lru ON extractions (last_used);
+"""
+
+# Hashes de prompt ya purgados en este proceso
+_purged_prompts = set()
+_purge_lock = threading.Lock()
+
+def _connect():
+    EXTRACTION_CACHE_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(EXTRACTION_CACHE_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def cache_key(text, provider, model, prompt_hash):
+    """
+    Clave de caché de un texto para un proveedor, modelo y versión del prompt.
+    """
+    return hashlib.sha256(f"{provider}\0{model}\0{prompt_hash}\0{text}".encode("utf-8")).hexdigest()
+
+def _purge_other_prompts(conn, prompt_hash):
+    """
+    Borra (una vez por proceso) las entradas generadas con otra versión del prompt.
+    """
+    with _purge_lock:
+        if prompt_hash in _purged_prompts:
+            return
+        _purged_prompts.add(prompt_hash)
+    deleted = conn.execute("DELETE FROM extractions WHERE prompt_hash != ?", (prompt_hash,)).rowcount
+    if deleted:
+        logger.info(f"Caché de extracción: {deleted} entradas de un prompt anterior eliminadas")
+
+def lookup_extraction(text, provider, model, prompt_hash):
+    """
+    Devuelve la extracción cacheada (dict con entities/relations) o None.
+    """
+    now = time.time()
+    key = cache_key(text, provider, model, prompt_hash)
+    conn = _connect()
+    try:
+        _purge_other_prompts(conn, prompt_hash)
+        row = conn.execute(
+            "SELECT result FROM extractions WHERE key = ? AND created_at >= ?",
+            (key, now - EXTRACTION_CACHE_TTL_DAYS * 86400)
+        ).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE extractions SET last_used = ? WHERE key = ? AND last_used < ?",
+                     (now, key, now - _TOUCH_INTERVAL))
+    finally:
+        conn.close()
+    return json.loads(row[0])
+
+def store_extraction(text, provider, model, prompt_hash, result):
+    """
+    Guarda una extracción y aplica el TTL y el límite de entradas.
+    """
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO extractions (key, provider, model, prompt_hash, result, created_at, last_used) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (cache_key(text, provider, model, prompt_hash), provider, model, prompt_hash,
+             json.dumps(result, ensure_ascii=False), now, now)
+        )
+        conn.execute("DELETE FROM extractions WHERE created_at < ?", (now - EXTRACTION_CACHE_TTL_DAYS * 86400,))
+        conn.execute(
+            "DELETE FROM extractions WHERE key IN "
+            "(SELECT key FROM extractions ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (EXTRACTION_CACHE_MAX_ENTRIES,)
+        )
+    finally:
+        conn.close()
+
+def clear_extraction_cache():
+    """
+    Vacía la caché de extracciones.
+    """
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM extractions")
+    finally:
+        conn.close()
@@ -34,4 +34,87 @@ def to_cytoscape_elements(G):
                 "text": data.get("text", "")
             }
         })
-    return elements
\ No newline at end of file
+    return elements
+
+# Por encima de este número de nodos se usa propagación de etiquetas (casi lineal)
+# en lugar de Louvain, que tarda decenas de segundos en grafos grandes
+LOUVAIN_MAX_NODES = 5000
+
+def detect_communities(G, seed=0, louvain_max_nodes=LOUVAIN_MAX_NODES):
+    """
+    Detecta comunidades en el grafo (sin dirección).
+
+    Returns:
+        Lista de conjuntos de nodos, de la comunidad más grande a la más pequeña.
+    """
+    U = G.to_undirected(as_view=True)
+    if U.number_of_nodes() == 0:
+        return []
+    if U.number_of_nodes() <= louvain_max_nodes:
+        communities = nx.community.louvain_communities(U, seed=seed)
+    else:
+        communities = nx.community.fast_label_propagation_communities(U, seed=seed)
+    return sorted((set(c) for c in communities), key=len, reverse=True)
+
+def extend_communities(G, known, seed=0):
+    """
+    Asigna comunidad a los nodos que no la tienen en `known` (id -> comunidad):
+    cada nodo nuevo se une a la comunidad más frecuente entre sus vecinos y los que
+    quedan sin vecinos asignados forman comunidades nuevas.
+
+    Returns:
+        Diccionario id (str) -> comunidad para todos los nodos de G, renumeradas por
+        tamaño como en detect_communities (0 = la mayor; a igual tamaño, el número anterior).
+    """
+    from collections import Counter
+
+    community = {str(node): number for node, number in known.items()}
+    U = G.to_undirected(as_view=True)
+    pending = [node for node in U.nodes() if str(node) not in community]
+    changed = True
+    while pending and changed:
+        changed, remaining = False, []
+        for node in pending:
+            votes = Counter(community[str(n)] for n in U.neighbors(node) if str(n) in community)
+            if votes:
+                community[str(node)] = votes.most_common(1)[0][0]
+                changed = True
+            else:
+                remaining.append(node)
+        pending = remaining
+    if pending:
+        offset = max(community.values(), default=-1) + 1
+        for number, members in enumerate(detect_communities(U.subgraph(pending), seed=seed)):
+            for node in members:
+                community[str(node)] = offset + number
+    sizes = Counter(community.values())
+    renumber = {old: new for new, old in enumerate(sorted(sizes, key=lambda c: (-sizes[c], c)))}
+    return {node: renumber[number] for node, number in community.items()}
+
+def pagerank(G, alpha=0.85, max_iter=100, tol=1e-8):
+    """
+    PageRank por iteración de potencias con NumPy (no requiere SciPy).
+
+    Returns:
+        Diccionario nodo -> puntuación (suma 1).
+    """
+    import numpy as np
+
+    nodes = list(G.nodes())
+    n = len(nodes)
+    if n == 0:
+        return {}
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[s], index[t]) for s, t in G.edges()], dtype=np.int64).reshape(-1, 2)
+    out_degree = np.bincount(edges[:, 0], minlength=n).astype(float)
+    dangling = out_degree == 0
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        share = np.divide(rank, out_degree, out=np.zeros(n), where=~dangling)
+        new_rank = alpha * np.bincount(edges[:, 1], weights=share[edges[:, 0]], minlength=n)
+        new_rank += (alpha * rank[dangling].sum() + 1 - alpha) / n
+        if np.abs(new_rank - rank).sum() < n * tol:
+            rank = new_rank
+            break
+        rank = new_rank
+    return dict(zip(nodes, rank.tolist()))
@@ -0,0 +1,132 @@
+# ./core/graph_layout.py
+# Layout del grafo en el servidor: posiciones (x, y) en píxeles para el layout
+# "preset" de Cytoscape, de modo que el navegador no recalcula un "cose" en cada render
+#
+# Fruchterman-Reingold vectorizado con NumPy. La repulsión es exacta hasta
+# LAYOUT_REPULSION_SAMPLE nodos; por encima se estima con una muestra aleatoria
+# distinta en cada iteración (O(n·muestra) en vez de O(n²)). Los nodos con posición
+# fija (de una versión anterior) no se mueven: solo se colocan los nuevos.
+
+import os
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Distancia ideal entre nodos conectados, en píxeles
+LAYOUT_NODE_SPACING = float(os.getenv("LAYOUT_NODE_SPACING", "120"))
+LAYOUT_ITERATIONS = int(os.getenv("LAYOUT_ITERATIONS", "50"))
+# Nodos contra los que se calcula la repulsión en cada iteración
+LAYOUT_REPULSION_SAMPLE = int(os.getenv("LAYOUT_REPULSION_SAMPLE", "1000"))
+# Atracción hacia el centro para que los componentes desconectados no se alejen
+_GRAVITY = 0.05
+# Filas por bloque al calcular la repulsión (acota la memoria a bloque × muestra)
+_BLOCK_ROWS = 1024
+
+def _repulsion(pos, rows, columns, k, weight):
+    """
+    Fuerza de repulsión k²/d sobre `rows` desde los nodos `columns` (con peso `weight`).
+    Las distancias se obtienen como |a|² + |b|² - 2ab (una multiplicación de matrices por bloque).
+    """
+    import numpy as np
+
+    disp = np.empty((len(rows), 2))
+    targets = pos[columns]
+    target_norms = (targets ** 2).sum(axis=1)
+    for start in range(0, len(rows), _BLOCK_ROWS):
+        block = pos[rows[start:start + _BLOCK_ROWS]]
+        dist2 = (block ** 2).sum(axis=1)[:, None] + target_norms[None, :] - 2 * (block @ targets.T)
+        np.maximum(dist2, 0.01 * k * k, out=dist2)
+        np.divide(k * k * weight, dist2, out=dist2)
+        # Σ_j w_ij (a_i - b_j) = a_i Σ_j w_ij - W·b
+        disp[start:start + len(block)] = block * dist2.sum(axis=1)[:, None] - dist2 @ targets
+    return disp
+
+def compute_layout(node_ids, edges, fixed=None, iterations=LAYOUT_ITERATIONS,
+                   spacing=LAYOUT_NODE_SPACING, sample=LAYOUT_REPULSION_SAMPLE, seed=0):
+    """
+    Calcula posiciones para los nodos de un grafo.
+
+    Args:
+        node_ids: IDs de los nodos.
+        edges: Pares (origen, destino); se ignoran los que apuntan a nodos desconocidos.
+        fixed: Diccionario id -> (x, y) de nodos que conservan su posición.
+        iterations: Iteraciones del algoritmo.
+        spacing: Distancia ideal entre nodos, en píxeles.
+        sample: Máximo de nodos usados para la repulsión de cada iteración.
+        seed: Semilla (el resultado es determinista).
+
+    Returns:
+        Diccionario id -> (x, y) con todos los nodos.
+    """
+    import numpy as np
+
+    node_ids = list(dict.fromkeys(str(node_id) for node_id in node_ids))
+    n = len(node_ids)
+    if n == 0:
+        return {}
+    fixed = {str(node_id): xy for node_id, xy in (fixed or {}).items()}
+    index = {node_id: i for i, node_id in enumerate(node_ids)}
+    pairs = np.array([(index[str(s)], index[str(t)]) for s, t in edges
+                      if str(s) in index and str(t) in index and str(s) != str(t)],
+                     dtype=np.int64).reshape(-1, 2)
+
+    rng = np.random.default_rng(seed)
+    is_fixed = np.array([node_id in fixed for node_id in node_ids])
+    moving = np.flatnonzero(~is_fixed)
+    side = spacing * np.sqrt(n)
+    pos = np.empty((n, 2))
+    if is_fixed.any():
+        pos[is_fixed] = np.array([fixed[node_id] for node_id in node_ids if node_id in fixed], dtype=float)
+        center = pos[is_fixed].mean(axis=0)
+    else:
+        center = np.zeros(2)
+    if len(moving) == 0:
+        return {node_id: (float(x), float(y)) for node_id, (x, y) in zip(node_ids, pos)}
+
+    # Posición inicial de los nodos nuevos: junto a sus vecinos ya colocados, o al azar
+    pos[moving] = center + rng.uniform(-side / 2, side / 2, size=(len(moving), 2))
+    if is_fixed.any() and len(pairs):
+        anchored = np.concatenate([pairs, pairs[:, ::-1]])
+        anchored = anchored[is_fixed[anchored[:, 1]] & ~is_fixed[anchored[:, 0]]]
+        if len(anchored):
+            sums = np.zeros((n, 2))
+            np.add.at(sums, anchored[:, 0], pos[anchored[:, 1]])
+            counts = np.bincount(anchored[:, 0], minlength=n)
+            has_anchor = counts > 0
+            pos[has_anchor] = sums[has_anchor] / counts[has_anchor, None] \
+                + rng.normal(scale=spacing / 2, size=(int(has_anchor.sum()), 2))
+
+    # Solo cuentan las aristas que tocan algún nodo que se mueve
+    if len(pairs):
+        pairs = pairs[~is_fixed[pairs[:, 0]] | ~is_fixed[pairs[:, 1]]]
+
+    k = spacing
+    temperature = side / 10
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        if n > sample:
+            columns = rng.choice(n, size=sample, replace=False)
+            weight = n / sample
+        else:
+            columns = np.arange(n)
+            weight = 1.0
+        disp = np.zeros((n, 2))
+        disp[moving] = _repulsion(pos, moving, columns, k, weight)
+
+        # Atracción d²/k a lo largo de las aristas
+        if len(pairs):
+            delta = pos[pairs[:, 0]] - pos[pairs[:, 1]]
+            force = delta * (np.linalg.norm(delta, axis=1) / k)[:, None]
+            for axis in range(2):
+                disp[:, axis] -= np.bincount(pairs[:, 0], weights=force[:, axis], minlength=n)
+                disp[:, axis] += np.bincount(pairs[:, 1], weights=force[:, axis], minlength=n)
+
+        disp -= _GRAVITY * (pos - center)
+        disp[is_fixed] = 0
+        length = np.maximum(np.linalg.norm(disp, axis=1), 1e-9)
+        pos += disp * (np.minimum(length, temperature) / length)[:, None]
+        temperature -= cooling
+
+    return {node_id: (round(float(x), 1), round(float(y), 1)) for node_id, (x, y) in zip(node_ids, pos)}
@@ -0,0 +1,400 @@
+# ./core/graph_sampling.py
+# Selección de chunks representativos del almacén de vectores para generar el grafo
+#
+# - Muestreo por clústeres (por defecto): se recorren todos los vectores por páginas,
+#   se agrupan con k-means por mini-lotes y se envía a extracción el medoide (el chunk
+#   real más cercano al centroide) de cada clúster: número de llamadas al LLM acotado
+#   y todo el corpus cubierto. Centroides, miembros y medoides se guardan en SQLite
+#   (data/graph_sampling.db); el worker los actualiza de forma incremental tras cada
+#   ingesta y la interfaz solo lee los medoides guardados.
+# - Consultas sonda (respaldo si el backend no permite listar IDs): unas pocas consultas
+#   fijas cuyos vectores se calculan una sola vez y se guardan en data/graph_probes.json.
+#   Las búsquedas de las sondas se lanzan en paralelo.
+
+import os
+import json
+import random
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from dotenv import load_dotenv
+
+from core import embeddings, ann_index
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+GRAPH_PROBES_PATH = Path(os.getenv("GRAPH_PROBES_PATH", DATA_DIR / 'graph_probes.json'))
+GRAPH_PROBE_TOP_K = int(os.getenv("GRAPH_PROBE_TOP_K", "3"))
+GRAPH_SAMPLING_DB_PATH = Path(os.getenv("GRAPH_SAMPLING_DB_PATH", DATA_DIR / 'graph_sampling.db'))
+# Clústeres = chunks representativos enviados a extracción
+GRAPH_SAMPLE_CLUSTERS = int(os.getenv("GRAPH_SAMPLE_CLUSTERS", "24"))
+# Vectores por página de fetch y por mini-lote de k-means
+GRAPH_SAMPLE_BATCH = int(os.getenv("GRAPH_SAMPLE_BATCH", "256"))
+# Si los vectores nuevos superan esta fracción de los ya agrupados, se reagrupa desde cero
+GRAPH_SAMPLE_REBUILD_RATIO = float(os.getenv("GRAPH_SAMPLE_REBUILD_RATIO", "0.5"))
+# Actualizar los clústeres al terminar cada ingesta (en el worker)
+GRAPH_SAMPLING_REFRESH_ON_INGEST = os.getenv("GRAPH_SAMPLING_REFRESH_ON_INGEST", "true").lower() in ("1", "true", "yes")
+# Longitud mínima del texto de un chunk para ser representante
+_MIN_CHUNK_CHARS = 50
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS centroids (
+    cluster INTEGER PRIMARY KEY,
+    updates INTEGER NOT NULL,
+    vector BLOB NOT NULL,
+    medoid_namespace TEXT,
+    medoid_id TEXT,
+    medoid_score REAL,
+    medoid_text TEXT
+);
+CREATE TABLE IF NOT EXISTS members (
+    namespace TEXT NOT NULL,
+    id TEXT NOT NULL,
+    cluster INTEGER NOT NULL,
+    PRIMARY KEY (namespace, id)
+);
+CREATE INDEX IF NOT EXISTS idx_members_cluster ON members (cluster);
+"""
+
+PROBE_QUERIES = [
+    "person organization company",
+    "location place city",
+    "work relationship role",
+    "important information concepts"
+]
+
+_probe_vectors = None
+_probe_lock = threading.Lock()
+
+def _load_probe_file(queries, model):
+    try:
+        with open(GRAPH_PROBES_PATH, encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if stored.get("model") != model or stored.get("queries") != queries:
+        return None
+    return stored.get("vectors")
+
+def _save_probe_file(queries, model, vectors):
+    GRAPH_PROBES_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = GRAPH_PROBES_PATH.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"model": model, "queries": queries, "vectors": vectors}, f)
+    os.replace(tmp_path, GRAPH_PROBES_PATH)
+
+def get_probe_vectors(client=None, queries=PROBE_QUERIES, model=embeddings.EMBEDDING_MODEL):
+    """
+    Vectores de las consultas sonda: en memoria, si no del archivo en disco y, la
+    primera vez (o si cambian las consultas o el modelo), con una sola llamada a la API.
+    """
+    global _probe_vectors
+
+    with _probe_lock:
+        if _probe_vectors is not None and _probe_vectors[0] == (model, tuple(queries)):
+            return _probe_vectors[1]
+        vectors = _load_probe_file(list(queries), model)
+        if vectors is None:
+            if client is None:
+                from openai import OpenAI
+                client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+            vectors = embeddings.embed_texts(client, list(queries), model=model)
+            try:
+                _save_probe_file(list(queries), model, vectors)
+            except OSError as e:
+                logger.warning(f"No se pudieron guardar los vectores sonda: {e}")
+        _probe_vectors = ((model, tuple(queries)), vectors)
+        return vectors
+
+def sample_chunks_by_probes(client=None, top_k=GRAPH_PROBE_TOP_K, min_chars=50):
+    """
+    Chunks más cercanos a cada consulta sonda (búsquedas en paralelo), sin repetidos.
+
+    Returns:
+        Lista de textos de chunk, en el orden de las sondas.
+    """
+    vectors = get_probe_vectors(client)
+
+    def probe(vector):
+        return embeddings.query_embedding(query_vector=vector, top_k=top_k, include_metadata=True)
+
+    chunks, seen_ids = [], set()
+    with ThreadPoolExecutor(max_workers=len(vectors)) as executor:
+        futures = [executor.submit(probe, vector) for vector in vectors]
+        for query, future in zip(PROBE_QUERIES, futures):
+            try:
+                results = future.result()
+            except Exception as e:
+                logger.warning(f"Error con la consulta sonda '{query}': {e}")
+                continue
+            for match in results.get('matches', []):
+                chunk_text = (match.get('metadata') or {}).get('chunk_text', '')
+                if match['id'] not in seen_ids and chunk_text and len(chunk_text.strip()) > min_chars:
+                    chunks.append(chunk_text)
+                    seen_ids.add(match['id'])
+    return chunks
+
+# ---- Muestreo por clústeres ----
+
+def _connect():
+    GRAPH_SAMPLING_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(GRAPH_SAMPLING_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _list_all_ids(store, page_size):
+    """
+    (namespace, id) de todos los vectores, recorriendo cada namespace por páginas.
+    """
+    stats = store.describe_index_stats()
+    namespaces = list((stats.get("namespaces") or {}).keys()) or [""]
+    keys = []
+    for namespace in namespaces:
+        for page in store.list_ids(namespace=namespace, limit=min(page_size, 100)):
+            keys.extend((namespace, vector_id) for vector_id in page)
+    return keys
+
+def _iter_vectors(store, keys, batch_size):
+    """
+    Lotes (claves, matriz normalizada, textos) de los vectores indicados.
+    """
+    import numpy as np
+
+    by_namespace = {}
+    for namespace, vector_id in keys:
+        by_namespace.setdefault(namespace, []).append(vector_id)
+    for namespace, ids in by_namespace.items():
+        for start in range(0, len(ids), batch_size):
+            fetched = store.fetch(ids[start:start + batch_size], namespace=namespace)["vectors"]
+            found = [vector_id for vector_id in ids[start:start + batch_size]
+                     if vector_id in fetched and len(fetched[vector_id]["values"])]
+            if not found:
+                continue
+            matrix = np.asarray([fetched[vector_id]["values"] for vector_id in found], dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True) + 1e-12
+            texts = [(fetched[vector_id].get("metadata") or {}).get("chunk_text", "") for vector_id in found]
+            yield [(namespace, vector_id) for vector_id in found], matrix, texts
+
+def mini_batch_update(centroids, updates, batch):
+    """
+    Paso de k-means por mini-lotes (esférico): cada centroide se acerca a la media de
+    sus puntos del lote con tasa 1/nº de puntos vistos. Modifica `centroids` y `updates`.
+
+    Returns:
+        Tupla (clúster de cada fila, similitud coseno con su centroide).
+    """
+    import numpy as np
+
+    assign = ann_index.assign_clusters(batch, centroids, spherical=True)
+    counts = np.bincount(assign, minlength=len(centroids))
+    sums = np.zeros_like(centroids)
+    np.add.at(sums, assign, batch)
+    touched = counts > 0
+    updates[touched] += counts[touched]
+    centroids[touched] += (sums[touched] - counts[touched, None] * centroids[touched]) / updates[touched, None]
+    centroids[touched] /= np.linalg.norm(centroids[touched], axis=1, keepdims=True) + 1e-12
+    return assign, (batch * centroids[assign]).sum(axis=1)
+
+def _assign_and_score(centroids, batch):
+    import numpy as np
+
+    assign = ann_index.assign_clusters(batch, centroids, spherical=True)
+    return assign, (batch * centroids[assign]).sum(axis=1)
+
+def _offer_medoids(medoids, keys, texts, assign, scores):
+    """
+    Conserva por clúster el chunk con texto más cercano a su centroide.
+    """
+    for key, text, cluster, score in zip(keys, texts, assign.tolist(), scores.tolist()):
+        if not text or len(text.strip()) <= _MIN_CHUNK_CHARS:
+            continue
+        current = medoids.get(cluster)
+        if current is None or score > current[1]:
+            medoids[cluster] = (key, score, text)
+
+def _plan_rebuild(store, keys, k, batch_size, seed=0):
+    """
+    Agrupa todos los vectores desde cero: inicialización con k-means++ sobre una muestra,
+    una pasada de mini-lotes y una pasada final de asignación y medoides.
+
+    Returns:
+        Diccionario {"centroids", "updates", "medoids", "members"} o None si no hay vectores.
+    """
+    import numpy as np
+
+    rng = random.Random(seed)
+    keys = list(keys)
+    rng.shuffle(keys)
+    k = min(k, len(keys))
+    sample = [matrix for _, matrix, _ in _iter_vectors(store, keys[:max(k * 20, batch_size)], batch_size)]
+    if not sample:
+        return None
+    centroids = ann_index.kmeans(np.concatenate(sample), k, spherical=True, seed=seed, init="kmeans++")
+    updates = np.zeros(len(centroids), dtype=np.int64)
+
+    for _, matrix, _ in _iter_vectors(store, keys, batch_size):
+        mini_batch_update(centroids, updates, matrix)
+
+    members, medoids = {}, {}
+    for batch_keys, matrix, texts in _iter_vectors(store, keys, batch_size):
+        assign, scores = _assign_and_score(centroids, matrix)
+        members.update(zip(batch_keys, assign.tolist()))
+        _offer_medoids(medoids, batch_keys, texts, assign, scores)
+    return {"centroids": centroids, "updates": updates, "medoids": medoids, "members": members}
+
+def _plan_update(store, rows, members, new_keys, removed_keys, batch_size):
+    """
+    Actualización incremental sobre el estado leído (`rows` de centroids, `members`
+    clave -> clúster): los vectores nuevos mueven los centroides (mini-lotes) y pueden
+    sustituir al medoide de su clúster; los clústeres que pierden su medoide lo
+    recalculan entre sus miembros.
+    """
+    import numpy as np
+
+    centroids = np.stack([np.frombuffer(row[2], dtype=np.float32) for row in rows]).copy()
+    updates = np.array([row[1] for row in rows], dtype=np.int64)
+    medoids = {row[0]: ((row[3], row[4]), row[5], row[6]) for row in rows if row[4] is not None}
+
+    removed = set(removed_keys)
+    for cluster in [cluster for cluster, (key, _, _) in medoids.items() if key in removed]:
+        del medoids[cluster]
+    members = {key: cluster for key, cluster in members.items() if key not in removed}
+
+    for batch_keys, matrix, texts in _iter_vectors(store, list(new_keys), batch_size):
+        assign, scores = mini_batch_update(centroids, updates, matrix)
+        members.update(zip(batch_keys, assign.tolist()))
+        _offer_medoids(medoids, batch_keys, texts, assign, scores)
+
+    # Clústeres sin medoide: se elige entre sus miembros actuales
+    missing = {c for c in range(len(centroids)) if c not in medoids}
+    if missing:
+        cluster_keys = [key for key, cluster in members.items() if cluster in missing]
+        for batch_keys, matrix, texts in _iter_vectors(store, cluster_keys, batch_size):
+            assign = np.array([members[key] for key in batch_keys])
+            scores = (matrix * centroids[assign]).sum(axis=1)
+            _offer_medoids(medoids, batch_keys, texts, assign, scores)
+    return {"centroids": centroids, "updates": updates, "medoids": medoids, "members": members}
+
+def _write_plan(conn, plan):
+    import numpy as np
+
+    conn.execute("DELETE FROM centroids")
+    conn.execute("DELETE FROM members")
+    if plan is None:
+        return
+    medoids = plan["medoids"]
+    conn.executemany(
+        "INSERT INTO centroids (cluster, updates, vector, medoid_namespace, medoid_id, medoid_score, medoid_text) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(c, int(plan["updates"][c]), plan["centroids"][c].astype(np.float32).tobytes(),
+          *(medoids[c][0] if c in medoids else (None, None)),
+          medoids[c][1] if c in medoids else None, medoids[c][2] if c in medoids else None)
+         for c in range(len(plan["centroids"]))]
+    )
+    conn.executemany("INSERT INTO members (namespace, id, cluster) VALUES (?, ?, ?)",
+                     [(namespace, vector_id, cluster) for (namespace, vector_id), cluster in plan["members"].items()])
+    conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('clusters', ?)", (len(plan["centroids"]),))
+
+def refresh_clusters(store=None, k=GRAPH_SAMPLE_CLUSTERS, batch_size=GRAPH_SAMPLE_BATCH,
+                     rebuild_ratio=GRAPH_SAMPLE_REBUILD_RATIO, force_rebuild=False):
+    """
+    Pone al día los clústeres con los vectores del almacén: incremental si solo hay
+    cambios pequeños, desde cero la primera vez, si cambia `k` o si hay muchos nuevos.
+    Pensado para el worker de ingesta: recorre el corpus entero.
+
+    La lectura del almacén y el k-means se hacen fuera de la transacción de escritura;
+    si otro proceso escribe un refresco mientras tanto, este se descarta (`skipped`).
+
+    Returns:
+        Diccionario {"vectors", "new", "removed", "rebuilt", "skipped"}.
+    """
+    store = store or embeddings.get_vector_store()
+    conn = _connect()
+    try:
+        # Estado leído en una sola transacción de lectura (instantánea coherente en WAL)
+        conn.execute("BEGIN")
+        generation = _generation(conn)
+        members = {(row[0], row[1]): row[2] for row in conn.execute("SELECT namespace, id, cluster FROM members")}
+        clusters = conn.execute("SELECT value FROM state WHERE key = 'clusters'").fetchone()
+        rows = conn.execute(
+            "SELECT cluster, updates, vector, medoid_namespace, medoid_id, medoid_score, medoid_text "
+            "FROM centroids ORDER BY cluster"
+        ).fetchall()
+        conn.execute("COMMIT")
+
+        current = set(_list_all_ids(store, batch_size))
+        known = set(members)
+        new_keys, removed_keys = current - known, known - current
+        rebuild = (force_rebuild or not known or not rows or clusters is None
+                   or clusters[0] != min(k, len(current))
+                   or len(new_keys) > rebuild_ratio * len(known))
+        if not current:
+            plan = None
+        elif rebuild:
+            plan = _plan_rebuild(store, sorted(current), k, batch_size)
+        elif new_keys or removed_keys:
+            plan = _plan_update(store, rows, members, sorted(new_keys), removed_keys, batch_size)
+        else:
+            plan = False
+
+        skipped = False
+        if plan is not False:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if _generation(conn) != generation:
+                    skipped = True
+                else:
+                    _write_plan(conn, plan)
+                    conn.execute("INSERT OR REPLACE INTO state (key, value) VALUES ('generation', ?)",
+                                 (generation + 1,))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+    finally:
+        conn.close()
+    summary = {"vectors": len(current), "new": len(new_keys), "removed": len(removed_keys),
+               "rebuilt": bool(current) and rebuild, "skipped": skipped}
+    logger.info(f"Clústeres de muestreo actualizados: {summary}")
+    return summary
+
+def _generation(conn):
+    row = conn.execute("SELECT value FROM state WHERE key = 'generation'").fetchone()
+    return row[0] if row else 0
+
+def _stored_medoids():
+    conn = _connect()
+    try:
+        return [row[0] for row in conn.execute(
+            "SELECT c.medoid_text FROM centroids c JOIN members m ON m.cluster = c.cluster "
+            "WHERE c.medoid_text IS NOT NULL GROUP BY c.cluster ORDER BY COUNT(*) DESC"
+        )]
+    finally:
+        conn.close()
+
+def sample_representative_chunks(store=None, k=GRAPH_SAMPLE_CLUSTERS):
+    """
+    Un chunk representativo (medoide) por clúster del corpus, del clúster más grande
+    al más pequeño, leído de los clústeres guardados (los actualiza el worker tras cada
+    ingesta). Solo si aún no hay clústeres se calculan aquí. Devuelve una lista vacía
+    si el backend no permite recorrer los vectores.
+    """
+    chunks = _stored_medoids()
+    if chunks:
+        return chunks
+    try:
+        refresh_clusters(store, k)
+    except Exception as e:
+        logger.warning(f"Muestreo por clústeres no disponible ({e}), se usarán las consultas sonda")
+        return []
+    return _stored_medoids()
@@ -0,0 +1,449 @@
+# ./core/graph_store.py
+# Almacén persistente del grafo de conocimiento (SQLite), compartido por todos los
+# workers de gunicorn y los procesos de ingesta
+#
+# Cada grafo guardado es una versión inmutable (nodos + aristas). Al ser inmutables,
+# las lecturas de una versión se cachean en memoria por proceso sin invalidación,
+# junto con sus índices de adyacencia (GraphSnapshot).
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+GRAPH_DB_PATH = Path(os.getenv("GRAPH_DB_PATH", DATA_DIR / 'graph.db'))
+# Versiones conservadas (las más antiguas se borran al guardar una nueva)
+GRAPH_MAX_VERSIONS = int(os.getenv("GRAPH_MAX_VERSIONS", "20"))
+# Las posiciones de la versión anterior se conservan solo si al menos esta fracción
+# de los nodos ya estaba en ella (misma entidad: tipo y nombre normalizado)
+GRAPH_LAYOUT_REUSE_RATIO = float(os.getenv("GRAPH_LAYOUT_REUSE_RATIO", "0.5"))
+# Las comunidades se heredan de la versión anterior salvo que los nodos nuevos
+# superen esta fracción del grafo (entonces se recalculan desde cero)
+GRAPH_COMMUNITY_REBUILD_RATIO = float(os.getenv("GRAPH_COMMUNITY_REBUILD_RATIO", "0.25"))
+# Versiones cargadas que se mantienen en memoria por proceso
+_CACHE_SIZE = 4
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS graph_versions (
+    version INTEGER PRIMARY KEY AUTOINCREMENT,
+    source TEXT,
+    node_count INTEGER NOT NULL,
+    edge_count INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    version INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    type TEXT,
+    label TEXT,
+    data TEXT,
+    PRIMARY KEY (version, id)
+);
+CREATE TABLE IF NOT EXISTS edges (
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    source_id TEXT NOT NULL,
+    target_id TEXT NOT NULL,
+    type TEXT,
+    text TEXT,
+    PRIMARY KEY (version, seq)
+);
+CREATE TABLE IF NOT EXISTS node_embeddings (
+    version INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    model TEXT,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (version, id)
+);
+CREATE TABLE IF NOT EXISTS node_positions (
+    version INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    x REAL NOT NULL,
+    y REAL NOT NULL,
+    PRIMARY KEY (version, id)
+);
+CREATE TABLE IF NOT EXISTS node_communities (
+    version INTEGER NOT NULL,
+    id TEXT NOT NULL,
+    community INTEGER NOT NULL,
+    rank REAL NOT NULL,
+    PRIMARY KEY (version, id)
+);
+CREATE INDEX IF NOT EXISTS idx_edges_source ON edges (version, source_id);
+CREATE INDEX IF NOT EXISTS idx_edges_target ON edges (version, target_id);
+"""
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+# Un cálculo de layout/comunidades por versión a la vez dentro del proceso
+_layout_locks = {}
+
+class GraphSnapshot:
+    """
+    Versión cargada del grafo con índices de adyacencia entrante/saliente y mapa
+    id -> etiqueta, para consultar las conexiones de un nodo en O(grado).
+    """
+
+    def __init__(self, version, source, created_at, entities, relations):
+        self.version = version
+        self.source = source
+        self.created_at = created_at
+        self.entities = entities
+        self.relations = relations
+        self.labels = {e.get("id"): e.get("text", e.get("id")) for e in entities}
+        self.outgoing = defaultdict(list)
+        self.incoming = defaultdict(list)
+        for i, relation in enumerate(relations):
+            self.outgoing[relation.get("source_id")].append(i)
+            self.incoming[relation.get("target_id")].append(i)
+        # Posiciones del layout (id -> (x, y)), cargadas o calculadas bajo demanda
+        self.positions = None
+        # Comunidades y PageRank ({"community", "rank", "order"}), bajo demanda
+        self.communities = None
+
+    def as_dict(self):
+        return {
+            "version": self.version,
+            "source": self.source,
+            "created_at": self.created_at,
+            "entities": self.entities,
+            "relations": self.relations
+        }
+
+    def connections(self, node_id, limit=None):
+        """
+        Conexiones de un nodo: {"outgoing": [(tipo, etiqueta destino)], "incoming": [(etiqueta origen, tipo)]}.
+        """
+        out_edges = self.outgoing.get(node_id, [])[:limit]
+        in_edges = self.incoming.get(node_id, [])[:limit]
+        return {
+            "outgoing": [(self.relations[i].get("type"),
+                          self.labels.get(self.relations[i].get("target_id"), self.relations[i].get("target_id")))
+                         for i in out_edges],
+            "incoming": [(self.labels.get(self.relations[i].get("source_id"), self.relations[i].get("source_id")),
+                          self.relations[i].get("type"))
+                         for i in in_edges]
+        }
+
+def _remember(snapshot):
+    with _cache_lock:
+        _cache[snapshot.version] = snapshot
+        _cache.move_to_end(snapshot.version)
+        while len(_cache) > _CACHE_SIZE:
+            _cache.popitem(last=False)
+
+def _connect():
+    GRAPH_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(GRAPH_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def save_graph(entities, relations, source=None, node_vectors=None, embedding_model=None):
+    """
+    Guarda un grafo como nueva versión (la actual) y devuelve su número.
+    `node_vectors` (alineados con `entities`) se guardan con la versión para que
+    el panel de detalle no tenga que calcular embeddings al pulsar un nodo.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute(
+                "INSERT INTO graph_versions (source, node_count, edge_count, created_at) VALUES (?, ?, ?, ?)",
+                (source, len(entities), len(relations), time.time())
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO nodes (version, id, type, label, data) VALUES (?, ?, ?, ?, ?)",
+                [(version, str(e.get("id")), e.get("type", "Unknown"), str(e.get("text", e.get("id"))),
+                  json.dumps({k: v for k, v in e.items() if k not in ("id", "type", "text")}, ensure_ascii=False))
+                 for e in entities]
+            )
+            conn.executemany(
+                "INSERT INTO edges (version, seq, source_id, target_id, type, text) VALUES (?, ?, ?, ?, ?, ?)",
+                [(version, seq, str(r.get("source_id")), str(r.get("target_id")), r.get("type"), r.get("text"))
+                 for seq, r in enumerate(relations)]
+            )
+            if node_vectors is not None:
+                import numpy as np
+
+                conn.executemany(
+                    "INSERT OR IGNORE INTO node_embeddings (version, id, model, vector) VALUES (?, ?, ?, ?)",
+                    [(version, str(e.get("id")), embedding_model, np.asarray(vector, dtype=np.float32).tobytes())
+                     for e, vector in zip(entities, node_vectors) if vector is not None]
+                )
+            # Conservar solo las últimas GRAPH_MAX_VERSIONS versiones
+            stale = [row[0] for row in conn.execute(
+                "SELECT version FROM graph_versions ORDER BY version DESC LIMIT -1 OFFSET ?", (GRAPH_MAX_VERSIONS,)
+            )]
+            for old in stale:
+                conn.execute("DELETE FROM nodes WHERE version = ?", (old,))
+                conn.execute("DELETE FROM edges WHERE version = ?", (old,))
+                conn.execute("DELETE FROM node_embeddings WHERE version = ?", (old,))
+                conn.execute("DELETE FROM node_positions WHERE version = ?", (old,))
+                conn.execute("DELETE FROM node_communities WHERE version = ?", (old,))
+                conn.execute("DELETE FROM graph_versions WHERE version = ?", (old,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+    # Quien guarda ya tiene los datos: se indexan sin releerlos de SQLite
+    _remember(GraphSnapshot(version, source, time.time(), list(entities), list(relations)))
+    return version
+
+def get_current_version():
+    """
+    Última versión guardada, o None si aún no hay grafo.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT MAX(version) FROM graph_versions").fetchone()
+    finally:
+        conn.close()
+    return row[0]
+
+def version_exists(version):
+    """
+    True si la versión sigue guardada (las antiguas se descartan, ver GRAPH_MAX_VERSIONS).
+    """
+    if version is None:
+        return False
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT 1 FROM graph_versions WHERE version = ?", (version,)).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+def get_snapshot(version=None):
+    """
+    GraphSnapshot indexado de una versión (por defecto la actual), o None si no existe.
+    """
+    if version is None:
+        version = get_current_version()
+        if version is None:
+            return None
+
+    with _cache_lock:
+        if version in _cache:
+            _cache.move_to_end(version)
+            return _cache[version]
+
+    conn = _connect()
+    try:
+        meta = conn.execute("SELECT * FROM graph_versions WHERE version = ?", (version,)).fetchone()
+        if meta is None:
+            return None
+        entities = []
+        for row in conn.execute("SELECT id, type, label, data FROM nodes WHERE version = ? ORDER BY rowid", (version,)):
+            entity = {"id": row["id"], "type": row["type"], "text": row["label"]}
+            if row["data"]:
+                entity.update(json.loads(row["data"]))
+            entities.append(entity)
+        relations = [
+            {"source_id": row["source_id"], "target_id": row["target_id"], "type": row["type"], "text": row["text"]}
+            for row in conn.execute(
+                "SELECT source_id, target_id, type, text FROM edges WHERE version = ? ORDER BY seq", (version,)
+            )
+        ]
+    finally:
+        conn.close()
+
+    snapshot = GraphSnapshot(version, meta["source"], meta["created_at"], entities, relations)
+    _remember(snapshot)
+    return snapshot
+
+def load_graph(version=None):
+    """
+    Devuelve {version, source, created_at, entities, relations} de una versión
+    (por defecto la actual), o None si no existe.
+    """
+    snapshot = get_snapshot(version)
+    return snapshot.as_dict() if snapshot else None
+
+def get_node_connections(node_id, version=None, limit=None):
+    """
+    Conexiones de un nodo en O(grado) con los índices de adyacencia de la versión.
+
+    Returns:
+        Diccionario {"outgoing": [(tipo, etiqueta destino)], "incoming": [(etiqueta origen, tipo)]}.
+    """
+    snapshot = get_snapshot(version)
+    if snapshot is None:
+        return {"outgoing": [], "incoming": []}
+    return snapshot.connections(node_id, limit)
+
+def get_node_embedding(node_id, version=None):
+    """
+    Embedding guardado de un nodo (lista de floats), o None si la versión no lo tiene.
+    Solo lee SQLite: no hace llamadas de red.
+    """
+    import numpy as np
+
+    if version is None:
+        version = get_current_version()
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT vector FROM node_embeddings WHERE version = ? AND id = ?",
+                           (version, str(node_id))).fetchone()
+    finally:
+        conn.close()
+    return np.frombuffer(row[0], dtype=np.float32).tolist() if row else None
+
+def _node_key(entity):
+    """
+    Identidad estable de un nodo entre versiones: los IDs son posicionales
+    ("c0_ent3") y no identifican la misma entidad en grafos distintos.
+    """
+    from core.llm import normalize_entity_text
+
+    return str(entity.get("type", "")).lower(), normalize_entity_text(entity.get("text") or entity.get("id"))
+
+def _previous_matches(conn, table, snapshot):
+    """
+    Última versión anterior con filas en `table` y correspondencia id anterior ->
+    id actual de las entidades presentes en ambas (las claves repetidas se ignoran).
+    """
+    row = conn.execute(f"SELECT MAX(version) FROM {table} WHERE version < ?", (snapshot.version,)).fetchone()
+    previous = get_snapshot(row[0]) if row[0] is not None else None
+    if previous is None:
+        return None, {}
+
+    def unique_keys(entities):
+        ids = defaultdict(list)
+        for entity in entities:
+            ids[_node_key(entity)].append(str(entity.get("id")))
+        return {key: values[0] for key, values in ids.items() if len(values) == 1}
+
+    old_keys, new_keys = unique_keys(previous.entities), unique_keys(snapshot.entities)
+    return previous.version, {old_keys[key]: new_keys[key] for key in old_keys.keys() & new_keys.keys()}
+
+def _layout_lock(version):
+    with _cache_lock:
+        return _layout_locks.setdefault(version, threading.Lock())
+
+def get_layout(version=None):
+    """
+    Posiciones de los nodos (id -> (x, y)) de una versión, para el layout "preset".
+
+    Se calculan una sola vez por versión y se guardan en SQLite. Si la versión
+    comparte la mayoría de sus entidades con la anterior que tiene layout, esas
+    entidades conservan su posición y solo se colocan las nuevas (core/graph_layout.py).
+    """
+    from core import graph_layout
+
+    snapshot = get_snapshot(version)
+    if snapshot is None:
+        return {}
+    if snapshot.positions is not None:
+        return snapshot.positions
+
+    with _layout_lock(snapshot.version):
+        if snapshot.positions is not None:
+            return snapshot.positions
+        conn = _connect()
+        try:
+            positions = {row["id"]: (row["x"], row["y"]) for row in conn.execute(
+                "SELECT id, x, y FROM node_positions WHERE version = ?", (snapshot.version,)
+            )}
+            if not positions and snapshot.entities:
+                node_ids = [str(e.get("id")) for e in snapshot.entities]
+                previous_version, matches = _previous_matches(conn, "node_positions", snapshot)
+                fixed = {}
+                if matches and len(matches) >= GRAPH_LAYOUT_REUSE_RATIO * len(node_ids):
+                    fixed = {matches[row["id"]]: (row["x"], row["y"]) for row in conn.execute(
+                        "SELECT id, x, y FROM node_positions WHERE version = ?", (previous_version,)
+                    ) if row["id"] in matches}
+                started = time.time()
+                positions = graph_layout.compute_layout(
+                    node_ids, [(r.get("source_id"), r.get("target_id")) for r in snapshot.relations], fixed=fixed
+                )
+                logger.info(f"Layout de la versión {snapshot.version}: {len(positions) - len(fixed)} nodos nuevos "
+                            f"colocados en {time.time() - started:.2f}s")
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO node_positions (version, id, x, y) VALUES (?, ?, ?, ?)",
+                    [(snapshot.version, node_id, x, y) for node_id, (x, y) in positions.items()]
+                )
+                conn.execute("COMMIT")
+        finally:
+            conn.close()
+        snapshot.positions = positions
+    return positions
+
+def get_communities(version=None):
+    """
+    Comunidades y PageRank de los nodos de una versión, para el renderizado por
+    niveles de detalle. Se calculan una sola vez por versión y se guardan en SQLite.
+
+    Returns:
+        Diccionario {"community": id -> nº de comunidad (0 = la mayor),
+        "rank": id -> PageRank, "order": ids de mayor a menor PageRank}.
+    """
+    from core import graph_builder
+
+    snapshot = get_snapshot(version)
+    if snapshot is None:
+        return {"community": {}, "rank": {}, "order": []}
+    if snapshot.communities is not None:
+        return snapshot.communities
+
+    with _layout_lock(snapshot.version):
+        if snapshot.communities is not None:
+            return snapshot.communities
+        conn = _connect()
+        try:
+            rows = conn.execute("SELECT id, community, rank FROM node_communities WHERE version = ?",
+                                (snapshot.version,)).fetchall()
+            community = {row["id"]: row["community"] for row in rows}
+            rank = {row["id"]: row["rank"] for row in rows}
+            if not rows and snapshot.entities:
+                started = time.time()
+                G = graph_builder.build_knowledge_graph(snapshot.entities, snapshot.relations)
+                G.remove_nodes_from([node for node in list(G.nodes()) if node not in snapshot.labels])
+                # Se hereda por identidad de entidad (los IDs son posicionales, ver _node_key)
+                previous_version, matches = _previous_matches(conn, "node_communities", snapshot)
+                inherited = {}
+                if matches:
+                    inherited = {matches[row["id"]]: row["community"] for row in conn.execute(
+                        "SELECT id, community FROM node_communities WHERE version = ?", (previous_version,)
+                    ) if row["id"] in matches and G.has_node(matches[row["id"]])}
+                if inherited and G.number_of_nodes() - len(inherited) <= GRAPH_COMMUNITY_REBUILD_RATIO * G.number_of_nodes():
+                    # Cambio pequeño: las entidades existentes conservan su comunidad (clústeres estables entre versiones)
+                    community = graph_builder.extend_communities(G, inherited)
+                else:
+                    for number, members in enumerate(graph_builder.detect_communities(G)):
+                        for node_id in members:
+                            community[str(node_id)] = number
+                rank = {str(node_id): score for node_id, score in graph_builder.pagerank(G).items()}
+                logger.info(f"Comunidades de la versión {snapshot.version}: "
+                            f"{len(set(community.values()))} en {time.time() - started:.2f}s")
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO node_communities (version, id, community, rank) VALUES (?, ?, ?, ?)",
+                    [(snapshot.version, node_id, community[node_id], rank.get(node_id, 0.0)) for node_id in community]
+                )
+                conn.execute("COMMIT")
+        finally:
+            conn.close()
+        snapshot.communities = {
+            "community": community,
+            "rank": rank,
+            "order": sorted(rank, key=rank.get, reverse=True)
+        }
+    return snapshot.communities
+
@@ -0,0 +1,111 @@
+# ./core/graph_wire.py
+# Formato compacto (por columnas) para enviar elementos de Cytoscape al navegador
+#
+# En lugar de una lista de objetos {"data": {...}, "classes": ..., "position": ...}
+# que repite las mismas claves en cada elemento, se envían arrays paralelos: tablas
+# de tipos, clases y etiquetas de arista internadas, índices enteros de nodo para los
+# extremos de cada arista y coordenadas en dos arrays. assets/graph_wire.js hace la
+# expansión inversa en el navegador (decode_elements es su equivalente en Python).
+
+WIRE_FORMAT = "compact-v1"
+
+_NODE_KEYS = ("id", "label", "type")
+_EDGE_KEYS = ("id", "source", "target", "label", "type")
+
+class _Interner:
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __call__(self, value):
+        if value not in self._index:
+            self._index[value] = len(self.values)
+            self.values.append(value)
+        return self._index[value]
+
+def encode_elements(elements):
+    """
+    Codifica elementos de Cytoscape (nodos antes que sus aristas) en formato compacto.
+
+    Returns:
+        Diccionario serializable a JSON, o None si algún elemento no se puede
+        representar (p. ej. una arista hacia un nodo que no está en la lista).
+    """
+    types, classes, edge_labels = _Interner(), _Interner(), _Interner()
+    node_index = {}
+    nodes = {"id": [], "label": [], "type": [], "class": [], "x": [], "y": []}
+    edges = {"source": [], "target": [], "label": [], "type": [], "class": []}
+    node_extra, edge_ids, edge_extra = {}, {}, {}
+
+    for element in elements:
+        data = element.get("data", {})
+        if set(element) - {"data", "classes", "position"}:
+            return None
+        if "source" in data:
+            source, target = node_index.get(data["source"]), node_index.get(data["target"])
+            if source is None or target is None:
+                return None
+            j = len(edges["source"])
+            edges["source"].append(source)
+            edges["target"].append(target)
+            edges["label"].append(edge_labels(data.get("label")))
+            edges["type"].append(types(data.get("type")))
+            edges["class"].append(classes(element.get("classes")))
+            if data.get("id") != f"{data['source']}-{data['target']}":
+                edge_ids[j] = data.get("id")
+            extra = {k: v for k, v in data.items() if k not in _EDGE_KEYS}
+            if extra:
+                edge_extra[j] = extra
+        else:
+            i = len(nodes["id"])
+            node_index[data.get("id")] = i
+            nodes["id"].append(data.get("id"))
+            nodes["label"].append(data.get("label"))
+            nodes["type"].append(types(data.get("type")))
+            nodes["class"].append(classes(element.get("classes")))
+            position = element.get("position")
+            nodes["x"].append(position["x"] if position else None)
+            nodes["y"].append(position["y"] if position else None)
+            extra = {k: v for k, v in data.items() if k not in _NODE_KEYS}
+            if extra:
+                node_extra[i] = extra
+
+    return {
+        "format": WIRE_FORMAT,
+        "types": types.values,
+        "classes": classes.values,
+        "edge_labels": edge_labels.values,
+        "nodes": nodes,
+        "edges": edges,
+        # Datos poco frecuentes (clústeres, aristas agregadas), por posición
+        "node_extra": {str(i): extra for i, extra in node_extra.items()},
+        "edge_ids": {str(j): edge_id for j, edge_id in edge_ids.items()},
+        "edge_extra": {str(j): extra for j, extra in edge_extra.items()}
+    }
+
+def decode_elements(payload):
+    """
+    Reconstruye la lista de elementos de Cytoscape (nodos y después aristas).
+    """
+    types, classes, edge_labels = payload["types"], payload["classes"], payload["edge_labels"]
+    nodes, edges = payload["nodes"], payload["edges"]
+    elements = []
+    for i, node_id in enumerate(nodes["id"]):
+        data = {"id": node_id, "label": nodes["label"][i], "type": types[nodes["type"][i]]}
+        data.update(payload["node_extra"].get(str(i), {}))
+        element = {"data": data, "classes": classes[nodes["class"][i]]}
+        if nodes["x"][i] is not None:
+            element["position"] = {"x": nodes["x"][i], "y": nodes["y"][i]}
+        elements.append(element)
+    for j in range(len(edges["source"])):
+        source, target = nodes["id"][edges["source"][j]], nodes["id"][edges["target"][j]]
+        data = {
+            "id": payload["edge_ids"].get(str(j), f"{source}-{target}"),
+            "source": source,
+            "target": target,
+            "label": edge_labels[edges["label"][j]],
+            "type": types[edges["type"][j]]
+        }
+        data.update(payload["edge_extra"].get(str(j), {}))
+        elements.append({"data": data, "classes": classes[edges["class"][j]]})
+    return elements
@@ -0,0 +1,296 @@
+# ./core/ingestion.py
+# Pipeline de ingesta de documentos: OCR -> chunking -> embeddings -> extracción de entidades
+# Se ejecuta en los workers de la cola (core/jobs.py), no dentro de los callbacks de Dash
+
+import os
+import logging
+from dotenv import load_dotenv
+from openai import OpenAI
+
+from core import ocr, utils, embeddings, llm, manifest, graph_store, graph_sampling, jobs
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Guardar cada chunk con el promedio de los embeddings de sus frases (una sola pasada
+# por la API). Con "false" los chunks se vuelven a vectorizar completos.
+POOL_CHUNK_EMBEDDINGS = os.getenv("POOL_CHUNK_EMBEDDINGS", "true").lower() in ("1", "true", "yes")
+
+def _noop_progress(stage, progress, message=None):
+    pass
+
+def _lookup_processed(content_hash, method, source, progress=_noop_progress):
+    """
+    Busca en el manifiesto un documento idéntico ya procesado con el mismo OCR y modelo
+    de embeddings. Si existe, devuelve su resultado sin repetir trabajo de pago.
+    """
+    entry = manifest.lookup_document(content_hash, method, embeddings.EMBEDDING_MODEL)
+    if entry is None:
+        return None
+
+    progress("dedup", 0.95, "♻️ Documento ya procesado, reutilizando vectores y grafo...")
+    result = entry["result"]
+    result["source"] = source
+    result["reused"] = True
+    return result
+
+def _summary_message(result, title):
+    if result.get("reused"):
+        title = "♻️ Documento ya procesado (reutilizado sin coste)!"
+    return (
+        f"{title} {len(result['chunks'])} chunks, {result['embeddings_saved']} embeddings, "
+        f"{len(result['entities'])} entidades, {len(result['relations'])} relaciones extraídas."
+    )
+
+def process_extracted_text(text, source, method, metadata, progress=_noop_progress, content_hash=None):
+    """
+    Procesa texto ya extraído: chunking semántico, embeddings y extracción de entidades.
+    Si se indica `content_hash`, el resultado se registra en el manifiesto para
+    reutilizarlo en futuras subidas del mismo contenido.
+    Devuelve un diccionario serializable con el resultado.
+    """
+    OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+
+    client = OpenAI(api_key=OPENAI_API_KEY)
+
+    # Chunking semántico: los embeddings de las frases se reutilizan para guardar los chunks
+    progress("chunking", 0.25, "✂️ Dividiendo el texto en chunks semánticos...")
+    cleaned_text = utils.clean_text(text)
+    try:
+        chunks, chunk_vectors = ocr.chunk_text_semantic_with_embeddings(cleaned_text, client, max_chunk_size=1000)
+    except Exception as e:
+        logger.warning(f"Chunking semántico falló ({e}), usando trozos de tamaño fijo")
+        chunks, chunk_vectors = utils.get_chunks_from_text(cleaned_text, chunk_size=1000), None
+    if not POOL_CHUNK_EMBEDDINGS:
+        chunk_vectors = None
+
+    progress("embedding", 0.4, f"🧮 Guardando embeddings de {len(chunks)} chunks...")
+    document_id = utils.generate_document_id(source, content_hash=content_hash, ocr_method=method,
+                                             embedding_model=embeddings.EMBEDDING_MODEL)
+
+    # Embeddings y upserts por lotes (un fallo puntual no aborta el documento)
+    report = embeddings.upsert_embeddings_bulk(
+        chunks,
+        document_id=document_id,
+        client=client,
+        metadata=metadata,
+        vectors=chunk_vectors
+    )
+    for failure in report["failed"]:
+        print(f"❌ Error procesando chunk {failure['chunk_index']} ({failure['stage']}): {failure['error']}")
+
+    # ⭐ EXTRAER ENTIDADES Y RELACIONES ⭐ (documento completo: paquetes en paralelo + reduce)
+    progress("extraction", 0.6, f"🔎 Analizando {len(chunks)} chunks con el LLM...")
+
+    def on_result(completed, total):
+        progress("extraction", 0.6 + 0.35 * completed / total,
+                 f"🔎 Analizando chunks con el LLM ({completed}/{total})...")
+
+    all_entities, all_relations = llm.extract_graph_from_chunks(
+        chunks, llm_method="openai", id_prefix="c{i}_", on_result=on_result
+    )
+
+    result = {
+        "source": source,
+        "document_id": document_id,
+        "chunks": chunks,
+        "embeddings_saved": report["saved"],
+        "embeddings_failed": len(report["failed"]),
+        "entities": all_entities,
+        "relations": all_relations
+    }
+
+    # Solo se registran ingestas completas: si faltan vectores, la próxima subida los reintenta
+    if content_hash and not report["failed"]:
+        manifest.record_document(content_hash, method, embeddings.EMBEDDING_MODEL, document_id, source, result)
+
+    return result
+
+def process_file(file_path, filename, ocr_method, progress=_noop_progress):
+    """
+    Ingesta completa de un archivo subido.
+    """
+    content_hash = utils.hash_file(file_path)
+    result = _lookup_processed(content_hash, ocr_method, filename, progress)
+
+    if result is None:
+        progress("ocr", 0.05, f"📄 Extrayendo texto de {filename} ({ocr_method})...")
+        text = ocr.extract_text(file_path, ocr_method=ocr_method)
+
+        result = process_extracted_text(
+            text, filename, ocr_method,
+            metadata={"filename": filename, "ocr_method": ocr_method},
+            progress=progress,
+            content_hash=content_hash
+        )
+    result["message"] = _summary_message(result, "✅ Procesamiento completo!")
+    return result
+
+def process_url(url, ocr_method, progress=_noop_progress):
+    """
+    Ingesta completa de un enlace (HTML o PDF).
+    """
+    import requests
+
+    progress("download", 0.02, f"🌐 Descargando {url}...")
+    response = requests.head(url, allow_redirects=True, timeout=10)
+    content_type = response.headers.get('content-type', '').lower()
+
+    # Determinar tipo de contenido
+    is_html = 'text/html' in content_type or 'wikipedia.org' in url
+    method = "web_extraction" if is_html else ocr_method
+    content = _download(url, timeout=15 if is_html else 30)
+
+    content_hash = utils.hash_bytes(content)
+    result = _lookup_processed(content_hash, method, url, progress)
+
+    if result is None:
+        if is_html:
+            text = _extract_html_text(content)
+        else:
+            # PDF (o servidores que no envían headers correctos)
+            text = _extract_pdf_text(content, ocr_method, progress)
+
+        result = process_extracted_text(
+            text, url, method,
+            metadata={"source_url": url, "extraction_method": method},
+            progress=progress,
+            content_hash=content_hash
+        )
+    result["message"] = _summary_message(result, "✅ URL procesada!")
+    return result
+
+def _download(url, timeout):
+    """
+    Descarga el contenido bruto de una URL.
+    """
+    import requests
+
+    r = requests.get(url, timeout=timeout)
+    if r.status_code != 200:
+        raise Exception(f"Error descargando {url}: status {r.status_code}")
+    return r.content
+
+def _extract_html_text(content):
+    """
+    Extrae el texto principal de una página HTML ya descargada.
+    """
+    try:
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(content, 'html.parser')
+
+        # Remover scripts, estilos, etc.
+        for script in soup(["script", "style", "nav", "footer", "aside"]):
+            script.decompose()
+
+        # Extraer texto principal
+        text = soup.get_text()
+
+        # Limpiar texto
+        lines = (line.strip() for line in text.splitlines())
+        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+        text = '\n'.join(chunk for chunk in chunks if chunk)
+
+        # Truncar si es muy largo
+        if len(text) > 50000:  # Límite para evitar costos excesivos
+            text = text[:50000] + "..."
+
+        return text
+
+    except Exception as e:
+        raise Exception(f"Error procesando HTML: {e}")
+
+def _extract_pdf_text(content, ocr_method, progress=_noop_progress):
+    """
+    Extrae el texto de un PDF ya descargado con el OCR seleccionado.
+    """
+    try:
+        tmp_path = utils.get_temp_file_path(suffix=".pdf")
+        with open(tmp_path, "wb") as f:
+            f.write(content)
+
+        try:
+            progress("ocr", 0.05, f"📄 Extrayendo texto del PDF ({ocr_method})...")
+            return ocr.extract_text(tmp_path, ocr_method=ocr_method)
+        finally:
+            # Limpiar archivo temporal
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    except Exception as e:
+        raise Exception(f"Error procesando PDF: {e}")
+
+def _build_ann_index(progress=_noop_progress):
+    """
+    Trabajo "ann_index": entrena el índice aproximado del almacén local si sigue haciendo falta.
+    """
+    store = embeddings.get_vector_store()
+    if not store.ann_index_due():
+        return {"ann_index": None}
+    progress("ann_index", 0.1, "🧭 Entrenando el índice aproximado...")
+    return {"ann_index": store.build_ann_index()}
+
+def _schedule_ann_index():
+    """
+    Encola el entrenamiento del índice aproximado como trabajo aparte cuando toca,
+    para que ni esta ingesta ni las escrituras de otros procesos esperen por él.
+    """
+    try:
+        if embeddings.get_vector_store().ann_index_due() and not jobs.has_pending_job("ann_index"):
+            jobs.enqueue_job("ann_index", {})
+    except Exception as e:
+        logger.warning(f"No se pudo programar el entrenamiento del índice aproximado: {e}")
+
+def run_job(job, progress=_noop_progress):
+    """
+    Ejecuta un trabajo de la cola según su tipo y guarda el grafo resultante
+    como nueva versión en core/graph_store.py.
+    """
+    payload = job["payload"]
+    if job["kind"] == "ann_index":
+        return _build_ann_index(progress)
+    if job["kind"] == "file":
+        try:
+            result = process_file(payload["file_path"], payload["filename"], payload["ocr_method"], progress)
+        finally:
+            try:
+                os.unlink(payload["file_path"])
+            except OSError:
+                pass
+    elif job["kind"] == "url":
+        result = process_url(payload["url"], payload["ocr_method"], progress)
+    else:
+        raise ValueError(f"Tipo de trabajo desconocido: {job['kind']}")
+
+    # Documento ya procesado: su versión del grafo (si no se ha descartado) ya tiene
+    # embeddings de nodos, layout y comunidades, y el corpus no ha cambiado
+    if result.get("reused") and graph_store.version_exists(result.get("graph_version")):
+        return result
+
+    # Los embeddings de los nodos se calculan en lote y se guardan con la versión
+    progress("graph", 0.97, "🧠 Guardando el grafo...")
+    node_vectors = embeddings.embed_graph_nodes(result["entities"])
+    result["graph_version"] = graph_store.save_graph(
+        result["entities"], result["relations"], source=result["source"],
+        node_vectors=node_vectors, embedding_model=embeddings.EMBEDDING_MODEL
+    )
+    if result.get("document_id"):
+        manifest.record_graph_version(result["document_id"], result["graph_version"])
+    # El layout y las comunidades se calculan aquí (en el worker) para que la interfaz solo tenga que leerlos
+    progress("graph", 0.99, "📐 Calculando el layout del grafo...")
+    graph_store.get_layout(result["graph_version"])
+    graph_store.get_communities(result["graph_version"])
+    if result.get("reused"):
+        # No se escribió ningún vector: ni los clústeres ni el índice aproximado cambian
+        return result
+    # Los clústeres de muestreo del corpus incorporan los chunks nuevos
+    if graph_sampling.GRAPH_SAMPLING_REFRESH_ON_INGEST:
+        try:
+            graph_sampling.refresh_clusters()
+        except Exception as e:
+            logger.warning(f"No se pudieron actualizar los clústeres de muestreo: {e}")
+    _schedule_ann_index()
+    return result
@@ -0,0 +1,222 @@
+# ./core/jobs.py
+# Cola de trabajos persistente en SQLite para ejecutar la ingesta fuera de los callbacks de Dash
+
+import os
+import json
+import time
+import uuid
+import sqlite3
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+JOBS_DB_PATH = Path(os.getenv("JOBS_DB_PATH", DATA_DIR / 'jobs.db'))
+UPLOADS_DIR = Path(os.getenv("UPLOADS_DIR", DATA_DIR / 'uploads'))
+
+# Un trabajo "running" sin heartbeat durante este tiempo se considera huérfano
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    progress REAL NOT NULL DEFAULT 0,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at);
+"""
+
+def _connect():
+    """
+    Abre una conexión a la base de datos de trabajos (una por llamada, segura entre procesos).
+    """
+    JOBS_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["payload"] = json.loads(job["payload"]) if job["payload"] else {}
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    return job
+
+def enqueue_job(kind, payload):
+    """
+    Encola un trabajo y devuelve su ID.
+    """
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT INTO jobs (id, kind, payload, status, stage, message, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, json.dumps(payload, ensure_ascii=False), STATUS_QUEUED,
+             "queued", "En cola", now, now)
+        )
+    finally:
+        conn.close()
+    return job_id
+
+def has_pending_job(kind):
+    """
+    True si hay un trabajo de ese tipo en cola o en ejecución.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT 1 FROM jobs WHERE kind = ? AND status IN (?, ?) LIMIT 1",
+                           (kind, STATUS_QUEUED, STATUS_RUNNING)).fetchone()
+    finally:
+        conn.close()
+    return row is not None
+
+def get_job(job_id):
+    """
+    Devuelve el estado completo de un trabajo o None si no existe.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(row)
+    finally:
+        conn.close()
+
+def claim_next_job(worker_id):
+    """
+    Reclama de forma atómica el trabajo en cola más antiguo para este worker.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        row = conn.execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1",
+            (STATUS_QUEUED,)
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE jobs SET status = ?, worker_id = ?, attempts = attempts + 1, "
+            "stage = ?, message = ?, updated_at = ? WHERE id = ?",
+            (STATUS_RUNNING, worker_id, "starting", "Iniciando", time.time(), row["id"])
+        )
+        conn.execute("COMMIT")
+        return get_job(row["id"])
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def update_job_progress(job_id, stage, progress, message=None):
+    """
+    Registra la etapa y el avance (0-1) de un trabajo; también actúa como heartbeat.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET stage = ?, progress = ?, message = ?, updated_at = ? WHERE id = ?",
+            (stage, float(progress), message, time.time(), job_id)
+        )
+    finally:
+        conn.close()
+
+def heartbeat_job(job_id):
+    """
+    Marca un trabajo como vivo sin cambiar su etapa (para etapas largas sin progreso).
+    """
+    conn = _connect()
+    try:
+        conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ? AND status = ?",
+                     (time.time(), job_id, STATUS_RUNNING))
+    finally:
+        conn.close()
+
+def complete_job(job_id, result):
+    """
+    Marca un trabajo como terminado y guarda su resultado.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, progress = 1, message = ?, result = ?, updated_at = ? WHERE id = ?",
+            (STATUS_DONE, "done", result.get("message"), json.dumps(result, ensure_ascii=False),
+             time.time(), job_id)
+        )
+    finally:
+        conn.close()
+
+def fail_job(job_id, error):
+    """
+    Marca un trabajo como fallido.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, error = ?, message = ?, updated_at = ? WHERE id = ?",
+            (STATUS_FAILED, "failed", str(error), f"❌ {error}", time.time(), job_id)
+        )
+    finally:
+        conn.close()
+
+def requeue_stale_jobs(stale_seconds=JOB_STALE_SECONDS, max_attempts=JOB_MAX_ATTEMPTS):
+    """
+    Devuelve a la cola los trabajos cuyo worker murió sin terminarlos.
+    Los que superan `max_attempts` se marcan como fallidos.
+    """
+    cutoff = time.time() - stale_seconds
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, error = ?, updated_at = ? "
+            "WHERE status = ? AND updated_at < ? AND attempts >= ?",
+            (STATUS_FAILED, "failed", "Worker interrumpido demasiadas veces", time.time(),
+             STATUS_RUNNING, cutoff, max_attempts)
+        )
+        cursor = conn.execute(
+            "UPDATE jobs SET status = ?, stage = ?, message = ?, worker_id = NULL, updated_at = ? "
+            "WHERE status = ? AND updated_at < ?",
+            (STATUS_QUEUED, "queued", "Reencolado tras interrupción", time.time(), STATUS_RUNNING, cutoff)
+        )
+        conn.execute("COMMIT")
+        if cursor.rowcount:
+            logger.warning(f"{cursor.rowcount} trabajos huérfanos reencolados")
+        return cursor.rowcount
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    finally:
+        conn.close()
+
+def get_upload_path(job_key, suffix=""):
+    """
+    Ruta compartida (web y workers) donde se guarda el archivo de un trabajo.
+    """
+    UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+    return str(UPLOADS_DIR / f"{job_key}{suffix}")
@@ -4,17 +4,38 @@
 import os
 import json
 import re
+import hashlib
 import logging
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dotenv import load_dotenv
 from openai import OpenAI
 import requests
 
+from core import extraction_cache
+
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 LLM_DEFAULT = os.getenv("LLM_DEFAULT", "openai")
 
+# Extracción concurrente: llamadas simultáneas máximas y timeout por request (s)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", "60"))
+
+# Modelos de extracción por proveedor (forman parte de la clave de caché)
+OPENAI_EXTRACTION_MODEL = os.getenv("OPENAI_EXTRACTION_MODEL", "gpt-4o")
+CLAUDE_EXTRACTION_MODEL = os.getenv("CLAUDE_EXTRACTION_MODEL", "claude-sonnet-4-20250514")
+
+# Map-reduce de documentos: tokens de entrada por petición (se empaquetan chunks hasta llenarlo)
+# y tokens de salida admitidos (el JSON crece con el tamaño del paquete)
+EXTRACTION_TOKEN_BUDGET = int(os.getenv("EXTRACTION_TOKEN_BUDGET", "3000"))
+EXTRACTION_MAX_OUTPUT_TOKENS = int(os.getenv("EXTRACTION_MAX_OUTPUT_TOKENS", "4096"))
+_CHARS_PER_TOKEN = 4
+
+EXTRACTION_SYSTEM_PROMPT = "Eres un experto en extracción de entidades. Responde solo con JSON válido."
+
 def create_entity_prompt(text):
     """
     Crea el prompt para extracción de entidades EN ESPAÑOL.
@@ -39,6 +60,11 @@ Texto: {text}
 
 JSON:"""
 
+# Huella de la plantilla del prompt: si cambia, las extracciones cacheadas dejan de valer
+EXTRACTION_PROMPT_HASH = hashlib.sha256(
+    (EXTRACTION_SYSTEM_PROMPT + create_entity_prompt("\0")).encode("utf-8")
+).hexdigest()[:16]
+
 def extract_json_from_text(text):
     """
     Extrae JSON de manera robusta, maneja markdown code blocks.
@@ -140,7 +166,7 @@ def validate_json_structure(data):
         "relations": valid_relations
     }
 
-def openai_extract_entities_relations(text, model="gpt-4o"):
+def openai_extract_entities_relations(text, model=OPENAI_EXTRACTION_MODEL, timeout=LLM_REQUEST_TIMEOUT):
     """
     Extrae entidades usando OpenAI.
     """
@@ -154,11 +180,12 @@ def openai_extract_entities_relations(text, model="gpt-4o"):
         response = client.chat.completions.create(
             model=model,
             messages=[
-                {"role": "system", "content": "Eres un experto en extracción de entidades. Responde solo con JSON válido."},
+                {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt}
             ],
             temperature=0,
-            max_tokens=1500,
+            max_tokens=EXTRACTION_MAX_OUTPUT_TOKENS,
+            timeout=timeout,
         )
         
         raw_response = response.choices[0].message.content
@@ -174,7 +201,7 @@ def openai_extract_entities_relations(text, model="gpt-4o"):
         import traceback
         return {"entities": [], "relations": []}
 
-def claude_extract_entities_relations(text, model="claude-sonnet-4-20250514"):
+def claude_extract_entities_relations(text, model=CLAUDE_EXTRACTION_MODEL, timeout=LLM_REQUEST_TIMEOUT):
     """
     Extrae entidades usando Claude.
     """
@@ -191,14 +218,14 @@ def claude_extract_entities_relations(text, model="claude-sonnet-4-20250514"):
         prompt = create_entity_prompt(text)
         payload = {
             "model": model,
-            "max_tokens": 1500,
+            "max_tokens": EXTRACTION_MAX_OUTPUT_TOKENS,
             "temperature": 0,
-            "system": "Eres un experto en extracción de entidades. Responde solo con JSON válido.",
+            "system": EXTRACTION_SYSTEM_PROMPT,
             "messages": [{"role": "user", "content": prompt}],
         }
         
         resp = requests.post("https://api.anthropic.com/v1/messages", 
-                           headers=headers, json=payload)
+                           headers=headers, json=payload, timeout=timeout)
         
         if resp.status_code != 200:
             logging.error(f"Error Claude API: {resp.status_code} - {resp.text}")
@@ -216,30 +243,223 @@ def claude_extract_entities_relations(text, model="claude-sonnet-4-20250514"):
         logging.error(f"Error en Claude: {e}")
         return {"entities": [], "relations": []}
 
-def extract_entities_relations(text, llm_method=LLM_DEFAULT):
+def extract_entities_relations(text, llm_method=LLM_DEFAULT, timeout=LLM_REQUEST_TIMEOUT):
     """
     Función principal para extraer entidades y relaciones.
+    Los resultados se cachean en disco por texto, proveedor, modelo y prompt
+    (core/extraction_cache.py): repetir la extracción de un chunk no llama al LLM.
     """
     if not text or not text.strip():
         logging.warning("Texto vacío para extracción")
         return {"entities": [], "relations": []}
     
-    # Truncar si es muy largo
-    if len(text) > 4000:
-        text = text[:4000] + "..."
-    
-    try:
-        if llm_method == "openai":
-            return openai_extract_entities_relations(text)
-        elif llm_method == "claude":
-            return claude_extract_entities_relations(text)
-        else:
+    # Textos que no caben en una petición se reparten en paquetes (sin truncar)
+    if estimate_tokens(text) > EXTRACTION_TOKEN_BUDGET:
+        entities, relations = extract_graph_from_chunks([text], llm_method, id_prefix="p{i}_", timeout=timeout)
+        return {"entities": entities, "relations": relations}
+
+    if llm_method == "claude":
+        provider, model, extract_fn = "claude", CLAUDE_EXTRACTION_MODEL, claude_extract_entities_relations
+    else:
+        if llm_method != "openai":
             logging.warning(f"Método '{llm_method}' no soportado, usando OpenAI")
-            return openai_extract_entities_relations(text)
+        provider, model, extract_fn = "openai", OPENAI_EXTRACTION_MODEL, openai_extract_entities_relations
+
+    if extraction_cache.EXTRACTION_CACHE_ENABLED:
+        try:
+            cached = extraction_cache.lookup_extraction(text, provider, model, EXTRACTION_PROMPT_HASH)
+            if cached is not None:
+                return cached
+        except Exception as e:
+            logging.warning(f"Caché de extracción no disponible: {e}")
+
+    try:
+        result = extract_fn(text, model=model, timeout=timeout)
     except Exception as e:
         logging.error(f"Error general en extracción: {e}")
         return {"entities": [], "relations": []}
 
+    # Solo se cachean extracciones con contenido (un fallo de API o de JSON devuelve vacío)
+    if extraction_cache.EXTRACTION_CACHE_ENABLED and result.get("entities"):
+        try:
+            extraction_cache.store_extraction(text, provider, model, EXTRACTION_PROMPT_HASH, result)
+        except Exception as e:
+            logging.warning(f"No se pudo guardar en la caché de extracción: {e}")
+    return result
+
+def extract_entities_relations_many(texts, llm_method=LLM_DEFAULT, max_workers=LLM_MAX_CONCURRENCY,
+                                    timeout=LLM_REQUEST_TIMEOUT, on_result=None):
+    """
+    Extrae entidades y relaciones de varios textos en paralelo con un pool acotado.
+
+    Cada llamada tiene su propio timeout; el tiempo total depende de la llamada más
+    lenta y no de la suma. Los resultados se devuelven en el mismo orden que `texts`
+    y un fallo en un texto produce una estructura vacía en su posición.
+
+    Args:
+        on_result: callback opcional `on_result(completados, total)` para reportar progreso.
+    """
+    texts = list(texts)
+    results = [{"entities": [], "relations": []} for _ in texts]
+    if not texts:
+        return results
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(texts)))) as executor:
+        futures = {
+            executor.submit(extract_entities_relations, text, llm_method, timeout): i
+            for i, text in enumerate(texts)
+        }
+        for completed, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            try:
+                result = future.result()
+                if isinstance(result, dict):
+                    results[i] = result
+                else:
+                    logging.warning(f"LLM devolvió formato inesperado en el texto {i}: {type(result)}")
+            except Exception as e:
+                logging.error(f"Error extrayendo entidades del texto {i}: {e}")
+            if on_result:
+                on_result(completed, len(texts))
+
+    return results
+
+def estimate_tokens(text):
+    """
+    Estimación rápida de tokens (~4 caracteres por token) sin depender de un tokenizador.
+    """
+    return (len(text) + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+def _split_oversized(text, max_chars):
+    """
+    Parte un texto demasiado largo en trozos de hasta `max_chars`, cortando en
+    fin de frase o espacio cuando es posible.
+    """
+    pieces = []
+    while len(text) > max_chars:
+        cut = max(text.rfind(". ", 0, max_chars), text.rfind("\n", 0, max_chars))
+        if cut < max_chars // 2:
+            cut = text.rfind(" ", 0, max_chars)
+        if cut < max_chars // 2:
+            cut = max_chars - 1
+        pieces.append(text[:cut + 1].strip())
+        text = text[cut + 1:]
+    if text.strip():
+        pieces.append(text.strip())
+    return pieces
+
+def pack_chunks(chunks, token_budget=EXTRACTION_TOKEN_BUDGET):
+    """
+    Agrupa chunks consecutivos en paquetes de hasta `token_budget` tokens estimados
+    (los chunks mayores que el presupuesto se parten). Mantener el orden conserva
+    juntas las relaciones que cruzan el borde entre chunks.
+    """
+    max_chars = token_budget * _CHARS_PER_TOKEN
+    packs, current, current_chars = [], [], 0
+    for chunk in chunks:
+        if not chunk or not chunk.strip():
+            continue
+        for piece in _split_oversized(chunk.strip(), max_chars):
+            if current and current_chars + len(piece) + 2 > max_chars:
+                packs.append("\n\n".join(current))
+                current, current_chars = [], 0
+            current.append(piece)
+            current_chars += len(piece) + 2
+    if current:
+        packs.append("\n\n".join(current))
+    return packs
+
+def normalize_entity_text(text):
+    """
+    Forma canónica del nombre de una entidad: minúsculas, sin acentos, sin
+    puntuación y con los espacios colapsados.
+    """
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+def merge_extractions(results, id_prefix="p{i}_"):
+    """
+    Paso reduce: combina las extracciones de cada paquete en un único grafo.
+    Las entidades con el mismo tipo y nombre normalizado se fusionan en la primera
+    aparición y las relaciones se reenganchan a ese ID, sin duplicados.
+    """
+    entities, relations = [], []
+    canonical_by_key, canonical_by_id = {}, {}
+    seen_relations = set()
+
+    for i, llm_result in enumerate(results):
+        pack_entities, pack_relations = prefix_entity_ids(llm_result, id_prefix.format(i=i))
+        for entity in pack_entities:
+            key = (str(entity.get("type", "")).lower(), normalize_entity_text(entity.get("text")))
+            if key in canonical_by_key:
+                canonical_by_id[entity["id"]] = canonical_by_key[key]
+                continue
+            canonical_by_key[key] = canonical_by_id[entity["id"]] = entity["id"]
+            entities.append(entity)
+
+        for relation in pack_relations:
+            source = canonical_by_id.get(relation.get("source_id"))
+            target = canonical_by_id.get(relation.get("target_id"))
+            if source is None or target is None or source == target:
+                continue
+            key = (source, target, relation.get("type"))
+            if key in seen_relations:
+                continue
+            seen_relations.add(key)
+            relation["source_id"], relation["target_id"] = source, target
+            relations.append(relation)
+
+    return entities, relations
+
+def prefix_entity_ids(llm_result, prefix):
+    """
+    Prefija los IDs de entidades y relaciones para que sean únicos entre chunks.
+    """
+    chunk_entities = llm_result.get("entities", [])
+    chunk_relations = llm_result.get("relations", [])
+
+    for entity in chunk_entities:
+        if "id" in entity:
+            entity["id"] = f"{prefix}{entity['id']}"
+
+    for relation in chunk_relations:
+        if "source_id" in relation:
+            relation["source_id"] = f"{prefix}{relation['source_id']}"
+        if "target_id" in relation:
+            relation["target_id"] = f"{prefix}{relation['target_id']}"
+
+    return chunk_entities, chunk_relations
+
+def extract_graph_from_chunks(chunks, llm_method=LLM_DEFAULT, id_prefix="c{i}_",
+                              max_workers=LLM_MAX_CONCURRENCY, timeout=LLM_REQUEST_TIMEOUT, on_result=None,
+                              token_budget=EXTRACTION_TOKEN_BUDGET, resolve=None):
+    """
+    Extrae el grafo de un documento completo con map-reduce.
+
+    Map: los chunks se empaquetan en peticiones de hasta `token_budget` tokens y se
+    extraen en paralelo (hasta `max_workers` a la vez). Reduce: los resultados se
+    combinan con `merge_extractions` y, si `resolve` (por defecto
+    ENTITY_RESOLUTION_ENABLED), se fusionan los duplicados entre paquetes con
+    core/entity_resolution.py. Los IDs de cada paquete se prefijan con
+    `id_prefix.format(i=i)` (p. ej. "c0_ent1").
+
+    Returns:
+        Tupla (entidades, relaciones) en el orden del documento.
+    """
+    from core import entity_resolution
+
+    packs = pack_chunks(chunks, token_budget)
+    results = extract_entities_relations_many(packs, llm_method, max_workers, timeout, on_result)
+    entities, relations = merge_extractions(results, id_prefix)
+
+    if resolve is None:
+        resolve = entity_resolution.ENTITY_RESOLUTION_ENABLED
+    if resolve and len(packs) > 1:
+        entities, relations, _ = entity_resolution.resolve_entities(entities, relations)
+    return entities, relations
+
 def test_extraction(sample_text="Juan trabaja en Microsoft y vive en Madrid."):
     """
     Función de prueba.
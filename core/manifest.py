@@ -0,0 +1,157 @@
+# ./core/manifest.py
+# Manifiesto local de documentos ingeridos, direccionado por el hash del contenido
+# Permite reutilizar vectores y grafo cuando se vuelve a subir el mismo archivo
+
+import os
+import json
+import time
+import sqlite3
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+MANIFEST_DB_PATH = Path(os.getenv("MANIFEST_DB_PATH", DATA_DIR / 'manifest.db'))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    content_hash TEXT NOT NULL,
+    ocr_method TEXT NOT NULL,
+    embedding_model TEXT NOT NULL,
+    document_id TEXT NOT NULL,
+    source TEXT,
+    chunk_count INTEGER NOT NULL DEFAULT 0,
+    result TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (content_hash, ocr_method, embedding_model)
+);
+CREATE INDEX IF NOT EXISTS idx_documents_document_id ON documents (document_id);
+CREATE TABLE IF NOT EXISTS document_vectors (
+    document_id TEXT NOT NULL,
+    namespace TEXT NOT NULL,
+    id TEXT NOT NULL,
+    PRIMARY KEY (document_id, namespace, id)
+);
+"""
+
+def _connect():
+    MANIFEST_DB_PATH.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(MANIFEST_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+def lookup_document(content_hash, ocr_method, embedding_model):
+    """
+    Devuelve el resultado guardado de un documento ya procesado con el mismo
+    método de OCR y modelo de embeddings, o None si no existe.
+    """
+    conn = _connect()
+    try:
+        row = conn.execute(
+            "SELECT * FROM documents WHERE content_hash = ? AND ocr_method = ? AND embedding_model = ?",
+            (content_hash, ocr_method, embedding_model)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+    entry = dict(row)
+    entry["result"] = json.loads(entry["result"])
+    return entry
+
+def record_document(content_hash, ocr_method, embedding_model, document_id, source, result):
+    """
+    Registra (o reemplaza) un documento procesado junto con su resultado de ingesta.
+    """
+    conn = _connect()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO documents "
+            "(content_hash, ocr_method, embedding_model, document_id, source, chunk_count, result, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (content_hash, ocr_method, embedding_model, document_id, source,
+             len(result.get("chunks", [])), json.dumps(result, ensure_ascii=False), time.time())
+        )
+    finally:
+        conn.close()
+
+def record_graph_version(document_id, graph_version):
+    """
+    Añade al resultado registrado de un documento la versión del grafo guardada al
+    ingerirlo, para que una nueva subida del mismo documento la reutilice.
+    """
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute("SELECT rowid, result FROM documents WHERE document_id = ?",
+                                (str(document_id),)).fetchall()
+            for row in rows:
+                result = json.loads(row["result"])
+                result["graph_version"] = graph_version
+                conn.execute("UPDATE documents SET result = ? WHERE rowid = ?",
+                             (json.dumps(result, ensure_ascii=False), row["rowid"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+def record_vector_ids(document_id, ids, namespace=""):
+    """
+    Registra los IDs de los vectores de un documento (para borrarlos sin consultar el índice).
+    """
+    conn = _connect()
+    try:
+        conn.executemany(
+            "INSERT OR IGNORE INTO document_vectors (document_id, namespace, id) VALUES (?, ?, ?)",
+            [(str(document_id), namespace or "", str(vector_id)) for vector_id in ids]
+        )
+    finally:
+        conn.close()
+
+def document_vector_ids(document_id):
+    """
+    IDs registrados de un documento, agrupados por namespace: {namespace: [id, ...]}.
+    """
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            "SELECT namespace, id FROM document_vectors WHERE document_id = ? ORDER BY namespace, id",
+            (str(document_id),)
+        ).fetchall()
+    finally:
+        conn.close()
+    ids = {}
+    for row in rows:
+        ids.setdefault(row["namespace"], []).append(row["id"])
+    return ids
+
+def forget_document(document_id):
+    """
+    Elimina del manifiesto todas las entradas de un document_id.
+    """
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM documents WHERE document_id = ?", (str(document_id),))
+        conn.execute("DELETE FROM document_vectors WHERE document_id = ?", (str(document_id),))
+    finally:
+        conn.close()
+
+def clear_manifest():
+    """
+    Vacía el manifiesto (necesario al borrar todos los vectores del índice).
+    """
+    conn = _connect()
+    try:
+        conn.execute("DELETE FROM documents")
+        conn.execute("DELETE FROM document_vectors")
+    finally:
+        conn.close()
@@ -3,10 +3,14 @@
 # Devuelve una lista de chunks de texto extraídos del documento
 
 import os
+import re
+import gc
+import time
+import logging
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
-from langchain_experimental.text_splitter import SemanticChunker
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.document_loaders import TextLoader
 
 # Para Docling OCR
 try:
@@ -25,8 +29,80 @@ except ImportError:
     pytesseract = None
 
 load_dotenv()
+logger = logging.getLogger(__name__)
+
+# Procesos para el OCR paralelo por página de Tesseract
+TESSERACT_WORKERS = int(os.getenv("TESSERACT_WORKERS", str(os.cpu_count() or 1)))
+# Páginas rasterizadas por ventana (en disco) y resolución de rasterizado
+TESSERACT_PAGE_WINDOW = int(os.getenv("TESSERACT_PAGE_WINDOW", "4"))
+TESSERACT_DPI = int(os.getenv("TESSERACT_DPI", "200"))
+
+# Separador de frases del chunker semántico (mismo criterio que SemanticChunker)
+SENTENCE_SPLIT_RE = re.compile(r"(?<=[.?!])\s+")
+
+# Convertidores Docling del proceso, indexados por opciones de pipeline
+_DOCLING_CONVERTERS = {}
+_DOCLING_LOCK = threading.Lock()
+
+def _docling_options_key(pipeline_options):
+    return tuple(sorted(pipeline_options.items()))
+
+def get_docling_converter(**pipeline_options):
+    """
+    Devuelve un DocumentConverter reutilizable para este proceso, creado de forma
+    perezosa y cacheado por opciones de pipeline (p. ej. do_ocr=False).
+    Evita recargar los modelos de layout/tablas de Docling en cada documento.
+    """
+    if not DOCLING_AVAILABLE:
+        raise ImportError("Docling no está disponible. Instálalo con: pip install docling")
+
+    key = _docling_options_key(pipeline_options)
+    with _DOCLING_LOCK:
+        converter = _DOCLING_CONVERTERS.get(key)
+        if converter is None:
+            if pipeline_options:
+                from docling.datamodel.base_models import InputFormat
+                from docling.datamodel.pipeline_options import PdfPipelineOptions
+                from docling.document_converter import PdfFormatOption
 
-def run_docling_ocr(file_path):
+                converter = DocumentConverter(format_options={
+                    InputFormat.PDF: PdfFormatOption(pipeline_options=PdfPipelineOptions(**pipeline_options))
+                })
+            else:
+                converter = DocumentConverter()
+            _DOCLING_CONVERTERS[key] = converter
+        return converter
+
+def warm_docling_converter(**pipeline_options):
+    """
+    Crea el convertidor y carga sus modelos por adelantado (al arrancar un worker),
+    para que el primer documento no pague la inicialización.
+    """
+    converter = get_docling_converter(**pipeline_options)
+    start = time.perf_counter()
+    if hasattr(converter, "initialize_pipeline"):
+        from docling.datamodel.base_models import InputFormat
+        converter.initialize_pipeline(InputFormat.PDF)
+    logger.info(f"Docling precalentado en {time.perf_counter() - start:.1f}s")
+    return converter
+
+def release_docling_converters():
+    """
+    Libera los convertidores cacheados y sus modelos (al reciclar un worker).
+    """
+    with _DOCLING_LOCK:
+        released = len(_DOCLING_CONVERTERS)
+        _DOCLING_CONVERTERS.clear()
+    gc.collect()
+    try:
+        import torch
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+    except ImportError:
+        pass
+    return released
+
+def run_docling_ocr(file_path, **pipeline_options):
     """
     Procesa el archivo usando Docling.
     Soporta PDF, DOCX, PPTX, HTML y más.
@@ -40,8 +116,8 @@ def run_docling_ocr(file_path):
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"Archivo no encontrado: {file_path}")
                 
-        # Inicializar convertidor
-        converter = DocumentConverter()
+        # Convertidor cacheado del proceso (modelos ya cargados)
+        converter = get_docling_converter(**pipeline_options)
         
         # Convertir documento
         result = converter.convert(file_path)
@@ -54,26 +130,95 @@ def run_docling_ocr(file_path):
     except Exception as e:
         raise RuntimeError(f"Error en Docling: {e}")
 
-def run_tesseract_ocr(file_path, lang="eng"):
+def _ocr_pdf_window(file_path, first_page, last_page, lang, dpi=TESSERACT_DPI):
+    """
+    Rasteriza una ventana de páginas de un PDF a disco y las procesa de una en una
+    (se ejecuta en un proceso del pool). Nunca hay más de una imagen en memoria.
+    Devuelve una lista de (número de página, texto, segundos).
+    """
+    from pdf2image import convert_from_path
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="ocr_") as output_folder:
+        start = time.perf_counter()
+        image_paths = convert_from_path(
+            file_path,
+            dpi=dpi,
+            first_page=first_page,
+            last_page=last_page,
+            output_folder=output_folder,
+            fmt="png",
+            paths_only=True
+        )
+        # El coste de rasterizar la ventana se reparte entre sus páginas
+        raster_seconds = (time.perf_counter() - start) / max(len(image_paths), 1)
+
+        for page_number, image_path in zip(range(first_page, last_page + 1), sorted(image_paths)):
+            start = time.perf_counter()
+            with Image.open(image_path) as img:
+                text = pytesseract.image_to_string(img, lang=lang)
+            os.unlink(image_path)
+            results.append((page_number, text, raster_seconds + time.perf_counter() - start))
+
+    return results
+
+def run_tesseract_pdf_pages(file_path, lang="eng", workers=None, page_window=None):
+    """
+    OCR de un PDF en streaming: las páginas se rasterizan en ventanas de
+    `page_window` páginas (first_page/last_page, salida en disco) y las ventanas
+    se reparten entre un pool de procesos. El pico de memoria depende del número
+    de workers, no del número de páginas.
+    Devuelve una lista ordenada por página de dicts {page, text, seconds}.
+    """
+    try:
+        from pdf2image import pdfinfo_from_path
+    except ImportError:
+        raise ImportError("pdf2image no está instalado. Instálalo con: pip install pdf2image")
+
+    total_pages = int(pdfinfo_from_path(file_path)["Pages"])
+    page_window = max(1, page_window or TESSERACT_PAGE_WINDOW)
+    windows = [
+        (first_page, min(first_page + page_window - 1, total_pages))
+        for first_page in range(1, total_pages + 1, page_window)
+    ]
+    workers = max(1, min(workers or TESSERACT_WORKERS, len(windows)))
+
+    pages = []
+    if workers == 1:
+        for first_page, last_page in windows:
+            pages.extend(_ocr_pdf_window(file_path, first_page, last_page, lang))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_ocr_pdf_window, file_path, first_page, last_page, lang)
+                for first_page, last_page in windows
+            ]
+            for future in futures:
+                pages.extend(future.result())
+
+    return [{"page": page, "text": text, "seconds": seconds} for page, text, seconds in pages]
+
+def run_tesseract_ocr(file_path, lang="eng", workers=None):
     """
     Procesa el archivo usando Tesseract OCR local (fallback).
-    Soporta imágenes y PDFs convertidos a imágenes.
+    Soporta imágenes y PDFs convertidos a imágenes (en paralelo por página).
     Devuelve texto extraído como string.
     """
     if not TESSERACT_AVAILABLE:
         raise ImportError("pytesseract o Pillow no están instalados.")
     
-    # Si es PDF, conviértelo primero a imágenes
+    # Si es PDF, procesar cada página por separado
     if file_path.lower().endswith(".pdf"):
-        try:
-            from pdf2image import convert_from_path
-            images = convert_from_path(file_path)
-            text = ""
-            for img in images:
-                text += pytesseract.image_to_string(img, lang=lang) + "\n"
-            return text
-        except ImportError:
-            raise ImportError("pdf2image no está instalado. Instálalo con: pip install pdf2image")
+        start = time.perf_counter()
+        pages = run_tesseract_pdf_pages(file_path, lang=lang, workers=workers)
+
+        page_seconds = [page["seconds"] for page in pages]
+        if page_seconds:
+            logger.info(
+                f"Tesseract: {len(pages)} páginas en {time.perf_counter() - start:.1f}s "
+                f"(por página: media {sum(page_seconds) / len(page_seconds):.2f}s, máx {max(page_seconds):.2f}s)"
+            )
+        return "".join(page["text"] + "\n" for page in pages)
     else:
         img = Image.open(file_path)
         return pytesseract.image_to_string(img, lang=lang)
@@ -101,38 +246,88 @@ def extract_text(file_path, ocr_method="docling", lang="eng"):
         # Si método no reconocido, usar Docling por defecto
         return run_docling_ocr(file_path)
 
-import re
+def _fixed_size_chunks(text, max_chunk_size):
+    return [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
+
+def chunk_text_semantic_with_embeddings(text, client, max_chunk_size=1000, model=None,
+                                        breakpoint_percentile=95, buffer_size=1):
+    """
+    Divide el texto en chunks semánticos con una única pasada de embeddings.
+
+    Cada frase se vectoriza una sola vez; esos vectores sirven para detectar los
+    cortes (distancia coseno entre ventanas de frases vecinas, percentil 95, igual
+    que SemanticChunker) y, promediados, como embedding de cada chunk para guardarlo.
+    Los chunks que superan `max_chunk_size` se subdividen por frases.
+
+    Returns:
+        Tupla (chunks, vectores) alineada; los vectores están normalizados.
+    """
+    import numpy as np
+    from core.embeddings import EMBEDDING_MODEL, EMBED_BATCH_SIZE, EMBED_BATCH_MAX_CHARS, _iter_batches, embed_texts
+
+    sentences = [s for s in SENTENCE_SPLIT_RE.split(text) if s.strip()]
+    if not sentences:
+        return [], []
+
+    vectors = []
+    for batch in _iter_batches(sentences, EMBED_BATCH_SIZE, EMBED_BATCH_MAX_CHARS):
+        vectors.extend(embed_texts(client, batch, model=model or EMBEDDING_MODEL))
+    sentence_vectors = np.asarray(vectors, dtype=np.float32)
+    sentence_vectors /= np.linalg.norm(sentence_vectors, axis=1, keepdims=True) + 1e-12
+
+    # Cortes: distancia entre la ventana [i-buffer, i+buffer] de cada frase y la siguiente
+    n = len(sentences)
+    breaks = []
+    if n > 1:
+        cumulative = np.vstack([np.zeros((1, sentence_vectors.shape[1]), dtype=np.float32),
+                                np.cumsum(sentence_vectors, axis=0)])
+        positions = np.arange(n)
+        windows = cumulative[np.minimum(n, positions + buffer_size + 1)] - cumulative[np.maximum(0, positions - buffer_size)]
+        windows /= np.linalg.norm(windows, axis=1, keepdims=True) + 1e-12
+        distances = 1.0 - np.einsum("ij,ij->i", windows[:-1], windows[1:])
+        threshold = np.percentile(distances, breakpoint_percentile)
+        breaks = (np.flatnonzero(distances > threshold) + 1).tolist()
+
+    chunks, chunk_vectors = [], []
+
+    def flush(indices):
+        if not indices:
+            return
+        pooled = sentence_vectors[indices].mean(axis=0)
+        pooled /= np.linalg.norm(pooled) + 1e-12
+        chunks.append(" ".join(sentences[i] for i in indices))
+        chunk_vectors.append(pooled.tolist())
+
+    for group in np.split(np.arange(n), breaks):
+        current, current_len = [], 0
+        for i in group.tolist():
+            sentence = sentences[i]
+            if len(sentence) > max_chunk_size:
+                # Frase gigante (tablas, texto sin puntuación): trozos fijos con el vector de la frase
+                flush(current)
+                current, current_len = [], 0
+                for piece in _fixed_size_chunks(sentence, max_chunk_size):
+                    chunks.append(piece)
+                    chunk_vectors.append(sentence_vectors[i].tolist())
+                continue
+            if current and current_len + 1 + len(sentence) > max_chunk_size:
+                flush(current)
+                current, current_len = [], 0
+            current_len += len(sentence) + (1 if current else 0)
+            current.append(i)
+        flush(current)
+
+    return chunks, chunk_vectors
 
 def chunk_text_semantic(text, openai_api_key, max_chunk_size=1000):
     """
-    Divide el texto en chunks semánticos usando LangChain SemanticChunker.
+    Divide el texto en chunks semánticos (sin devolver los embeddings).
     Requiere clave de OpenAI.
     """
     try:
-        embeddings = OpenAIEmbeddings(api_key=openai_api_key)
-        # SemanticChunker no usa chunk_size, usa otros parámetros
-        chunker = SemanticChunker(
-            embeddings, 
-            breakpoint_threshold_type="percentile",
-            breakpoint_threshold_amount=95  # Solo divide cuando hay gran diferencia semántica
-        )
-        # LangChain espera un "Document", así que lo creamos
-        from langchain_core.documents import Document
-        doc = Document(page_content=text)
-        chunks = chunker.split_documents([doc])
-        
-        # Si los chunks son muy grandes, dividirlos adicionalmente
-        final_chunks = []
-        for chunk in chunks:
-            if len(chunk.page_content) > max_chunk_size:
-                # Dividir chunks grandes en trozos más pequeños
-                content = chunk.page_content
-                for i in range(0, len(content), max_chunk_size):
-                    final_chunks.append(content[i:i+max_chunk_size])
-            else:
-                final_chunks.append(chunk.page_content)
-        
-        return final_chunks
-        
+        from openai import OpenAI
+        chunks, _ = chunk_text_semantic_with_embeddings(text, OpenAI(api_key=openai_api_key), max_chunk_size)
+        return chunks
     except Exception as e:
-        return [text[i:i+max_chunk_size] for i in range(0, len(text), max_chunk_size)]
\ No newline at end of file
+        logger.warning(f"Chunking semántico falló ({e}), usando trozos de tamaño fijo")
+        return _fixed_size_chunks(text, max_chunk_size)
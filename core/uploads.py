@@ -0,0 +1,138 @@
+# ./core/uploads.py
+# Subida de archivos por trozos y reanudable: los trozos se escriben directamente a disco
+# en lugar de viajar como data URI base64 por los callbacks de Dash
+
+import os
+import re
+import json
+import uuid
+import logging
+from flask import request, jsonify
+
+from core import jobs, utils
+
+logger = logging.getLogger(__name__)
+
+# Tamaño máximo de archivo y tamaño de trozo recomendado al cliente
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(4 * 1024 * 1024)))
+_STREAM_BLOCK_SIZE = 64 * 1024
+
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-f]{32}$")
+
+def _paths(upload_id):
+    if not _UPLOAD_ID_RE.match(upload_id or ""):
+        raise ValueError("upload_id inválido")
+    part_path = jobs.get_upload_path(upload_id, suffix=".part")
+    return part_path, part_path[:-len(".part")] + ".json"
+
+def _load_meta(upload_id):
+    part_path, meta_path = _paths(upload_id)
+    if not os.path.exists(meta_path):
+        return None, part_path
+    with open(meta_path, "r", encoding="utf-8") as f:
+        return json.load(f), part_path
+
+def create_upload(filename, size):
+    """
+    Registra una subida nueva y devuelve su upload_id.
+    """
+    if size > MAX_UPLOAD_BYTES:
+        raise ValueError(f"El archivo supera el máximo de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+
+    upload_id = uuid.uuid4().hex
+    part_path, meta_path = _paths(upload_id)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump({"filename": utils.safe_filename(os.path.basename(filename)), "original_filename": filename,
+                   "size": int(size)}, f)
+    open(part_path, "wb").close()
+    return upload_id
+
+def get_upload_status(upload_id):
+    """
+    Bytes recibidos de una subida y tamaño de trozo (para reanudarla desde ese offset).
+    """
+    meta, part_path = _load_meta(upload_id)
+    if meta is None:
+        return None
+    return {"upload_id": upload_id, "received": os.path.getsize(part_path), "size": meta["size"],
+            "chunk_size": UPLOAD_CHUNK_SIZE}
+
+def write_chunk(upload_id, offset, stream):
+    """
+    Escribe un trozo en su offset leyendo el cuerpo de la petición por bloques.
+    Solo se acepta el offset siguiente a lo ya recibido (reanudación secuencial).
+    """
+    meta, part_path = _load_meta(upload_id)
+    if meta is None:
+        raise FileNotFoundError("Subida no encontrada")
+
+    received = os.path.getsize(part_path)
+    if offset != received:
+        raise ValueError(f"Offset {offset} inesperado, se esperaba {received}")
+
+    with open(part_path, "ab") as f:
+        while True:
+            block = stream.read(_STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            received += len(block)
+            if received > meta["size"]:
+                f.truncate(offset)
+                raise ValueError("El trozo excede el tamaño declarado del archivo")
+            f.write(block)
+
+    return received
+
+def finalize_upload(upload_id):
+    """
+    Cierra una subida completa y devuelve (ruta del archivo, nombre original).
+    """
+    meta, part_path = _load_meta(upload_id)
+    if meta is None:
+        raise FileNotFoundError("Subida no encontrada")
+
+    received = os.path.getsize(part_path)
+    if received != meta["size"]:
+        raise ValueError(f"Subida incompleta: {received} de {meta['size']} bytes")
+
+    final_path = jobs.get_upload_path(upload_id, suffix=utils.get_file_extension(meta["filename"]))
+    os.replace(part_path, final_path)
+    os.unlink(part_path[:-len(".part")] + ".json")
+    return final_path, meta["original_filename"]
+
+def setup_upload_routes(app):
+    """Configurar las rutas de subida por trozos en la app Flask."""
+
+    @app.server.route('/upload', methods=['POST'])
+    def upload_init():
+        """Inicia una subida: {filename, size} -> {upload_id, chunk_size}."""
+        data = request.get_json(silent=True) or {}
+        try:
+            upload_id = create_upload(data.get("filename", "documento"), int(data.get("size", 0)))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"upload_id": upload_id, "chunk_size": UPLOAD_CHUNK_SIZE})
+
+    @app.server.route('/upload/<upload_id>', methods=['GET'])
+    def upload_status(upload_id):
+        """Estado de una subida, para reanudar desde `received`."""
+        try:
+            status = get_upload_status(upload_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if status is None:
+            return jsonify({"error": "Subida no encontrada"}), 404
+        return jsonify(status)
+
+    @app.server.route('/upload/<upload_id>', methods=['PUT'])
+    def upload_chunk(upload_id):
+        """Recibe un trozo (cuerpo binario) en el offset indicado por ?offset=N."""
+        try:
+            received = write_chunk(upload_id, int(request.args.get("offset", 0)), request.stream)
+        except FileNotFoundError as e:
+            return jsonify({"error": str(e)}), 404
+        except ValueError as e:
+            status = get_upload_status(upload_id) if _UPLOAD_ID_RE.match(upload_id) else None
+            return jsonify({"error": str(e), "received": status["received"] if status else 0}), 409
+        return jsonify({"upload_id": upload_id, "received": received})
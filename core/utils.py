@@ -30,17 +30,42 @@ def safe_filename(filename):
 def generate_chunk_id(text, document_id=None):
     """
     Genera un ID único para cada chunk, opcionalmente usando el document_id.
+    Con document_id el ID lleva el prefijo "<document_id>#", de modo que los chunks
+    de un documento se pueden listar por prefijo (VectorStore.list_ids).
     """
     base = (document_id or "") + text
-    return hashlib.sha256(base.encode("utf-8")).hexdigest()[:12]
+    digest = hashlib.sha256(base.encode("utf-8")).hexdigest()[:12]
+    return f"{document_id}#{digest}" if document_id else digest
 
-def generate_document_id(filename):
+def generate_document_id(filename, content_hash=None, ocr_method=None, embedding_model=None):
     """
-    Genera un ID único para cada documento (por ejemplo, hash del nombre y tiempo).
+    Genera un ID para cada documento. Si se conoce el hash del contenido, el ID es
+    determinista y sale de la misma clave que el manifiesto (contenido, método OCR y
+    modelo de embeddings): el mismo archivo ingerido con otro OCR es otro documento,
+    con sus propios vectores. Si no, mezcla el nombre con un uuid4.
     """
+    if content_hash:
+        key = f"{content_hash}|{ocr_method or ''}|{embedding_model or ''}"
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()[:12]
     unique = f"{filename}_{uuid.uuid4()}"
     return hashlib.sha256(unique.encode("utf-8")).hexdigest()[:12]
 
+def hash_bytes(data):
+    """
+    Hash SHA-256 del contenido bruto de un documento.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(file_path, block_size=1 << 20):
+    """
+    Hash SHA-256 de un archivo leído por bloques (sin cargarlo entero en memoria).
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
 def clean_text(text):
     """
     Limpia el texto eliminando espacios redundantes y caracteres problemáticos.
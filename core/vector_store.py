@@ -0,0 +1,738 @@
+# ./core/vector_store.py
+# Backends de almacenamiento vectorial detrás de core/embeddings.py
+#
+# - PineconeVectorStore: índice Pinecone serverless (red)
+# - LocalVectorStore: matriz float32 memory-mapped + metadatos en SQLite, búsqueda exacta con NumPy
+#   (o aproximada con IVF-PQ, ver core/ann_index.py, en colecciones grandes)
+#
+# Ambos exponen la misma API que un `pinecone.Index` (upsert/query/delete/describe_index_stats,
+# y list_ids/fetch para recorrer todos los vectores por páginas)
+# y devuelven diccionarios con la misma forma ({"matches": [{"id", "score", "metadata"}]}).
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+
+from core import ann_index
+
+load_dotenv()
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parent.parent / 'data'
+LOCAL_VECTOR_STORE_DIR = Path(os.getenv("LOCAL_VECTOR_STORE_DIR", DATA_DIR / 'vector_store'))
+
+# Namespace por defecto (igual que Pinecone)
+DEFAULT_NAMESPACE = ""
+
+class VectorStore:
+    """
+    Interfaz común de los backends vectoriales.
+    """
+
+    def upsert(self, vectors, namespace=None):
+        raise NotImplementedError
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None, namespace=None):
+        raise NotImplementedError
+
+    def delete(self, ids=None, delete_all=False, filter=None, namespace=None):
+        raise NotImplementedError
+
+    def describe_index_stats(self):
+        raise NotImplementedError
+
+    def list_ids(self, namespace=None, prefix=None, limit=100):
+        """
+        Genera páginas (listas de hasta `limit` IDs) de los vectores de un namespace.
+        """
+        raise NotImplementedError
+
+    def ann_index_due(self):
+        """
+        True si el backend necesita (re)entrenar su índice aproximado con build_ann_index.
+        """
+        return False
+
+    def fetch(self, ids, namespace=None):
+        """
+        Vectores por ID: {"vectors": {id: {"id", "values", "metadata"}}, "namespace"}.
+        """
+        raise NotImplementedError
+
+class PineconeVectorStore(VectorStore):
+    """
+    Backend Pinecone. La conexión se abre al primer uso, no al importar.
+    """
+
+    def __init__(self, api_key, index_name):
+        if not api_key or not index_name:
+            raise ValueError("Faltan variables de entorno para Pinecone: PINECONE_API_KEY y PINECONE_INDEX son requeridas")
+        from pinecone import Pinecone
+
+        self.index = Pinecone(api_key=api_key).Index(index_name)
+
+    def upsert(self, vectors, namespace=None):
+        if namespace:
+            return self.index.upsert(vectors=vectors, namespace=namespace)
+        return self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None, namespace=None):
+        kwargs = {"vector": vector, "top_k": top_k, "include_metadata": include_metadata,
+                  "include_values": include_values}
+        if filter:
+            kwargs["filter"] = filter
+        if namespace:
+            kwargs["namespace"] = namespace
+        return self.index.query(**kwargs)
+
+    def delete(self, ids=None, delete_all=False, filter=None, namespace=None):
+        kwargs = {}
+        if namespace:
+            kwargs["namespace"] = namespace
+        if delete_all:
+            return self.index.delete(delete_all=True, **kwargs)
+        if filter:
+            return self.index.delete(filter=filter, **kwargs)
+        return self.index.delete(ids=ids, **kwargs)
+
+    def describe_index_stats(self):
+        return self.index.describe_index_stats()
+
+    def list_ids(self, namespace=None, prefix=None, limit=100):
+        # Paginación de Pinecone serverless (los índices pod-based no la admiten)
+        kwargs = {"namespace": namespace or DEFAULT_NAMESPACE, "limit": limit}
+        if prefix:
+            kwargs["prefix"] = prefix
+        for page in self.index.list(**kwargs):
+            yield list(page)
+
+    def fetch(self, ids, namespace=None):
+        response = self.index.fetch(ids=list(ids), namespace=namespace or DEFAULT_NAMESPACE)
+        raw = response.vectors if hasattr(response, "vectors") else response.get("vectors", {})
+        vectors = {}
+        for vector_id, vector in raw.items():
+            get = vector.get if isinstance(vector, dict) else (lambda key, v=vector: getattr(v, key, None))
+            vectors[vector_id] = {"id": vector_id, "values": list(get("values") or []),
+                                  "metadata": dict(get("metadata") or {})}
+        return {"vectors": vectors, "namespace": namespace or DEFAULT_NAMESPACE}
+
+def _matches_condition(value, condition):
+    """
+    Evalúa una condición de filtro estilo Pinecone sobre un valor de metadatos.
+    """
+    if not isinstance(condition, dict):
+        return value == condition
+    for op, expected in condition.items():
+        if op == "$eq" and not value == expected:
+            return False
+        if op == "$ne" and not value != expected:
+            return False
+        if op == "$in" and value not in expected:
+            return False
+        if op == "$nin" and value in expected:
+            return False
+        if op in ("$gt", "$gte", "$lt", "$lte"):
+            if value is None:
+                return False
+            if op == "$gt" and not value > expected:
+                return False
+            if op == "$gte" and not value >= expected:
+                return False
+            if op == "$lt" and not value < expected:
+                return False
+            if op == "$lte" and not value <= expected:
+                return False
+    return True
+
+def matches_filter(metadata, filter):
+    """
+    Evalúa un filtro de metadatos estilo Pinecone ($eq, $ne, $in, $nin, $gt..., $and, $or).
+    """
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif not _matches_condition(metadata.get(key), condition):
+            return False
+    return True
+
+_LOCAL_SCHEMA = """
+CREATE TABLE IF NOT EXISTS vectors (
+    row INTEGER PRIMARY KEY,
+    id TEXT,
+    namespace TEXT NOT NULL DEFAULT '',
+    document_id TEXT,
+    metadata TEXT,
+    alive INTEGER NOT NULL DEFAULT 1,
+    norm REAL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_vectors_ns_id ON vectors (namespace, id) WHERE alive = 1;
+CREATE INDEX IF NOT EXISTS idx_vectors_document ON vectors (document_id);
+CREATE TABLE IF NOT EXISTS state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS ann_dirty (
+    row INTEGER PRIMARY KEY
+);
+"""
+# Columnas añadidas después de la primera versión del esquema (ver _migrate)
+_LOCAL_ADDED_COLUMNS = (("norm", "REAL"), ("version", "INTEGER NOT NULL DEFAULT 0"))
+# Un entrenamiento IVF-PQ sin terminar tras este tiempo se considera abandonado
+_ANN_TRAINING_STALE_SECONDS = 3600
+
+class LocalVectorStore(VectorStore):
+    """
+    Backend local con búsqueda exacta y, en colecciones grandes, aproximada (IVF-PQ).
+
+    Los vectores viven en una matriz float32 en disco (una fila por vector, leída
+    con np.memmap) y los IDs/metadatos/normas en SQLite. Cada proceso mantiene en
+    memoria, indexados por fila, los IDs, las normas y los metadatos sin parsear;
+    cuando otro proceso escribe (contador `version` en SQLite) solo relee las filas
+    cuya versión es posterior a la última vista. Las consultas calculan la similitud
+    coseno contra todas las filas candidatas con un único producto matriz-vector.
+
+    A partir de `ann_min_vectors` vectores conviene entrenar un índice IVF-PQ (y
+    reentrenarlo cuando la colección crece, ver ann_index_due): lo hace el worker como
+    trabajo aparte o una llamada explícita a build_ann_index, nunca un upsert. Desde
+    entonces cada upsert codifica sus vectores y las consultas con muchos candidatos
+    reordenan solo los `rerank·top_k` mejores candidatos aproximados de las `nprobe`
+    listas más cercanas.
+    """
+
+    def __init__(self, directory=LOCAL_VECTOR_STORE_DIR, dimension=1536,
+                 ann_min_vectors=ann_index.ANN_MIN_VECTORS, nprobe=ann_index.ANN_NPROBE,
+                 rerank=ann_index.ANN_RERANK):
+        self.directory = Path(directory)
+        self.dimension = dimension
+        self.matrix_path = self.directory / f"vectors.{dimension}.f32"
+        self.ann_min_vectors = ann_min_vectors
+        self.nprobe = nprobe
+        self.rerank = rerank
+        self._lock = threading.Lock()
+        self._migrated = False
+        self._version = None
+        self._matrix = None
+        self._capacity = 0
+        self._rows = 0
+        self._ann = None
+        self._ann_generation = None
+
+    # ---- Persistencia ----
+
+    def _connect(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.directory / 'vectors.db', timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_LOCAL_SCHEMA)
+        if not self._migrated:
+            self._migrate(conn)
+            self._migrated = True
+        return conn
+
+    def _migrate(self, conn):
+        """
+        Añade las columnas norm/version a almacenes creados antes de que existieran y
+        calcula la norma de las filas vivas que no la tengan (una sola vez).
+        """
+        import numpy as np
+
+        columns = {r[1] for r in conn.execute("PRAGMA table_info(vectors)")}
+        if any(name not in columns for name, _ in _LOCAL_ADDED_COLUMNS):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                columns = {r[1] for r in conn.execute("PRAGMA table_info(vectors)")}
+                for name, definition in _LOCAL_ADDED_COLUMNS:
+                    if name not in columns:
+                        conn.execute(f"ALTER TABLE vectors ADD COLUMN {name} {definition}")
+                missing = np.array([r[0] for r in conn.execute(
+                    "SELECT row FROM vectors WHERE alive = 1 AND norm IS NULL ORDER BY row")], dtype=np.int64)
+                if len(missing):
+                    logger.info(f"Calculando la norma de {len(missing)} vectores del almacén local")
+                    matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r").reshape(-1, self.dimension)
+                    for start in range(0, len(missing), 10000):
+                        rows = missing[start:start + 10000]
+                        norms = np.linalg.norm(matrix[rows], axis=1)
+                        conn.executemany("UPDATE vectors SET norm = ? WHERE row = ?",
+                                         zip(norms.tolist(), rows.tolist()))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_vectors_version ON vectors (version)")
+
+    def _bump_version(self, conn):
+        """
+        Incrementa el contador de escrituras y devuelve su nuevo valor (con el que se
+        marcan las filas que cambian en la transacción).
+        """
+        conn.execute("INSERT INTO state (key, value) VALUES ('version', 1) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+        return self._current_version(conn)
+
+    def _get_state(self, conn, key):
+        row = conn.execute("SELECT value FROM state WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_state(self, conn, key, value):
+        conn.execute("INSERT INTO state (key, value) VALUES (?, ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = excluded.value", (key, value))
+
+    def _current_version(self, conn):
+        return self._get_state(conn, 'version')
+
+    def _load_ann(self, generation):
+        """
+        Índice IVF-PQ de la generación indicada (reutiliza el ya cargado si coincide).
+        """
+        if not generation:
+            return None
+        if self._ann is not None and self._ann.generation == generation:
+            return self._ann
+        return ann_index.IVFPQIndex.load(self.directory, generation)
+
+    def _reserve(self, rows):
+        """
+        Agranda los arrays por fila para que quepan `rows` filas (crecimiento geométrico).
+        """
+        import numpy as np
+
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, 2 * self._capacity, 1024)
+        grown = {"_alive": np.zeros(capacity, dtype=bool), "_norms": np.zeros(capacity, dtype=np.float32),
+                 "_ids": np.empty(capacity, dtype=object), "_namespaces": np.empty(capacity, dtype=object),
+                 "_document_ids": np.empty(capacity, dtype=object), "_metadata": np.empty(capacity, dtype=object)}
+        for name, array in grown.items():
+            if self._capacity:
+                array[:self._capacity] = getattr(self, name)
+            setattr(self, name, array)
+        self._capacity = capacity
+
+    def _refresh(self):
+        """
+        Aplica las filas que otros procesos escribieron o borraron desde la última
+        versión vista (la primera vez, o si el almacén se vació, carga todas las vivas).
+        Los metadatos se guardan sin parsear (ver _row_metadata).
+        """
+        import numpy as np
+
+        conn = self._connect()
+        try:
+            # Versión y filas en la misma instantánea de lectura
+            conn.execute("BEGIN")
+            version = self._current_version(conn)
+            if version == self._version:
+                conn.execute("COMMIT")
+                return
+            full = self._version is None or version < self._version
+            generation = self._get_state(conn, 'ann_generation')
+            columns = "row, id, namespace, document_id, metadata, norm, alive"
+            if full:
+                records = conn.execute(f"SELECT {columns} FROM vectors WHERE alive = 1").fetchall()
+            else:
+                records = conn.execute(f"SELECT {columns} FROM vectors WHERE version > ?",
+                                       (self._version,)).fetchall()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        if full:
+            self._capacity, self._positions, self._rows = 0, {}, 0
+            self._ann, self._ann_generation = None, None
+        total_rows = self.matrix_path.stat().st_size // (4 * self.dimension) if self.matrix_path.exists() else 0
+        rows = np.array([r[0] for r in records], dtype=np.int64)
+        self._reserve(max(total_rows, int(rows.max()) + 1 if len(rows) else 0))
+        if self._matrix is None or len(self._matrix) != total_rows:
+            self._matrix = (np.memmap(self.matrix_path, dtype=np.float32, mode="r", shape=(total_rows, self.dimension))
+                            if total_rows else np.zeros((0, self.dimension), dtype=np.float32))
+
+        # Las claves de los ocupantes anteriores de estas filas dejan de apuntar a ellas
+        for row in rows[self._alive[rows]].tolist():
+            key = (self._namespaces[row], self._ids[row])
+            if self._positions.get(key) == row:
+                del self._positions[key]
+        alive = np.array([bool(r[6]) for r in records], dtype=bool)
+        self._alive[rows] = alive
+        live = [r for r in records if r[6]]
+        if live:
+            live_rows = rows[alive]
+            self._ids[live_rows] = [r[1] for r in live]
+            self._namespaces[live_rows] = [r[2] for r in live]
+            self._document_ids[live_rows] = [r[3] for r in live]
+            self._metadata[live_rows] = [r[4] for r in live]
+            norms = np.array([np.nan if r[5] is None else r[5] for r in live], dtype=np.float32)
+            unknown = np.isnan(norms)
+            if unknown.any():
+                norms[unknown] = np.linalg.norm(self._matrix[live_rows[unknown]], axis=1)
+            self._norms[live_rows] = norms
+            self._positions.update(zip(((r[2], r[1]) for r in live), live_rows.tolist()))
+        self._rows = len(self._positions)
+        self._version = version
+
+        try:
+            if generation != self._ann_generation:
+                self._ann_generation = generation
+                self._ann = self._load_ann(generation)
+                if self._ann is not None:
+                    self._ann.open_rows(total_rows)
+            elif self._ann is not None and len(rows):
+                self._ann.note_rows(rows, total_rows)
+        except (FileNotFoundError, ValueError):
+            # Otro proceso acaba de reentrenar y borró (o está escribiendo) esta generación:
+            # búsqueda exacta hasta que publique la nueva
+            self._ann = None
+
+    def _row_metadata(self, row):
+        """
+        Metadatos de una fila, parseados la primera vez que se necesitan.
+        """
+        metadata = self._metadata[row]
+        if isinstance(metadata, str):
+            metadata = self._metadata[row] = json.loads(metadata) if metadata else {}
+        return metadata if metadata is not None else {}
+
+    def _write_rows(self, rows_and_values):
+        import numpy as np
+
+        with open(self.matrix_path, "r+b" if self.matrix_path.exists() else "w+b") as f:
+            for row, values in rows_and_values:
+                f.seek(row * 4 * self.dimension)
+                f.write(np.asarray(values, dtype=np.float32).tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    # ---- API ----
+
+    def upsert(self, vectors, namespace=None):
+        import numpy as np
+
+        namespace = namespace or DEFAULT_NAMESPACE
+        for vector in vectors:
+            if len(vector["values"]) != self.dimension:
+                raise ValueError(f"Dimensión {len(vector['values'])} distinta de {self.dimension}")
+
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._bump_version(conn)
+                # Filas libres (borradas) para reutilizar antes de crecer el archivo
+                free_rows = [r[0] for r in conn.execute(
+                    "SELECT row FROM vectors WHERE alive = 0 ORDER BY row LIMIT ?", (len(vectors),)
+                )]
+                next_row = conn.execute("SELECT COALESCE(MAX(row) + 1, 0) FROM vectors").fetchone()[0]
+                writes = []
+                for vector in vectors:
+                    metadata = vector.get("metadata") or {}
+                    existing = conn.execute(
+                        "SELECT row FROM vectors WHERE namespace = ? AND id = ? AND alive = 1",
+                        (namespace, str(vector["id"]))
+                    ).fetchone()
+                    if existing:
+                        # Una actualización nunca sobrescribe la fila viva: el vector nuevo va a otra
+                        # fila y la anterior se marca borrada en esta transacción (un ROLLBACK la deja
+                        # intacta y los lectores no puntúan bytes nuevos con la norma antigua)
+                        conn.execute("UPDATE vectors SET alive = 0, version = ? WHERE row = ?", (version, existing[0]))
+                    if free_rows:
+                        row = free_rows.pop(0)
+                        conn.execute("DELETE FROM vectors WHERE row = ?", (row,))
+                    else:
+                        row, next_row = next_row, next_row + 1
+                    conn.execute(
+                        "INSERT INTO vectors (row, id, namespace, document_id, metadata, alive, norm, version) "
+                        "VALUES (?, ?, ?, ?, ?, 1, ?, ?)",
+                        (row, str(vector["id"]), namespace, metadata.get("document_id"),
+                         json.dumps(metadata, ensure_ascii=False),
+                         float(np.linalg.norm(np.asarray(vector["values"], dtype=np.float32))), version)
+                    )
+                    writes.append((row, vector["values"]))
+                # Los vectores se escriben antes de confirmar: quien recargue tras el commit los ve completos
+                # (solo se escriben filas libres o nuevas, que nadie lee mientras estén muertas)
+                self._write_rows(writes)
+                ann = self._load_ann(self._get_state(conn, 'ann_generation'))
+                if ann is not None:
+                    self._encode_rows(ann, writes)
+                if self._get_state(conn, 'ann_training'):
+                    # Hay un entrenamiento en curso: codificará estas filas al terminar
+                    conn.executemany("INSERT OR IGNORE INTO ann_dirty (row) VALUES (?)",
+                                     [(row,) for row, _ in writes])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return {"upserted_count": len(vectors)}
+
+    def ann_index_due(self):
+        """
+        True si la colección ha llegado a `ann_min_vectors` sin índice IVF-PQ o ha
+        crecido ANN_RETRAIN_GROWTH veces desde el último entrenamiento.
+        """
+        conn = self._connect()
+        try:
+            alive = conn.execute("SELECT COUNT(*) FROM vectors WHERE alive = 1").fetchone()[0]
+            trained = self._get_state(conn, 'ann_trained_count')
+        finally:
+            conn.close()
+        return alive >= self.ann_min_vectors and (not trained or alive >= trained * ann_index.ANN_RETRAIN_GROWTH)
+
+    @staticmethod
+    def _encode_rows(ann, rows_and_values):
+        import numpy as np
+
+        rows = [row for row, _ in rows_and_values]
+        values = np.asarray([values for _, values in rows_and_values], dtype=np.float32)
+        values /= np.linalg.norm(values, axis=1, keepdims=True) + 1e-12
+        ann.write_rows(rows, values)
+
+    def build_ann_index(self, nlist=ann_index.ANN_NLIST, m=ann_index.ANN_PQ_M,
+                        sample_size=ann_index.ANN_TRAIN_SAMPLE, block=10000):
+        """
+        Entrena una nueva generación IVF-PQ con una muestra de los vectores vivos y
+        codifica todas las filas, sin bloquear las escrituras: el entrenamiento trabaja
+        sobre las filas vivas al empezar y las filas que se escriben mientras tanto
+        (tabla ann_dirty) se codifican al final, en la misma transacción corta que
+        publica la generación. Las consultas usan la generación anterior (o búsqueda
+        exacta) hasta recargar.
+
+        Returns:
+            Diccionario {"generation", "nlist", "m", "vectors"}, o None si no hay vectores
+            o ya hay otro entrenamiento en curso.
+        """
+        import numpy as np
+
+        # 1. Marca de entrenamiento y filas vivas (transacción corta)
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            started = self._get_state(conn, 'ann_training')
+            if started and time.time() - started < _ANN_TRAINING_STALE_SECONDS:
+                conn.execute("ROLLBACK")
+                logger.info("Ya hay un entrenamiento IVF-PQ en curso")
+                return None
+            rows = np.array([r[0] for r in conn.execute("SELECT row FROM vectors WHERE alive = 1 ORDER BY row")],
+                            dtype=np.int64)
+            if len(rows) == 0:
+                conn.execute("ROLLBACK")
+                return None
+            generation = max(self._get_state(conn, 'ann_generation'), self._get_state(conn, 'ann_training_generation')) + 1
+            self._set_state(conn, 'ann_training', int(time.time()))
+            self._set_state(conn, 'ann_training_generation', generation)
+            conn.execute("DELETE FROM ann_dirty")
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+        try:
+            # 2. Entrenamiento y codificación sin bloqueo (los archivos de la generación
+            # nueva no los lee nadie hasta que se publique)
+            matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r").reshape(-1, self.dimension)
+            rng = np.random.default_rng(len(rows))
+            sample = np.asarray(matrix[np.sort(rng.choice(rows, min(sample_size, len(rows)), replace=False))])
+            sample /= np.linalg.norm(sample, axis=1, keepdims=True) + 1e-12
+
+            logger.info(f"Entrenando índice IVF-PQ (generación {generation}) con {len(sample)} de {len(rows)} vectores")
+            ann = ann_index.IVFPQIndex.train(self.directory, generation, sample, nlist=nlist, m=m, total=len(rows))
+            for start in range(0, len(rows), block):
+                chunk_rows = rows[start:start + block]
+                self._encode_rows(ann, list(zip(chunk_rows.tolist(), matrix[chunk_rows])))
+
+            # 3. Filas escritas durante el entrenamiento y publicación (transacción corta)
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    dirty = np.array([r[0] for r in conn.execute("SELECT row FROM ann_dirty ORDER BY row")],
+                                     dtype=np.int64)
+                    if len(dirty):
+                        matrix = np.memmap(self.matrix_path, dtype=np.float32, mode="r").reshape(-1, self.dimension)
+                        self._encode_rows(ann, list(zip(dirty.tolist(), matrix[dirty])))
+                    alive = conn.execute("SELECT COUNT(*) FROM vectors WHERE alive = 1").fetchone()[0]
+                    self._set_state(conn, 'ann_generation', generation)
+                    self._set_state(conn, 'ann_trained_count', alive)
+                    self._set_state(conn, 'ann_training', 0)
+                    conn.execute("DELETE FROM ann_dirty")
+                    self._bump_version(conn)
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+            finally:
+                conn.close()
+        except Exception:
+            conn = self._connect()
+            try:
+                self._set_state(conn, 'ann_training', 0)
+            finally:
+                conn.close()
+            raise
+
+        logger.info(f"Índice IVF-PQ generación {generation} publicado ({len(dirty)} filas escritas durante el entrenamiento)")
+        ann_index.IVFPQIndex.remove_other_generations(self.directory, keep=generation)
+        return {"generation": generation, "nlist": ann.nlist, "m": ann.m, "vectors": alive}
+
+    def _candidate_mask(self, filter, namespace):
+        import numpy as np
+
+        mask = self._alive & (self._namespaces == (namespace or DEFAULT_NAMESPACE))
+        if filter:
+            remaining = dict(filter)
+            # Atajo vectorizado para el filtro más habitual
+            doc_condition = remaining.get("document_id")
+            if isinstance(doc_condition, (str, dict)) and (
+                    not isinstance(doc_condition, dict) or set(doc_condition) <= {"$eq", "$in"}):
+                remaining.pop("document_id")
+                if isinstance(doc_condition, str):
+                    mask &= self._document_ids == doc_condition
+                elif "$eq" in doc_condition:
+                    mask &= self._document_ids == doc_condition["$eq"]
+                else:
+                    mask &= np.isin(self._document_ids, list(doc_condition["$in"]))
+            if remaining:
+                candidates = np.flatnonzero(mask)
+                keep = [row for row in candidates if matches_filter(self._row_metadata(row), remaining)]
+                mask = np.zeros(self._capacity, dtype=bool)
+                mask[keep] = True
+        return mask
+
+    def query(self, vector, top_k=5, include_metadata=True, include_values=False, filter=None, namespace=None):
+        import numpy as np
+
+        with self._lock:
+            self._refresh()
+            if self._rows == 0:
+                return {"matches": [], "namespace": namespace or DEFAULT_NAMESPACE}
+
+            mask = self._candidate_mask(filter, namespace)
+            candidates = np.flatnonzero(mask)
+            if len(candidates) == 0:
+                return {"matches": [], "namespace": namespace or DEFAULT_NAMESPACE}
+
+            query = np.asarray(vector, dtype=np.float32)
+            query_norm = float(np.linalg.norm(query)) or 1.0
+            if self._ann is not None and len(candidates) >= self.ann_min_vectors:
+                # Búsqueda aproximada: solo se puntúan exactamente los mejores candidatos IVF-PQ
+                candidates = self._ann.search(query / query_norm, mask, max(top_k * self.rerank, top_k),
+                                              nprobe=self.nprobe)
+                if len(candidates) == 0:
+                    return {"matches": [], "namespace": namespace or DEFAULT_NAMESPACE}
+            if len(candidates) * 2 > len(self._matrix):
+                # Mayoría de filas candidatas: producto sobre la matriz contigua (sin copiarla)
+                raw = np.asarray(self._matrix @ query)[candidates]
+            else:
+                raw = self._matrix[candidates] @ query
+            scores = raw / (self._norms[candidates] * query_norm + 1e-12)
+
+            k = min(top_k, len(candidates))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+
+            matches = []
+            for position in top:
+                row = candidates[position]
+                match = {"id": self._ids[row], "score": float(scores[position])}
+                if include_metadata:
+                    match["metadata"] = self._row_metadata(row)
+                if include_values:
+                    match["values"] = self._matrix[row].tolist()
+                matches.append(match)
+            return {"matches": matches, "namespace": namespace or DEFAULT_NAMESPACE}
+
+    def delete(self, ids=None, delete_all=False, filter=None, namespace=None):
+        import numpy as np
+
+        namespace = namespace or DEFAULT_NAMESPACE
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                version = self._bump_version(conn)
+                if delete_all:
+                    conn.execute("UPDATE vectors SET alive = 0, version = ? WHERE namespace = ? AND alive = 1",
+                                 (version, namespace))
+                else:
+                    if filter:
+                        with self._lock:
+                            self._refresh()
+                            doomed = ([self._ids[row] for row in np.flatnonzero(self._candidate_mask(filter, namespace))]
+                                      if self._rows else [])
+                    else:
+                        doomed = [str(vector_id) for vector_id in ids or []]
+                    conn.executemany(
+                        "UPDATE vectors SET alive = 0, version = ? WHERE namespace = ? AND id = ? AND alive = 1",
+                        [(version, namespace, vector_id) for vector_id in doomed])
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        finally:
+            conn.close()
+        return {}
+
+    def describe_index_stats(self):
+        conn = self._connect()
+        try:
+            namespaces = {
+                ns: {"vector_count": count}
+                for ns, count in conn.execute(
+                    "SELECT namespace, COUNT(*) FROM vectors WHERE alive = 1 GROUP BY namespace"
+                )
+            }
+        finally:
+            conn.close()
+        return {
+            "dimension": self.dimension,
+            "total_vector_count": sum(ns["vector_count"] for ns in namespaces.values()),
+            "namespaces": namespaces
+        }
+
+    def list_ids(self, namespace=None, prefix=None, limit=100):
+        with self._lock:
+            self._refresh()
+            ids = sorted(vector_id for (ns, vector_id) in self._positions
+                         if ns == (namespace or DEFAULT_NAMESPACE) and (not prefix or vector_id.startswith(prefix)))
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def fetch(self, ids, namespace=None):
+        import numpy as np
+
+        namespace = namespace or DEFAULT_NAMESPACE
+        vectors = {}
+        with self._lock:
+            self._refresh()
+            for vector_id in ids:
+                row = self._positions.get((namespace, str(vector_id)))
+                if row is not None:
+                    # Los valores se devuelven como array NumPy (recorrer la colección entera
+                    # convirtiendo cada fila a lista de floats sería el cuello de botella)
+                    vectors[self._ids[row]] = {"id": self._ids[row], "values": np.array(self._matrix[row]),
+                                               "metadata": self._row_metadata(row)}
+        return {"vectors": vectors, "namespace": namespace}
+
+def create_vector_store(backend=None, dimension=1536):
+    """
+    Crea el backend configurado en VECTOR_STORE ("pinecone" o "local").
+    Por defecto usa Pinecone si hay credenciales y el almacén local si no.
+    """
+    api_key = os.getenv("PINECONE_API_KEY")
+    index_name = os.getenv("PINECONE_INDEX")
+    backend = (backend or os.getenv("VECTOR_STORE") or ("pinecone" if api_key and index_name else "local")).lower()
+
+    if backend == "pinecone":
+        return PineconeVectorStore(api_key, index_name)
+    if backend == "local":
+        return LocalVectorStore(dimension=dimension)
+    raise ValueError(f"Backend vectorial desconocido: {backend}")
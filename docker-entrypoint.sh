@@ -0,0 +1,41 @@
+#!/bin/sh
+# ./docker-entrypoint.sh
+# Arranque del contenedor según el proceso indicado:
+#   web    -> gunicorn (por defecto)
+#   worker -> workers de ingesta (worker.py), en su propio contenedor
+#   all    -> ambos en un solo contenedor (despliegues con un único contenedor)
+# Cualquier otro comando se ejecuta tal cual.
+set -e
+
+PORT="${PORT:-8080}"
+
+start_web() {
+    exec gunicorn --bind "0.0.0.0:${PORT}" --workers 2 --timeout 120 app:server
+}
+
+case "${1:-web}" in
+    web)
+        start_web
+        ;;
+    worker)
+        exec python worker.py
+        ;;
+    all)
+        # Si cualquiera de los dos termina se detiene el otro y sale el contenedor,
+        # para que el orquestador (restart: unless-stopped) lo vuelva a lanzar
+        python worker.py &
+        worker_pid=$!
+        gunicorn --bind "0.0.0.0:${PORT}" --workers 2 --timeout 120 app:server &
+        web_pid=$!
+        trap 'kill -TERM "$worker_pid" "$web_pid" 2>/dev/null; wait; exit 0' TERM INT
+        while kill -0 "$worker_pid" 2>/dev/null && kill -0 "$web_pid" 2>/dev/null; do
+            sleep 5
+        done
+        kill -TERM "$worker_pid" "$web_pid" 2>/dev/null || true
+        wait
+        exit 1
+        ;;
+    *)
+        exec "$@"
+        ;;
+esac
@@ -0,0 +1,119 @@
+# ./worker.py
+# Entry point de los workers de ingesta: consumen la cola SQLite de core/jobs.py
+#
+# Uso: python worker.py   (INGESTION_WORKERS controla el número de procesos)
+
+import os
+import sys
+import time
+import socket
+import threading
+import logging
+import multiprocessing
+import signal
+import warnings
+
+from core import jobs
+
+warnings.filterwarnings("ignore", category=RuntimeWarning)
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(processName)s] %(levelname)s %(message)s")
+logger = logging.getLogger("worker")
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "2"))
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+# Precargar los modelos de Docling al arrancar y reciclar el proceso tras N trabajos (0 = nunca)
+DOCLING_PREWARM = os.getenv("DOCLING_PREWARM", "true").lower() in ("1", "true", "yes")
+WORKER_MAX_JOBS = int(os.getenv("WORKER_MAX_JOBS", "0"))
+
+def worker_loop(worker_index):
+    """
+    Bucle de un proceso worker: reclama trabajos y los ejecuta hasta que se detenga.
+    """
+    # Importar aquí para que cada proceso cargue sus propios clientes
+    from core import ingestion, ocr
+
+    worker_id = f"{socket.gethostname()}-{os.getpid()}-{worker_index}"
+    if DOCLING_PREWARM and ocr.DOCLING_AVAILABLE:
+        try:
+            ocr.warm_docling_converter()
+        except Exception as e:
+            logger.warning(f"No se pudo precalentar Docling: {e}")
+    logger.info(f"Worker {worker_id} listo")
+
+    jobs_done = 0
+    while True:
+        if WORKER_MAX_JOBS and jobs_done >= WORKER_MAX_JOBS:
+            # Reciclar: liberar modelos y salir; el proceso principal lanza uno nuevo
+            ocr.release_docling_converters()
+            logger.info(f"Worker {worker_id} reciclado tras {jobs_done} trabajos")
+            return
+
+        job = jobs.claim_next_job(worker_id)
+        if job is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+
+        job_id = job["id"]
+        logger.info(f"Procesando trabajo {job_id} ({job['kind']})")
+
+        def progress(stage, value, message=None):
+            jobs.update_job_progress(job_id, stage, value, message)
+
+        # Heartbeat en segundo plano: el OCR de un PDF grande puede tardar minutos sin progreso
+        finished = threading.Event()
+
+        def heartbeat():
+            while not finished.wait(HEARTBEAT_INTERVAL):
+                jobs.heartbeat_job(job_id)
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+
+        try:
+            result = ingestion.run_job(job, progress)
+            jobs.complete_job(job_id, result)
+            logger.info(f"Trabajo {job_id} completado")
+        except Exception as e:
+            logger.exception(f"Trabajo {job_id} falló")
+            jobs.fail_job(job_id, e)
+        finally:
+            finished.set()
+            jobs_done += 1
+
+def _start_worker(i):
+    # No daemon: cada worker puede abrir su propio pool de procesos (OCR paralelo)
+    process = multiprocessing.Process(target=worker_loop, args=(i,), name=f"ingestion-{i}")
+    process.start()
+    return process
+
+def main():
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    # Recuperar trabajos que quedaron a medias si un worker anterior murió
+    jobs.requeue_stale_jobs()
+
+    processes = [_start_worker(i) for i in range(INGESTION_WORKERS)]
+
+    last_requeue = time.time()
+    try:
+        while True:
+            time.sleep(5)
+            if time.time() - last_requeue > jobs.JOB_STALE_SECONDS / 4:
+                jobs.requeue_stale_jobs()
+                last_requeue = time.time()
+            # Reemplazar procesos que hayan muerto o se hayan reciclado
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning(f"Worker {process.name} terminó, relanzando")
+                    processes[i] = _start_worker(i)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logger.info("Deteniendo workers")
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join(timeout=10)
+
+if __name__ == "__main__":
+    main()